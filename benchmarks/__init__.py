@@ -0,0 +1,8 @@
+#__init__.py
+# Reproducible, offline benchmark suite for start-up time, chunking, ingestion,
+# search and persistence. Run it with `python -m benchmarks` from the repository root.
+from benchmarks.startup import bench_startup
+from benchmarks.synthetic import synthetic_queries, synthetic_texts
+from benchmarks.suite import compare, run_benchmarks
+
+__all__ = ["synthetic_texts", "synthetic_queries", "run_benchmarks", "compare", "bench_startup"]
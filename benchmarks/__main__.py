@@ -0,0 +1,64 @@
+#__main__.py
+# Command line: run the suite and write the results to JSON, or compare two
+# result files.
+#   python -m benchmarks --docs 20000 --dim 384 --output results.json
+#   python -m benchmarks --compare before.json after.json
+#   python -m benchmarks --startup-only
+import argparse
+import json
+import sys
+
+from benchmarks.startup import STARTUP_REPEATS, bench_startup
+from benchmarks.suite import compare, run_benchmarks
+
+def print_comparison(rows) -> int:
+    regressions = 0
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        regressions += row["regression"]
+        print(f"{row['metric']:<50} {row['old']:>14.4g} {row['new']:>14.4g} {row['ratio']:>8.2f}x{flag}")
+    print(f"{regressions} regression(s) out of {len(rows)} metrics")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000, help="Documents in the synthetic corpus")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per mode")
+    parser.add_argument("-k", type=int, default=10, help="Results per query (recall@k)")
+    parser.add_argument("--words-per-doc", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="Small corpus for a smoke run")
+    parser.add_argument("--startup-repeats", type=int, default=STARTUP_REPEATS,
+                        help="Fresh interpreters per module for the import-time benchmark (0 skips it)")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure the start-up (import) time")
+    parser.add_argument("--output", help="JSON file for the results (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            rows = compare(json.load(f_old), json.load(f_new), args.threshold)
+        return 1 if print_comparison(rows) else 0
+
+    if args.quick:
+        args.docs, args.queries = min(args.docs, 2000), min(args.queries, 50)
+        args.startup_repeats = min(args.startup_repeats, 2)
+    if args.startup_only:
+        results = {"results": {"startup": bench_startup(repeats=max(args.startup_repeats, 1))}}
+    else:
+        results = run_benchmarks(n_docs=args.docs, dim=args.dim, n_queries=args.queries, k=args.k,
+                                 words_per_doc=args.words_per_doc, seed=args.seed,
+                                 startup_repeats=args.startup_repeats)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
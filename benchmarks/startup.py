@@ -0,0 +1,76 @@
+#startup.py
+# Start-up cost of the command line tools and worker processes: every module
+# is imported in a fresh interpreter with `python -X importtime`, which gives
+# the wall time of the process and the cumulative import time of the module,
+# and shows which heavy dependencies an import drags in.
+from typing import Any, Dict, List, Optional
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP_MODULES = ["chunking", "corpus", "vectordb", "embed_cache", "embeds", "llm", "rag", "service"]
+# Dependencies worth flagging when a plain import loads them
+HEAVY_MODULES = ("numpy", "openai", "httpx", "ollama", "dotenv", "asyncio", "http.server",
+                 "onnxruntime", "torch", "transformers")
+STARTUP_REPEATS = 5
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds per module, from `-X importtime` output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1])
+    return cumulative
+
+def _run(code: str, python: str) -> subprocess.CompletedProcess:
+    return subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          cwd=REPOSITORY_ROOT)
+
+def bench_startup(modules: Optional[List[str]] = None, repeats: int = STARTUP_REPEATS,
+                  python: str = sys.executable) -> Dict[str, Any]:
+    """
+    Median process wall time and import time of each module, in fresh interpreters.
+
+    Args:
+        modules (List[str], optional): Modules to import (default: STARTUP_MODULES).
+        repeats (int): Runs per module; medians are reported.
+        python (str): Interpreter to run.
+
+    Returns:
+        Dict[str, Any]: {"interpreter_ms": ..., module: {"wall_ms", "import_ms",
+        "heavy_imports"} or {"error"}}.
+    """
+    results: Dict[str, Any] = {}
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        _run("pass", python)
+        durations.append(time.perf_counter() - started)
+    results["interpreter_ms"] = 1000 * statistics.median(durations)
+
+    for module in modules or STARTUP_MODULES:
+        durations, import_times, loaded = [], [], set()
+        for _ in range(repeats):
+            started = time.perf_counter()
+            process = _run(f"import {module}", python)
+            durations.append(time.perf_counter() - started)
+            if process.returncode != 0:
+                break
+            cumulative = parse_importtime(process.stderr)
+            import_times.append(cumulative.get(module, 0))
+            loaded.update(name for name in HEAVY_MODULES if name in cumulative)
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            results[module] = {"error": error[-1] if error else f"exit status {process.returncode}"}
+            continue
+        results[module] = {"wall_ms": 1000 * statistics.median(durations),
+                           "import_ms": statistics.median(import_times) / 1000,
+                           "heavy_imports": sorted(loaded)}
+    return results
+#
@@ -0,0 +1,260 @@
+#suite.py
+# The benchmarks themselves. Every function returns plain dicts of numbers so
+# that run_benchmarks can dump one JSON document per run, and compare() can
+# diff two runs (e.g. before and after a commit).
+from typing import Any, Dict, List, Optional
+import contextlib
+import io
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.startup import STARTUP_REPEATS, bench_startup
+from benchmarks.synthetic import synthetic_queries, synthetic_texts
+from chunking import chunk_spans, chunk_text, iter_chunks, load_text
+from embedders import HashEmbedder
+from vectordb import SimpleVectorDB
+
+BUNDLED_TEXTS = ["pg75244.txt", "2889.txt"]
+NUM_WORDS, OVERLAP_WORDS = 256, 128  # Chunking used by rag.py
+REPEATS = 3  # Best of n for the throughput measurements
+IVF_NPROBES = [1, 4, 16]
+QUANTIZED_PRECISIONS = ["float16", "int8", "pq"]
+
+# Metrics where a higher value is better; every other one is lower-is-better
+HIGHER_IS_BETTER = ("per_sec", "recall")
+# Sizes of the workload rather than measurements: never a regression
+NOT_COMPARED = ("documents", "words", "bytes_per_vector", "word_chunks", "word_chunk_chars",
+                "sentence_chunks", "sentence_chunk_chars")
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / 2 ** 20  # KiB on Linux, bytes on macOS
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    """p50 / p99 / mean of a list of durations, in milliseconds."""
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_ms": float(ms.mean())}
+
+def recall_at_k(exact: List[List[tuple]], approx: List[List[tuple]]) -> float:
+    hits = sum(len({d for d, _ in e} & {d for d, _ in a}) for e, a in zip(exact, approx))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the progress prints of the database while timing it."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def _best_of(fn, repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+# ------- Benchmarks -------
+def bench_chunking(files: List[str]) -> Dict[str, Any]:
+    """
+    Throughput per file of chunk_text (whole file in memory), iter_chunks
+    (streaming) and chunk_spans (sentence-aware), and the chunk count and
+    stored characters of the word and sentence-aware chunkings.
+    """
+    results = {}
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        text = load_text(path)
+        n_words = len(text.split())
+        size_mb = os.path.getsize(path) / 2 ** 20
+        in_memory = _best_of(lambda: chunk_text(text, NUM_WORDS, OVERLAP_WORDS))
+        streaming = _best_of(lambda: sum(1 for _ in iter_chunks(path, NUM_WORDS, OVERLAP_WORDS)))
+        sentence_aware = _best_of(lambda: chunk_spans(text))
+        word_chunks, spans = chunk_text(text, NUM_WORDS, OVERLAP_WORDS), chunk_spans(text)
+        results[os.path.basename(path)] = {
+            "words": n_words,
+            "chunk_text_words_per_sec": n_words / in_memory,
+            "iter_chunks_words_per_sec": n_words / streaming,
+            "iter_chunks_mb_per_sec": size_mb / streaming,
+            "chunk_spans_words_per_sec": n_words / sentence_aware,
+            "word_chunks": len(word_chunks),
+            "word_chunk_chars": sum(len(chunk) for chunk in word_chunks),
+            "sentence_chunks": len(spans),
+            "sentence_chunk_chars": sum(end - start for start, end in spans)
+        }
+    return results
+
+def bench_insert(db: SimpleVectorDB, texts: List[str], vectors: np.ndarray) -> Dict[str, float]:
+    """add_document rate on pre-computed embeddings."""
+    started = time.perf_counter()
+    for text, vector in zip(texts, vectors):
+        db.add_document(vector, text)
+    elapsed = time.perf_counter() - started
+    return {"documents": len(texts), "seconds": elapsed, "docs_per_sec": len(texts) / elapsed}
+
+def bench_query_latency(db: SimpleVectorDB, queries: np.ndarray, k: int, **query_args) -> Dict[str, float]:
+    """Latency of single queries (one call each)."""
+    db.query(queries[0], n_results=k, **query_args)  # Warm-up
+    durations = []
+    for query in queries:
+        started = time.perf_counter()
+        db.query(query, n_results=k, **query_args)
+        durations.append(time.perf_counter() - started)
+    return latency_stats(durations)
+
+def bench_approximate(db: SimpleVectorDB, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    """Latency and recall@k against the exact float32 scan of every approximate mode."""
+    exact = db.query_batch(queries, n_results=k, exact=True)
+    results = {}
+
+    db.build_index()
+    for nprobe in IVF_NPROBES:
+        stats = bench_query_latency(db, queries, k, nprobe=nprobe)
+        stats["recall"] = recall_at_k(exact, db.query_batch(queries, n_results=k, nprobe=nprobe))
+        results[f"ivf_nprobe_{nprobe}"] = stats
+    db.drop_index()
+
+    for precision in QUANTIZED_PRECISIONS:
+        for rerank_factor in (0, 4):
+            db.quantize(precision, rerank_factor=rerank_factor)
+            stats = bench_query_latency(db, queries, k)
+            stats["recall"] = recall_at_k(exact, db.query_batch(queries, n_results=k))
+            stats["bytes_per_vector"] = db.codec.code_bytes
+            results[f"{precision}_rerank_{rerank_factor}"] = stats
+    db.quantize("float32")
+    return results
+
+def bench_persistence(db: SimpleVectorDB, queries: np.ndarray, k: int) -> Dict[str, float]:
+    """save_to_disk, load_from_disk and first-query-after-load times, and the size on disk."""
+    with _quiet():
+        started = time.perf_counter()
+        db.save_to_disk()
+        saved = time.perf_counter()
+        loaded_db = SimpleVectorDB(db.db_path)
+        loaded_db.load_from_disk()
+        loaded = time.perf_counter()
+    loaded_db.query(queries[0], n_results=k)
+    first_query = time.perf_counter()
+    disk_bytes = sum(os.path.getsize(os.path.join(db.db_path, name)) for name in os.listdir(db.db_path))
+    return {"save_seconds": saved - started, "load_seconds": loaded - saved,
+            "first_query_ms": 1000 * (first_query - loaded), "disk_mb": disk_bytes / 2 ** 20}
+
+def run_benchmarks(
+    n_docs: int = 20000,
+    dim: int = 384,
+    n_queries: int = 200,
+    k: int = 10,
+    words_per_doc: int = 64,
+    seed: int = 0,
+    chunk_files: Optional[List[str]] = None,
+    startup_repeats: int = STARTUP_REPEATS
+) -> Dict[str, Any]:
+    """
+    Run the whole suite on a synthetic corpus and return the results as a dict.
+
+    Args:
+        n_docs (int): Documents in the synthetic corpus.
+        dim (int): Embedding dimension of the hash embedder.
+        n_queries (int): Queries timed per mode.
+        k (int): Results per query (the k of recall@k).
+        words_per_doc (int): Words per synthetic document.
+        seed (int): Seed of the corpus, the queries and the embedder.
+        chunk_files (List[str], optional): Texts for the chunking benchmark
+            (default: the bundled books).
+        startup_repeats (int): Fresh interpreters per module in the start-up
+            benchmark (0 skips it).
+
+    Returns:
+        Dict[str, Any]: {"meta": {...}, "results": {...}}, JSON-serializable.
+    """
+    results: Dict[str, Any] = {"peak_rss_mb": {}}
+    if startup_repeats:
+        results["startup"] = bench_startup(repeats=startup_repeats)
+    results["chunking"] = bench_chunking(chunk_files if chunk_files is not None else BUNDLED_TEXTS)
+    results["peak_rss_mb"]["after_chunking"] = peak_rss_mb()
+
+    # Synthetic corpus and queries, embedded offline
+    embedder = HashEmbedder(dim=dim, seed=seed)
+    texts = synthetic_texts(n_docs, words_per_doc=words_per_doc, seed=seed)
+    queries = synthetic_queries(texts, n_queries, seed=seed + 1)
+    started = time.perf_counter()
+    vectors = np.asarray(embedder(texts), dtype=np.float32)
+    results["hash_embed_docs_per_sec"] = n_docs / (time.perf_counter() - started)
+    query_vectors = np.asarray(embedder([query for query, _ in queries]), dtype=np.float32)
+
+    workdir = tempfile.mkdtemp(prefix="vectordb_bench_")
+    try:
+        db = SimpleVectorDB(os.path.join(workdir, "db"))
+        results["insert"] = bench_insert(db, texts, vectors)
+        results["peak_rss_mb"]["after_insert"] = peak_rss_mb()
+
+        results["query_exact"] = bench_query_latency(db, query_vectors, k, exact=True)
+        started = time.perf_counter()
+        db.query_batch(query_vectors, n_results=k, exact=True)
+        results["query_batch_queries_per_sec"] = n_queries / (time.perf_counter() - started)
+        results["query_keyword"] = latency_stats([
+            _best_of(lambda: db.keyword_query(query, n_results=k), repeats=1) for query, _ in queries])
+        results["approximate"] = bench_approximate(db, query_vectors, k)
+        results["peak_rss_mb"]["after_queries"] = peak_rss_mb()
+
+        results["persistence"] = bench_persistence(db, query_vectors, k)
+        results["peak_rss_mb"]["after_persistence"] = peak_rss_mb()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"meta": _meta(n_docs=n_docs, dim=dim, n_queries=n_queries, k=k,
+                          words_per_doc=words_per_doc, seed=seed, startup_repeats=startup_repeats),
+            "results": results}
+
+def _meta(**params) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count(), "params": params}
+
+# ------- Comparing runs -------
+def _flatten(tree: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Metric-by-metric comparison of two runs.
+    Returns one row per metric present in both, with the new/old ratio and a
+    "regression" flag when the metric got worse by more than `threshold`.
+    """
+    old_flat, new_flat = _flatten(old["results"]), _flatten(new["results"])
+    rows = []
+    for name in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[name], new_flat[name]
+        ratio = after / before if before else float("inf") if after else 1.0
+        higher_better = any(marker in name for marker in HIGHER_IS_BETTER)
+        worse = ratio < 1 - threshold if higher_better else ratio > 1 + threshold
+        if name.rsplit(".", 1)[-1] in NOT_COMPARED:
+            worse = False
+        rows.append({"metric": name, "old": before, "new": after, "ratio": ratio, "regression": worse})
+    return rows
+#
@@ -0,0 +1,49 @@
+#synthetic.py
+# Seeded synthetic corpora: documents drawn from a Zipf-distributed vocabulary
+# (like natural text, a few words are very frequent and most are rare), and
+# queries made of words sampled from a known document.
+from typing import List, Tuple
+
+import numpy as np
+
+DEFAULT_VOCABULARY_SIZE = 20000
+ZIPF_EXPONENT = 1.1
+
+def vocabulary(size: int = DEFAULT_VOCABULARY_SIZE) -> List[str]:
+    """Deterministic pseudo-words: w0, w1, ... (w0 is the most frequent)."""
+    return [f"w{i}" for i in range(size)]
+
+def synthetic_texts(n_docs: int, words_per_doc: int = 64, vocabulary_size: int = DEFAULT_VOCABULARY_SIZE,
+                    seed: int = 0) -> List[str]:
+    """
+    Generate documents of `words_per_doc` words each.
+
+    Args:
+        n_docs (int): Number of documents.
+        words_per_doc (int): Words per document.
+        vocabulary_size (int): Distinct words.
+        seed (int): Random seed; the same arguments always give the same corpus.
+
+    Returns:
+        List[str]: The documents, all distinct.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(vocabulary(vocabulary_size))
+    ranks = np.arange(1, vocabulary_size + 1)
+    probabilities = ranks ** -ZIPF_EXPONENT
+    probabilities /= probabilities.sum()
+    draws = rng.choice(vocabulary_size, size=(n_docs, words_per_doc), p=probabilities)
+    # A document-unique token keeps every text distinct (no dedup by hash)
+    return [f"doc{i} " + " ".join(words[row]) for i, row in enumerate(draws)]
+
+def synthetic_queries(texts: List[str], n_queries: int, words_per_query: int = 8,
+                      seed: int = 1) -> List[Tuple[str, int]]:
+    """(query, index of the document it was sampled from) pairs."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for target in rng.choice(len(texts), size=n_queries, replace=n_queries > len(texts)).tolist():
+        words = texts[target].split()[1:]
+        picked = rng.choice(len(words), size=min(words_per_query, len(words)), replace=False)
+        queries.append((" ".join(words[i] for i in sorted(picked)), target))
+    return queries
+#
@@ -0,0 +1,157 @@
+#bm25_index.py
+# Inverted index with BM25 scoring over the texts of a SimpleVectorDB.
+# Complements the embedding search on exact-term queries (names, numbers,
+# rare words). Posting lists are typed arrays, not lists of Python ints.
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import re
+
+import numpy as np
+
+from columnar import save_arrays
+
+BM25_K1 = 1.2  # Term-frequency saturation
+BM25_B = 0.75  # Document-length normalization
+MAX_TERM_FREQUENCY = 65535  # Term frequencies are stored as uint16
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens of a text."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """
+    Inverted index over the rows of a SimpleVectorDB.
+    Each term maps to two parallel arrays: the rows containing it (uint32) and
+    its frequency in each of them (uint16). Removed rows stop counting towards
+    the corpus statistics, document frequencies included; their postings are
+    dropped when the index is saved with a row map.
+    """
+    def __init__(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}  # term -> (rows, term frequencies)
+        self._doc_freq: Dict[str, int] = {}  # term -> live rows containing it
+        self._lengths = array('I')  # Tokens per row, 0 once removed
+        self._live_rows = 0
+        self._total_length = 0
+
+    @property
+    def n_rows(self) -> int:
+        """Number of rows indexed, removed ones included."""
+        return len(self._lengths)
+
+    def add(self, row: int, text: str) -> None:
+        """Index the text of the next row (rows are added in order)."""
+        if row != len(self._lengths):
+            raise ValueError(f"Expected row {len(self._lengths)}, got {row}")
+        tokens = tokenize(text)
+        for term, count in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('H'))
+            postings[0].append(row)
+            postings[1].append(min(count, MAX_TERM_FREQUENCY))
+            self._doc_freq[term] = self._doc_freq.get(term, 0) + 1
+        self._lengths.append(len(tokens))
+        self._live_rows += 1
+        self._total_length += len(tokens)
+
+    def remove(self, row: int, text: str) -> None:
+        """
+        Stop counting a row, whose text is `text`, in the corpus statistics
+        (the caller masks it out of results).
+        """
+        for term in set(tokenize(text)):
+            self._doc_freq[term] -= 1
+        self._live_rows -= 1
+        self._total_length -= self._lengths[row]
+        self._lengths[row] = 0
+
+    def search(self, text: str, k: int, deleted: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k for a query text.
+
+        Args:
+            text (str): Query text.
+            k (int): Number of results.
+            deleted (np.ndarray, optional): Boolean mask of rows to leave out.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (rows, scores), best first. Rows sharing
+            no term with the query are not returned.
+        """
+        if self._live_rows == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (self._total_length / self._live_rows))
+        scores = np.zeros(len(lengths), dtype=np.float32)
+
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            doc_freq = self._doc_freq[term]
+            if doc_freq == 0:
+                continue
+            rows = np.frombuffer(postings[0], dtype=np.uint32)
+            frequencies = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            idf = np.log(1 + (self._live_rows - doc_freq + 0.5) / (doc_freq + 0.5))
+            scores[rows] += idf * frequencies * (BM25_K1 + 1) / (frequencies + length_norm[rows])
+
+        if deleted is not None:
+            scores[deleted[:len(scores)]] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return candidates.astype(np.int64), scores[candidates]
+
+    def save(self, path: str, row_map: Optional[np.ndarray] = None) -> None:
+        """
+        Save the index to a .npz file: terms as one newline-separated UTF-8 blob,
+        postings concatenated in term order with per-term offsets.
+        `row_map` renumbers rows (old row -> new row, -1 to drop), as in IVFIndex.save.
+        """
+        terms = list(self._postings)
+        rows = [np.frombuffer(self._postings[term][0], dtype=np.uint32) for term in terms]
+        frequencies = [np.frombuffer(self._postings[term][1], dtype=np.uint16) for term in terms]
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        if row_map is not None:
+            keep = [row_map[term_rows] >= 0 for term_rows in rows]
+            rows = [row_map[term_rows][mask].astype(np.uint32) for term_rows, mask in zip(rows, keep)]
+            frequencies = [term_freqs[mask] for term_freqs, mask in zip(frequencies, keep)]
+            lengths = lengths[row_map[:len(lengths)] >= 0]
+            kept = [i for i, term_rows in enumerate(rows) if len(term_rows)]
+            terms = [terms[i] for i in kept]
+            rows = [rows[i] for i in kept]
+            frequencies = [frequencies[i] for i in kept]
+        sizes = np.array([len(term_rows) for term_rows in rows], dtype=np.int64)
+        save_arrays(
+            path,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            rows=np.concatenate(rows) if rows else np.empty(0, dtype=np.uint32),
+            frequencies=np.concatenate(frequencies) if frequencies else np.empty(0, dtype=np.uint16),
+            lengths=lengths
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index written by save()."""
+        index = cls()
+        with np.load(path) as archive:
+            blob = archive["terms"].tobytes().decode("utf-8")
+            terms = blob.split("\n") if blob else []
+            offsets = archive["offsets"].tolist()
+            rows, frequencies = archive["rows"], archive["frequencies"]
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                index._postings[term] = (array('I', rows[start:end].tobytes()),
+                                         array('H', frequencies[start:end].tobytes()))
+                index._doc_freq[term] = end - start
+            index._lengths = array('I', archive["lengths"].astype(np.uint32).tobytes())
+        index._live_rows = len(index._lengths)  # Saved indexes hold no removed rows
+        index._total_length = int(sum(index._lengths))
+        return index
+#
@@ -1,5 +1,29 @@
+import codecs
+import mmap
 import os
+import re
 import sys
+from array import array
+from collections import deque
+from collections.abc import Sequence
+
+READ_BLOCK_SIZE = 1 << 20  # Characters read at a time by iter_chunks
+DEFAULT_TARGET_TOKENS = 256  # all-minilm reads at most 256 tokens of a text; the rest would be ignored
+DEFAULT_OVERLAP_TOKENS = 32  # Whole sentences repeated from the previous chunk, up to this size
+CHARS_PER_TOKEN = 4  # Token estimate for English text
+PARAGRAPH_BREAK_FRACTION = 0.6  # A chunk this full ends at a paragraph break instead of running into the next paragraph
+MAX_ABBREVIATION_LOOKBACK = 12  # Characters inspected before a period to recognise an abbreviation
+
+_PARAGRAPH_BREAK = re.compile(r"\n[^\S\n]*\n\s*")
+# End of a sentence: punctuation, closing quotes/brackets, then a space and an upper-case or quoted start
+_SENTENCE_END = re.compile(r"""[.!?]+["'\u201d\u2019)\]]*(?=\s+["'\u201c\u2018(\[_]*[A-Z0-9])""")
+_LAST_WORD = re.compile(r"(\w+)\W*$")
+_WORD = re.compile(r"\S+")
+_ROMAN_NUMERAL = re.compile(r"[IVXLC]+$")  # Chapter numbers: "VIII. In Which..."
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "st", "jr", "sr", "prof", "rev", "capt", "col", "gen", "lt", "sgt",
+    "messrs", "mme", "mlle", "esq", "vs", "etc", "no", "vol", "ch", "chap", "pp", "co", "inc", "ltd"
+}
 
 def chunk_text(text, num_words, overlap_words):
     """
@@ -30,18 +54,296 @@ def chunk_text(text, num_words, overlap_words):
     
     return chunks
 
+def sentence_spans(text):
+    """
+    Split text into sentences, as character offsets.
+    Paragraphs are separated by blank lines (single line breaks are the hard
+    wrapping of Gutenberg-style texts); sentences end with . ! or ? followed by
+    an upper-case start, except after common abbreviations and initials
+    ("Mr. Penfield", "R. Austin Freeman").
+    
+    Args:
+        text (str): Input text.
+    
+    Returns:
+        list: (start, end, ends_paragraph) per sentence, without surrounding whitespace.
+    """
+    sentences = []
+    for paragraph_start, paragraph_end in _paragraph_spans(text):
+        start = paragraph_start
+        for match in _SENTENCE_END.finditer(text, paragraph_start, paragraph_end):
+            if match.group().startswith(".") and _is_abbreviation(text, match.start()):
+                continue
+            sentences.append((start, match.end(), False))
+            start = _skip_whitespace(text, match.end(), paragraph_end)
+        if start < paragraph_end:
+            sentences.append((start, paragraph_end, True))
+        elif sentences:
+            sentences[-1] = sentences[-1][:2] + (True,)
+    return sentences
+
+def _paragraph_spans(text):
+    start = _skip_whitespace(text, 0, len(text))
+    for match in _PARAGRAPH_BREAK.finditer(text, start):
+        end = _strip_end(text, start, match.start())
+        if end > start:
+            yield start, end
+        start = match.end()
+    end = _strip_end(text, start, len(text))
+    if end > start:
+        yield start, end
+
+def _skip_whitespace(text, position, end):
+    while position < end and text[position].isspace():
+        position += 1
+    return position
+
+def _strip_end(text, start, end):
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+def _is_abbreviation(text, period):
+    match = _LAST_WORD.search(text, max(0, period - MAX_ABBREVIATION_LOOKBACK), period)
+    if match is None:
+        return False
+    word = match.group(1)
+    return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()) or _ROMAN_NUMERAL.match(word) is not None
+
+def chunk_spans(text, target_tokens=DEFAULT_TARGET_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS, count_tokens=None):
+    """
+    Chunk text on sentence and paragraph boundaries, as character offsets.
+    Whole sentences are packed until the next one would exceed the target; a
+    chunk that is already PARAGRAPH_BREAK_FRACTION full stops at the end of its
+    paragraph. A chunk repeats the last whole sentences of the previous one up
+    to `overlap_tokens`, never across a paragraph break. Sentences longer than
+    the target are cut between words.
+    
+    Args:
+        text (str): Input text.
+        target_tokens (int): Tokens per chunk to aim for (and not exceed, except for single words).
+        overlap_tokens (int): Tokens of overlap with the previous chunk, at most.
+        count_tokens (callable, optional): Token count of a string (default: characters / CHARS_PER_TOKEN).
+    
+    Returns:
+        list: (start, end) per chunk; text[start:end] is the chunk.
+    """
+    if target_tokens < 1:
+        raise ValueError("Target token count must be a positive integer.")
+    if overlap_tokens < 0 or overlap_tokens >= target_tokens:
+        raise ValueError("Overlap must be non-negative and smaller than the target.")
+    
+    def size(start, end):
+        if count_tokens is None:
+            return (end - start) / CHARS_PER_TOKEN
+        return count_tokens(text[start:end])
+    
+    units = []
+    for start, end, ends_paragraph in sentence_spans(text):
+        if size(start, end) <= target_tokens:
+            units.append((start, end, ends_paragraph, size(start, end)))
+        else:
+            pieces = _split_words(text, start, end, target_tokens, size)
+            units.extend((s, e, ends_paragraph and e == end, size(s, e)) for s, e in pieces)
+    
+    spans = []
+    first = 0
+    while first < len(units):
+        last, total = first, 0
+        while last < len(units):
+            candidate = size(units[first][0], units[last][1])
+            if last > first and candidate > target_tokens:
+                break
+            total = candidate
+            last += 1
+            if units[last - 1][2] and total >= PARAGRAPH_BREAK_FRACTION * target_tokens:
+                break
+        spans.append((units[first][0], units[last - 1][1]))
+        if last == len(units):
+            break
+        
+        # Start the next chunk with the last sentences of this one, stopping at
+        # the first paragraph break on the way back
+        next_first, overlap = last, 0
+        while (next_first - 1 > first and not units[next_first - 1][2]
+               and overlap + units[next_first - 1][3] <= overlap_tokens):
+            overlap += units[next_first - 1][3]
+            next_first -= 1
+        first = next_first
+    return spans
+
+def _split_words(text, start, end, target_tokens, size):
+    """Cut an over-long sentence between words into pieces of at most target_tokens."""
+    pieces = []
+    piece_start = piece_end = None
+    for word in _WORD.finditer(text, start, end):
+        if piece_start is None:
+            piece_start = word.start()
+        elif size(piece_start, word.end()) > target_tokens:
+            pieces.append((piece_start, piece_end))
+            piece_start = word.start()
+        piece_end = word.end()
+    if piece_start is not None:
+        pieces.append((piece_start, piece_end))
+    return pieces
+
+class Chunks(Sequence):
+    """
+    Chunks of one text kept as (start, end) offsets into a single buffer: a
+    chunk's string is only sliced when it is accessed. The buffer is a str
+    (character offsets) or a bytes-like object such as an mmap (byte offsets,
+    decoded with `encoding`).
+    """
+    def __init__(self, buffer, spans, encoding=None):
+        self.buffer = buffer
+        self.encoding = encoding
+        self.starts = array("q", (start for start, _ in spans))
+        self.ends = array("q", (end for _, end in spans))
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        chunk = self.buffer[self.starts[index]:self.ends[index]]
+        return chunk.decode(self.encoding) if self.encoding else chunk
+    
+    def spans(self):
+        return list(zip(self.starts, self.ends))
+
+def byte_spans(text, spans, encoding="utf-8", text_start=0):
+    """
+    Convert character offsets into `text` to byte offsets into its encoded file.
+    `text_start` is the byte offset of text[0] in the file (e.g. 3 after a UTF-8 byte order mark).
+    """
+    offsets = {}
+    position, byte_position = 0, text_start
+    for offset in sorted({offset for span in spans for offset in span}):
+        byte_position += len(text[position:offset].encode(encoding))
+        offsets[offset] = byte_position
+        position = offset
+    return [(offsets[start], offsets[end]) for start, end in spans]
+
+def chunk_document(filename, target_tokens=DEFAULT_TARGET_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                   memory_map=False):
+    """
+    Boundary-aware chunks of a file (see chunk_spans), sliced lazily.
+    
+    Args:
+        filename (str): Path of the text file.
+        target_tokens (int): Tokens per chunk to aim for.
+        overlap_tokens (int): Tokens of overlap with the previous chunk, at most.
+        memory_map (bool): Slice the chunks from a read-only memory map of the
+            file instead of keeping the decoded text in memory.
+    
+    Returns:
+        Chunks: The chunks (character offsets into the decoded text, or byte offsets into the file).
+    """
+    if not memory_map or os.path.getsize(filename) == 0:
+        text = load_text(filename)
+        return Chunks(text, chunk_spans(text, target_tokens, overlap_tokens))
+    encoding = "utf-8" if detect_encoding(filename) == "utf-8-sig" else "latin-1"
+    with open(filename, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Offsets are computed on the raw bytes: line endings are kept as they are
+    # in the file (no newline translation), and a byte order mark only shifts
+    # them when the file actually starts with one
+    start = len(codecs.BOM_UTF8) if encoding == "utf-8" and buffer[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+    text = buffer[start:].decode(encoding)
+    spans = chunk_spans(text, target_tokens, overlap_tokens)
+    return Chunks(buffer, byte_spans(text, spans, encoding, start), encoding)
+
+def iter_chunks(filename, num_words, overlap_words):
+    """
+    Stream overlapping chunks of fixed word size from a file.
+    Yields exactly the same chunks as chunk_text(load_text(filename), ...), but
+    reads the file block by block and keeps only a sliding window of words, so
+    memory stays constant regardless of file size.
+    
+    Args:
+        filename (str): Path of the text file.
+        num_words (int): Words per chunk.
+        overlap_words (int): Overlap as a number of words.
+    
+    Yields:
+        str: One chunk at a time.
+    """
+    if overlap_words < 0:
+        raise ValueError("Overlap must be a non-negative integer.")
+    if num_words < 1:
+        raise ValueError("Chunk size must be a positive integer.")
+    
+    step = max(1, num_words - overlap_words)  # Ensure step ≥1 (and ≤ num_words)
+    
+    window = deque()
+    for word in iter_words(filename):
+        window.append(word)
+        if len(window) == num_words:
+            yield " ".join(window)
+            for _ in range(step):
+                window.popleft()
+    
+    # Shorter chunks at the end of the text, as chunk_text produces them
+    while window:
+        yield " ".join(window)
+        for _ in range(min(step, len(window))):
+            window.popleft()
+
+def iter_words(filename):
+    """
+    Stream the whitespace-separated words of a file (same words as text.split()),
+    decoding it with the same encoding fallback as load_text.
+    """
+    encoding = detect_encoding(filename)
+    carry = ""
+    with open(filename, "r", encoding=encoding) as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            block = carry + block
+            words = block.split()
+            # The last word may continue in the next block
+            carry = words.pop() if words and not block[-1].isspace() else ""
+            yield from words
+    if carry:
+        yield carry
+
+def detect_encoding(filename):
+    """
+    Pick the encoding load_text would use (UTF-8, else Latin-1), checking the
+    file incrementally instead of decoding it all in memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        with open(filename, "rb") as f:
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "latin-1"
+
 def save_chunks(chunks, filename):
     """
     Save chunks to files for inspection. Used in standalone mode.
+    Accepts any iterable of chunks (e.g. iter_chunks) and returns how many were saved.
     """
     base_name = os.path.splitext(os.path.basename(filename))[0]
     output_dir = "./out"
     os.makedirs(output_dir, exist_ok=True)
 
+    count = 0
     for idx, chunk in enumerate(chunks):
         output_filename = os.path.join(output_dir, f"{base_name}_{idx + 1:05d}.txt")
         with open(output_filename, "w", encoding="utf-8") as f:
             f.write(chunk)
+        count += 1
+    return count
 
 def load_text(filename):
     """
@@ -59,20 +361,21 @@ def load_text(filename):
             sys.exit(1)
 
 def main():
-    """Standalone mode: Save chunks to files for inspection. Overlap is in words."""
-    if len(sys.argv) < 4:
+    """Standalone mode: Save chunks to files for inspection. Overlap is in words (or tokens with --tokens)."""
+    if len(sys.argv) < 4 or (sys.argv[2] == "--tokens" and len(sys.argv) < 5):
         print("Usage: python chunking.py <filename> <num_words> <overlap_words>")
+        print("       python chunking.py <filename> --tokens <target_tokens> <overlap_tokens>")
         sys.exit(1)
 
     print("First argument = ", sys.argv[0])
     filename = sys.argv[1]
-    num_words = int(sys.argv[2])
-    overlap_words = int(sys.argv[3])
+    if sys.argv[2] == "--tokens":
+        chunks = chunk_document(filename, int(sys.argv[3]), int(sys.argv[4]), memory_map=True)
+    else:
+        chunks = iter_chunks(filename, int(sys.argv[2]), int(sys.argv[3]))
 
-    text = load_text(filename)
-    chunks = chunk_text(text, num_words, overlap_words)
-    save_chunks(chunks, filename)
-    print(f"Saved {len(chunks)} chunks to './out' folder.")
+    count = save_chunks(chunks, filename)
+    print(f"Saved {count} chunks to './out' folder.")
 
 if __name__ == "__main__":
     # Execute only when run as a standalone script
@@ -0,0 +1,124 @@
+#columnar.py
+# On-disk columnar layout used by SimpleVectorDB.
+# Every column is a plain file that can be memory-mapped, so opening a database
+# costs a few system calls and several processes share the same page cache.
+from typing import Callable, Iterator, List, Optional
+import os
+
+import numpy as np
+
+def atomic_write(path: str, writer: Callable) -> None:
+    """
+    Write a file through a temporary path and rename it into place, so readers
+    never see a half-written file. `writer` receives the open binary file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        writer(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_array(path: str, array: np.ndarray) -> None:
+    """Atomically save a NumPy array as a .npy file."""
+    atomic_write(path, lambda f: np.save(f, np.ascontiguousarray(array)))
+
+def save_arrays(path: str, **arrays: np.ndarray) -> None:
+    """Atomically save several NumPy arrays as one .npz file."""
+    atomic_write(path, lambda f: np.savez(f, **arrays))
+
+def sync_directory(path: str) -> None:
+    """Flush a directory entry (e.g. after a rename) to disk, where the platform allows it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def load_array(path: str, mmap: bool = True) -> np.ndarray:
+    """Load a .npy file, memory-mapped read-only by default."""
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+def map_bytes(path: str) -> np.ndarray:
+    """Memory-map a raw byte file read-only (empty files give an empty array)."""
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class StringColumn:
+    """
+    Append-only column of strings.
+    Loaded rows live in a UTF-8 byte blob plus an offsets array (both typically
+    memory-mapped) and are decoded on access; appended rows are kept in a list.
+    """
+    def __init__(self, blob: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._blob = blob if blob is not None else np.empty(0, dtype=np.uint8)
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._base_count = len(self._offsets) - 1
+        self._tail: List[str] = []
+
+    def __len__(self) -> int:
+        return self._base_count + len(self._tail)
+
+    def __getitem__(self, row: int) -> str:
+        if row < 0:
+            row += len(self)
+        if row < self._base_count:
+            start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+            return self._blob[start:end].tobytes().decode("utf-8")
+        return self._tail[row - self._base_count]
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def append(self, value: str) -> None:
+        self._tail.append(value)
+
+    def raw(self, row: int) -> bytes:
+        """UTF-8 bytes of one row."""
+        if row < self._base_count:
+            return self._blob[int(self._offsets[row]):int(self._offsets[row + 1])].tobytes()
+        return self._tail[row - self._base_count].encode("utf-8")
+
+    def save(self, blob_path: str, offsets_path: str, rows: Optional[np.ndarray] = None) -> None:
+        """
+        Write the column as <blob_path> (UTF-8 bytes) and <offsets_path> (.npy, int64).
+        When `rows` is given, only those rows are written, in that order.
+        """
+        if rows is not None:
+            values = [self.raw(row) for row in rows.tolist()]
+            offsets = np.concatenate([[0], np.cumsum([len(value) for value in values], dtype=np.int64)])
+
+            def write_rows(f):
+                for value in values:
+                    f.write(value)
+
+            atomic_write(blob_path, write_rows)
+            save_array(offsets_path, offsets.astype(np.int64))
+            return
+
+        base_size = int(self._offsets[-1])
+        encoded_tail = [value.encode("utf-8") for value in self._tail]
+        tail_offsets = np.cumsum([len(value) for value in encoded_tail], dtype=np.int64) + base_size
+        offsets = np.concatenate([np.asarray(self._offsets, dtype=np.int64), tail_offsets])
+
+        def write_blob(f):
+            if base_size:
+                f.write(memoryview(np.ascontiguousarray(self._blob[:base_size])))
+            for value in encoded_tail:
+                f.write(value)
+
+        atomic_write(blob_path, write_blob)
+        save_array(offsets_path, offsets)
+
+    @classmethod
+    def load(cls, blob_path: str, offsets_path: str) -> "StringColumn":
+        """Open a column written by save(), memory-mapping both files."""
+        return cls(map_bytes(blob_path), load_array(offsets_path))
+#
@@ -0,0 +1,168 @@
+#context.py
+# Context assembly for the RAG prompt. Retrieved chunks overlap their
+# neighbours (chunking with overlap), so chunks of the same source whose word
+# or character ranges overlap or touch are merged back into one contiguous span, near
+# duplicates (e.g. boilerplate shared by several books) are dropped, and spans
+# are added best first until the token budget is spent.
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import re
+
+from tracing import traced
+from vectordb import SimpleVectorDB
+
+DEFAULT_TOKEN_BUDGET = 3000  # Context tokens allowed in the prompt
+CHARS_PER_TOKEN = 4  # Token estimate for English text
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Share of a span's word shingles already in the context above which it is dropped
+SHINGLE_WORDS = 5
+MAX_MERGE_GAP_CHARS = 16  # Chunks with character offsets this close (whitespace between them) are merged
+_WORD = re.compile(r"\S+")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (about 4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _shingles(words: List[str]) -> Set[Tuple[str, ...]]:
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def _gap(length: int) -> str:
+    """Whitespace of `length` characters standing for the gap between two merged chunks."""
+    return " " * length if length < 2 else "\n\n" + " " * (length - 2)
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge chunks of the same source whose ranges overlap or touch.
+
+    Args:
+        chunks (List[Dict[str, Any]]): {"doc_id", "text", "score", "metadata"} per
+            retrieved chunk. Ranges come from "source" with "word_offset" (word
+            chunking) or "char_start"/"char_end" (sentence-aware chunking);
+            chunks without them stay as they are.
+
+    Returns:
+        List[Dict[str, Any]]: Spans {"text", "score" (best member), "doc_ids",
+        "source", "word_start", "word_end", "char_start", "char_end"}, best score first.
+    """
+    spans = []
+    by_source: Dict[Tuple[str, str], List[Tuple[int, Dict[str, Any]]]] = {}
+    for chunk in chunks:
+        metadata = chunk.get("metadata") or {}
+        if "source" in metadata and "char_start" in metadata:
+            by_source.setdefault(("char", metadata["source"]), []).append((metadata["char_start"], chunk))
+        elif "source" in metadata and "word_offset" in metadata:
+            by_source.setdefault(("word", metadata["source"]), []).append((metadata["word_offset"], chunk))
+        else:
+            spans.append({"parts": [chunk["text"]], "score": chunk["score"], "doc_ids": [chunk["doc_id"]],
+                          "source": metadata.get("source"), "unit": None, "start": None, "end": None})
+
+    for (unit, source), members in by_source.items():
+        members.sort(key=lambda member: member[0])
+        current = None
+        for offset, chunk in members:
+            # Word ranges are lists of words; character ranges are exact slices of the source
+            content = chunk["text"].split() if unit == "word" else chunk["text"]
+            end = offset + len(content)
+            if current is not None and offset <= current["end"] + (MAX_MERGE_GAP_CHARS if unit == "char" else 0):
+                if offset > current["end"]:
+                    current["parts"].append(_gap(offset - current["end"]) + content)
+                else:
+                    # Append only what lies past the end of the current span
+                    current["parts"].append(content[current["end"] - offset:])
+                current["end"] = max(current["end"], end)
+                current["score"] = max(current["score"], chunk["score"])
+                current["doc_ids"].append(chunk["doc_id"])
+                continue
+            current = {"parts": [content], "score": chunk["score"], "doc_ids": [chunk["doc_id"]],
+                       "source": source, "unit": unit, "start": offset, "end": end}
+            spans.append(current)
+
+    spans.sort(key=lambda span: span["score"], reverse=True)
+    merged = []
+    for span in spans:
+        parts, unit = span.pop("parts"), span.pop("unit")
+        start, end = span.pop("start"), span.pop("end")
+        span["text"] = " ".join(word for part in parts for word in part) if unit == "word" else "".join(parts)
+        span["word_start"], span["word_end"] = (start, end) if unit == "word" else (None, None)
+        span["char_start"], span["char_end"] = (start, end) if unit == "char" else (None, None)
+        merged.append(span)
+    return merged
+
+@traced("build_context")
+def build_context(
+    db: SimpleVectorDB,
+    results: List[Tuple[str, float]],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    near_duplicate_threshold: Optional[float] = NEAR_DUPLICATE_THRESHOLD
+) -> List[Dict[str, Any]]:
+    """
+    Turn retrieval results into the spans to put in the prompt.
+
+    Args:
+        db (SimpleVectorDB): The database the results come from.
+        results (List[Tuple[str, float]]): (doc_id, score), as returned by a query.
+        token_budget (int): Most tokens the spans may add up to. A span that does
+            not fit is skipped, except the best one, which is cut to the budget.
+        count_tokens (Callable): Token counter (default: a character-based estimate).
+        near_duplicate_threshold (float, optional): Drop a span when at least this
+            share of its 5-word shingles is already in the selected spans (None = keep all).
+
+    Returns:
+        List[Dict[str, Any]]: Spans as returned by merge_chunks, each with a "tokens" count, best first.
+    """
+    chunks = [{"doc_id": doc_id, "text": db.get_text(doc_id), "score": score, "metadata": db.get_metadata(doc_id)}
+              for doc_id, score in results]
+
+    selected, seen_shingles = [], set()
+    remaining = token_budget
+    for span in merge_chunks(chunks):
+        if near_duplicate_threshold is not None:
+            shingles = _shingles(span["text"].split())
+            if len(shingles & seen_shingles) >= near_duplicate_threshold * len(shingles):
+                continue
+        tokens = count_tokens(span["text"])
+        if tokens > remaining:
+            if selected:
+                continue
+            # Never return an empty context: cut the best span to the budget, after a word
+            words = list(_WORD.finditer(span["text"]))
+            keep = max(1, int(len(words) * remaining / tokens))
+            cut = words[keep - 1].end()
+            span["text"] = span["text"][:cut]
+            if span["word_start"] is not None:
+                span["word_end"] = span["word_start"] + keep
+            if span["char_start"] is not None:
+                span["char_end"] = span["char_start"] + cut
+            tokens = count_tokens(span["text"])
+        span["tokens"] = tokens
+        remaining -= tokens
+        selected.append(span)
+        if near_duplicate_threshold is not None:
+            seen_shingles |= shingles
+    return selected
+#
+
+def build_prompt(question: str, fragments: List[Tuple[str, float]]) -> str:
+    """
+    RAG prompt from the retrieved fragments.
+
+    Args:
+        question (str): The user's question.
+        fragments (List[Tuple[str, float]]): (text, score) per retrieved document, best first.
+    """
+    texts = ""
+    for i, (text, score) in enumerate(fragments):
+        texts += f"Fragment {i+1} (score: {score:.4f}): {text}\n\n"
+
+    return f"""
+        I have the following fragments of information in my database:
+
+        {texts}
+
+        Based on these fragments, please answer the following question:
+        {question}
+
+        If no information is relevant to the question, please say so.
+        """
+#
@@ -0,0 +1,98 @@
+#corpus.py
+# Multi-file corpus ingestion: files are decoded and chunked in parallel worker
+# processes, and their chunks are streamed back, in a deterministic order
+# (sorted file paths, then chunk order), with provenance metadata attached.
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import glob
+import os
+
+from chunking import load_text, chunk_spans, chunk_text, DEFAULT_OVERLAP_TOKENS
+
+DEFAULT_PATTERN = "*.txt"  # Files picked up when a directory is given
+
+def expand_sources(sources: Union[str, Iterable[str]]) -> List[str]:
+    """
+    Resolve files, directories (recursively, DEFAULT_PATTERN) and glob patterns
+    into a sorted, de-duplicated list of file paths.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    files = set()
+    for source in sources:
+        if os.path.isdir(source):
+            files.update(glob.glob(os.path.join(source, "**", DEFAULT_PATTERN), recursive=True))
+        elif os.path.isfile(source):
+            files.add(source)
+        else:
+            files.update(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+    return sorted({os.path.normpath(path) for path in files})
+
+def chunk_file(path: str, num_words: Optional[int], overlap_words: int,
+               target_tokens: Optional[int] = None,
+               overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Load and chunk one file (runs in a worker process).
+    Returns (chunk, provenance) pairs; the provenance gives the source file, the
+    chunk's position in it and the offset of its first word - or, with
+    target_tokens (sentence-aware chunking), its character offsets in the text.
+    """
+    text = load_text(path)
+    if target_tokens is not None:
+        return [
+            (text[start:end], {"source": path, "chunk_index": index, "char_start": start, "char_end": end})
+            for index, (start, end) in enumerate(chunk_spans(text, target_tokens, overlap_tokens))
+        ]
+    chunks = chunk_text(text, num_words, overlap_words)
+    step = max(1, num_words - overlap_words)  # Same step as chunk_text
+    return [
+        (chunk, {"source": path, "chunk_index": index, "word_offset": index * step})
+        for index, chunk in enumerate(chunks)
+    ]
+
+def iter_corpus_chunks(
+    sources: Union[str, Iterable[str]],
+    num_words: Optional[int] = None,
+    overlap_words: int = 0,
+    processes: Optional[int] = None,
+    target_tokens: Optional[int] = None,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Chunk every file of a corpus across a process pool.
+
+    At most 2 files per process are in flight, so results stream back instead
+    of piling up, and they are yielded in file order regardless of which
+    process finishes first - ingesting the same corpus always gives the same
+    doc_ids.
+
+    Args:
+        sources (str | Iterable[str]): Files, directories or glob patterns.
+        num_words (int, optional): Words per chunk (fixed-size word chunking).
+        overlap_words (int): Overlap as a number of words.
+        processes (int, optional): Worker processes (default: CPU count).
+        target_tokens (int, optional): Tokens per chunk for sentence/paragraph-aware
+            chunking (see chunking.chunk_spans), instead of num_words.
+        overlap_tokens (int): Overlap of sentence-aware chunks, in tokens.
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: (chunk, provenance) pairs.
+    """
+    if (num_words is None) == (target_tokens is None):
+        raise ValueError("Give either num_words or target_tokens.")
+    files = expand_sources(sources)
+    if not files:
+        return
+    from concurrent.futures import ProcessPoolExecutor  # Not needed by the single-file helpers
+    processes = processes or os.cpu_count() or 1
+    max_in_flight = 2 * processes
+
+    with ProcessPoolExecutor(max_workers=min(processes, len(files))) as pool:
+        pending = []
+        next_file = 0
+        while next_file < len(files) or pending:
+            while next_file < len(files) and len(pending) < max_in_flight:
+                pending.append(pool.submit(chunk_file, files[next_file], num_words, overlap_words,
+                                           target_tokens, overlap_tokens))
+                next_file += 1
+            yield from pending.pop(0).result()
+#
@@ -0,0 +1,116 @@
+#embed_cache.py
+# Persistent, content-addressed embedding cache in a single SQLite file.
+# Entries are keyed by (embedding model, MD5 of the text) - the same hash
+# SimpleVectorDB uses, from text_hash - so rebuilding a database only embeds
+# chunks that were never seen before.
+from array import array
+from typing import Dict, List, Optional, Sequence
+import sqlite3
+import threading
+import time
+
+from text_hash import compute_hash
+
+DEFAULT_CACHE_PATH = "embed_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 1_000_000  # Least recently used entries are evicted beyond this
+EVICTION_SLACK = 0.1  # Evict 10% below the limit at once so eviction stays rare
+SQLITE_MAX_VARIABLES = 900  # Keys per IN (...) lookup, below SQLite's parameter limit
+
+class EmbeddingCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # One connection shared by all threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Upper bound on the number of entries (replaced rows are counted twice),
+        # so the exact COUNT(*) only runs when eviction may be needed
+        self._count_bound = self._count()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Cached embedding of `text` for `model`, or None."""
+        return self.get_many(model, [text])[0]
+
+    def put(self, model: str, text: str, embedding: Sequence[float]) -> None:
+        self.put_many(model, [text], [embedding])
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached embeddings for each text (None for misses), refreshing their LRU stamp."""
+        hashes = [compute_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), SQLITE_MAX_VARIABLES):
+                keys = unique[start:start + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(keys))})",
+                    [model, *keys]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(text_hash) for text_hash in hashes]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """Store embeddings, evicting the least recently used entries beyond max_entries."""
+        now = time.time()
+        rows = [
+            (model, compute_hash(text), array('f', embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._count_bound += len(rows)
+            if self._count_bound > self.max_entries:
+                count = self._count()
+                if count > self.max_entries:
+                    target = int(self.max_entries * (1 - EVICTION_SLACK))
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE (model, text_hash) IN "
+                        "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (count - target,)
+                    )
+                    count = target
+                self._count_bound = count
+            self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+#
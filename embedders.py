@@ -0,0 +1,299 @@
+#embedders.py
+# Embedding backends behind one interface (Embedder): Ollama over HTTP, an
+# in-process CPU runner for small sentence-transformer models (ONNX Runtime or
+# PyTorch), and a deterministic hash-based fake for tests and benchmarks.
+# embeds.py picks one from the configuration (EMBED_BACKEND) and adds the
+# persistent cache on top.
+from typing import Any, List, Optional, Protocol, Tuple, runtime_checkable
+from functools import lru_cache
+import hashlib
+import os
+import time
+
+import numpy as np
+
+BACKENDS = ("ollama", "onnx", "torch", "hash")
+DEFAULT_MODELS = {
+    "ollama": "all-minilm",
+    "onnx": "all-MiniLM-L6-v2",  # Directory with model.onnx and tokenizer.json
+    "torch": "sentence-transformers/all-MiniLM-L6-v2",
+    "hash": "hash"
+}
+OLLAMA_EMBEDDING_KEY = "embeddings"
+OLLAMA_BATCH_SIZE = 64  # Texts sent per ollama.embed call
+OLLAMA_MAX_RETRIES = 3  # Attempts per batch before giving up
+OLLAMA_RETRY_DELAY = 0.5  # Seconds before the first retry, doubled on each retry
+LOCAL_MAX_BATCH = 64  # Texts per forward pass of the local runner
+LOCAL_MAX_BATCH_TOKENS = 8192  # Padded tokens per forward pass (batch size x longest text)
+LOCAL_MAX_LENGTH = 256  # Tokens per text; longer texts are truncated (MiniLM was trained on 256)
+HASH_DIMENSION = 384  # Same as all-minilm
+
+@runtime_checkable
+class Embedder(Protocol):
+    """What every backend provides. `model_id` names the vector space (used as the cache key)."""
+    model_id: str
+
+    def embed(self, text: str) -> List[float]:
+        ...
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        ...
+#
+
+class OllamaEmbedder:
+    """Embeddings from an Ollama server, batched, with retries and adaptive batch size."""
+    def __init__(self, model: str = DEFAULT_MODELS["ollama"], batch_size: int = OLLAMA_BATCH_SIZE):
+        import ollama  # Only needed for this backend
+        self._ollama = ollama
+        self.model = model
+        self.model_id = model  # Same key as before the backends existed, so cached vectors stay valid
+        self.batch_size = batch_size
+
+    def _request(self, texts: Any) -> List[Any]:
+        ollama_response = self._ollama.embed(model=self.model, input=texts)
+        embeddings = ollama_response.get(OLLAMA_EMBEDDING_KEY)
+        if embeddings is None:
+            failure_message = f"No [{OLLAMA_EMBEDDING_KEY}] key found in response: {ollama_response}"
+            raise ValueError(failure_message)
+        return embeddings
+
+    def embed(self, text: str) -> List[float]:
+        embedding = self._request(text)
+        # Ensure the embedding is a flat list
+        if any(isinstance(i, list) for i in embedding):
+            embedding = [item for sublist in embedding for item in sublist]
+        return embedding
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Embed texts in batches of up to `batch_size`, one ollama.embed call each.
+
+        A failing batch is retried with exponential backoff; when it keeps failing
+        it is split in half (the server may reject or time out on large requests)
+        and the smaller size is used from then on, growing back after a run of
+        successful batches.
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings: List[List[float]] = []
+        current_size = max(1, batch_size)
+        successes = 0
+        start = 0
+
+        while start < len(texts):
+            batch = texts[start:start + current_size]
+
+            last_error = None
+            for attempt in range(OLLAMA_MAX_RETRIES):
+                try:
+                    vectors = self._request(batch)
+                    if len(vectors) != len(batch):
+                        raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+                    embeddings.extend(list(vector) for vector in vectors)
+                    break
+                except Exception as e:
+                    last_error = e
+                    if attempt < OLLAMA_MAX_RETRIES - 1:  # No wait after the last attempt
+                        time.sleep(OLLAMA_RETRY_DELAY * (2 ** attempt))
+            else:
+                # The batch kept failing: shrink it, or give up on a single text
+                if len(batch) == 1:
+                    raise RuntimeError(f"Embedding failed after {OLLAMA_MAX_RETRIES} attempts: {last_error}")
+                current_size = max(1, len(batch) // 2)
+                successes = 0
+                continue
+
+            start += len(batch)
+            successes += 1
+
+            # Grow back towards the requested size after a few successful batches
+            if current_size < batch_size and successes >= 4:
+                current_size = min(batch_size, current_size * 2)
+                successes = 0
+
+        return embeddings
+#
+
+def length_batches(lengths: List[int], max_batch: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group text indices into batches of similar length (dynamic batching).
+    Texts are sorted by token count, so little padding is computed, and a batch
+    closes when it has `max_batch` texts or its padded size (texts x longest)
+    would exceed `max_batch_tokens`.
+    """
+    batches, batch, longest = [], [], 0
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        longest_with = max(longest, lengths[i])
+        if batch and (len(batch) == max_batch or longest_with * (len(batch) + 1) > max_batch_tokens):
+            batches.append(batch)
+            batch, longest_with = [], lengths[i]
+        batch.append(i)
+        longest = longest_with
+    if batch:
+        batches.append(batch)
+    return batches
+
+class LocalEmbedder:
+    """
+    Sentence-transformer model (e.g. MiniLM) run in-process on the CPU: no
+    daemon and no HTTP round-trip. Token embeddings are mean-pooled over the
+    attention mask and L2-normalized, as sentence-transformers does.
+
+    runtime="onnx" needs onnxruntime and tokenizers, and `model` is a directory
+    holding model.onnx and tokenizer.json (an ONNX export of the model).
+    runtime="torch" needs torch and transformers, and `model` is a Hugging Face
+    model name or directory.
+    """
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        runtime: str = "onnx",
+        threads: Optional[int] = None,
+        max_batch: int = LOCAL_MAX_BATCH,
+        max_batch_tokens: int = LOCAL_MAX_BATCH_TOKENS,
+        max_length: int = LOCAL_MAX_LENGTH
+    ):
+        """
+        Args:
+            model (str, optional): Model directory or name (default per runtime, see DEFAULT_MODELS).
+            runtime (str): "onnx" or "torch".
+            threads (int, optional): CPU threads of one forward pass (default: all cores).
+            max_batch (int): Texts per forward pass.
+            max_batch_tokens (int): Padded tokens per forward pass.
+            max_length (int): Tokens kept per text.
+        """
+        if runtime not in ("onnx", "torch"):
+            raise ValueError(f"Unknown runtime {runtime!r}; expected 'onnx' or 'torch'")
+        self.model = model or DEFAULT_MODELS[runtime]
+        self.runtime = runtime
+        self.model_id = f"{runtime}:{os.path.basename(os.path.normpath(self.model))}"
+        self.threads = threads or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        if runtime == "onnx":
+            self._load_onnx()
+        else:
+            self._load_torch()
+
+    def _load_onnx(self) -> None:
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(self.model, "tokenizer.json"))
+        self._tokenizer.no_padding()
+        self._tokenizer.enable_truncation(self.max_length)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(os.path.join(self.model, "model.onnx"), options,
+                                                     providers=["CPUExecutionProvider"])
+        self._input_names = {node.name for node in self._session.get_inputs()}
+
+    def _load_torch(self) -> None:
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        torch.set_num_threads(self.threads)
+        self._torch = torch
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model)
+        self._model = AutoModel.from_pretrained(self.model).eval()
+
+    def _tokenize(self, texts: List[str]) -> List[List[int]]:
+        if self.runtime == "onnx":
+            return [encoding.ids for encoding in self._tokenizer.encode_batch(texts)]
+        return self._tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Token embeddings (batch, tokens, hidden) of a padded batch."""
+        if self.runtime == "onnx":
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            return self._session.run(None, feeds)[0]
+        with self._torch.inference_mode():
+            output = self._model(input_ids=self._torch.from_numpy(input_ids),
+                                 attention_mask=self._torch.from_numpy(attention_mask))
+        return output.last_hidden_state.numpy()
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed texts in length-sorted batches; results are returned in input order."""
+        token_ids = self._tokenize(texts)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in length_batches([len(ids) for ids in token_ids], batch_size or self.max_batch,
+                                    self.max_batch_tokens):
+            longest = max(len(token_ids[i]) for i in batch)
+            input_ids = np.zeros((len(batch), longest), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), longest), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :len(token_ids[i])] = token_ids[i]
+                attention_mask[row, :len(token_ids[i])] = 1
+
+            hidden = self._forward(input_ids, attention_mask)
+            mask = attention_mask[:, :, None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for row, i in enumerate(batch):
+                vectors[i] = pooled[row].tolist()
+        return vectors
+#
+
+class HashEmbedder:
+    """
+    Deterministic offline embedder: feature hashing of the words of a text into
+    `dim` signed buckets. Texts sharing words get similar vectors, so retrieval
+    has real neighbours, and the same text always gets the same vector on every
+    machine (no model, no network). Meant for tests and benchmarks.
+    """
+    def __init__(self, dim: int = HASH_DIMENSION, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+        self.model_id = f"hash:{dim}:{seed}"
+        self._bucket = lru_cache(maxsize=1 << 20)(self._hash_word)
+
+    def _hash_word(self, word: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8, salt=self.seed.to_bytes(16, "little")).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, text: str) -> List[float]:
+        """Unit-length embedding of one text (the zero vector for a text without words)."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            bucket, sign = self._bucket(word)
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        return [self.embed(text) for text in texts]
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        """Batch form, usable wherever an embed_fn over a list of texts is expected."""
+        return self.embed_batch(texts)
+#
+
+def make_embedder(backend: str = "ollama", model: Optional[str] = None, **options) -> Embedder:
+    """
+    Build an embedding backend.
+
+    Args:
+        backend (str): "ollama", "onnx", "torch" (in-process CPU runner) or "hash".
+        model (str, optional): Model name or directory (default per backend, see DEFAULT_MODELS).
+        **options: Backend options, e.g. threads / max_batch for the local runner,
+            dim / seed for the hash embedder.
+
+    Returns:
+        Embedder: The backend.
+    """
+    if backend == "ollama":
+        return OllamaEmbedder(model or DEFAULT_MODELS["ollama"], **options)
+    if backend in ("onnx", "torch"):
+        return LocalEmbedder(model, runtime=backend, **options)
+    if backend == "hash":
+        return HashEmbedder(**options)
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+#
@@ -1,24 +1,117 @@
-import ollama
-from typing import List
+import os
+import threading
+from typing import List, Optional
 
-EMBED_MODEL = "all-minilm" #"llama3.2:latest"
-OLLAMA_EMBEDDING_KEY = "embeddings"
+from embed_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from embedders import DEFAULT_MODELS, Embedder, OLLAMA_BATCH_SIZE, make_embedder
+from tracing import traced
 
-def embed_with_ollama(text: str) -> List[float]:
-    
-    ollama_response = ollama.embed(model=EMBED_MODEL, input=text)
-    embedding = ollama_response.get(OLLAMA_EMBEDDING_KEY)
-    if embedding is None:
-        failure_message = f"No [{OLLAMA_EMBEDDING_KEY}] key found in response: {ollama_response}"
-        raise ValueError(failure_message)
+# Backend selection: ollama (default), onnx / torch (in-process CPU runner) or hash (offline fake)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "ollama")
+EMBED_MODEL = os.getenv("EMBED_MODEL", DEFAULT_MODELS.get(EMBED_BACKEND, "all-minilm")) #"llama3.2:latest"
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0)) or None  # CPU threads of the local runner (default: all)
+EMBED_BATCH_SIZE = OLLAMA_BATCH_SIZE  # Texts sent per request by embed_batch
+USE_EMBED_CACHE = True  # Look embeddings up in the persistent cache before calling the backend
+EMBED_CACHE_PATH = DEFAULT_CACHE_PATH
+
+_embedder: Optional[Embedder] = None
+_ollama_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+_embed_cache: Optional[EmbeddingCache] = None
+_embed_cache_lock = threading.Lock()
+
+def get_embedder() -> Embedder:
+    """The configured embedding backend, built on first use."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            options = {"threads": EMBED_THREADS} if EMBED_BACKEND in ("onnx", "torch") else {}
+            _embedder = make_embedder(EMBED_BACKEND, EMBED_MODEL, **options)
+    return _embedder
+#
+
+def set_embedder(embedder: Embedder) -> None:
+    """Use `embedder` for embed_text / embed_batch from now on (e.g. a HashEmbedder in tests)."""
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+#
+
+def get_embed_cache() -> Optional[EmbeddingCache]:
+    """The shared embedding cache, opened on first use (None when disabled)."""
+    global _embed_cache
+    if not USE_EMBED_CACHE:
+        return None
+    with _embed_cache_lock:
+        if _embed_cache is None:
+            _embed_cache = EmbeddingCache(EMBED_CACHE_PATH)
+    return _embed_cache
+#
+
+def _embed_cached(embedder: Embedder, text: str) -> List[float]:
+    cache = get_embed_cache()
+    if cache is not None:
+        cached = cache.get(embedder.model_id, text)
+        if cached is not None:
+            return cached
     #
     
-    # Ensure the embedding is a flat list
-    if any(isinstance(i, list) for i in embedding):
-        embedding = [item for sublist in embedding for item in sublist]
+    embedding = embedder.embed(text)
+    
+    if cache is not None:
+        cache.put(embedder.model_id, text, embedding)
     return embedding
 #
 
+@traced("embed")
+def embed_text(text: str) -> List[float]:
+    """Embed one text with the configured backend (through the cache)."""
+    return _embed_cached(get_embedder(), text)
+#
+
+@traced("embed")
+def embed_with_ollama(text: str) -> List[float]:
+    """Embed one text with Ollama, even when another backend is configured (through the cache)."""
+    global _ollama_embedder
+    if EMBED_BACKEND == "ollama":
+        return _embed_cached(get_embedder(), text)
+    with _embedder_lock:
+        if _ollama_embedder is None:
+            _ollama_embedder = make_embedder("ollama")
+    return _embed_cached(_ollama_embedder, text)
+#
+
+@traced("embed_batch")
+def embed_batch(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    """
+    Embed many texts with the configured backend, in as few requests (or
+    forward passes) as possible.
+
+    Texts already in the embedding cache are not sent; the others (deduplicated)
+    are embedded and stored in the cache.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        batch_size (int): Maximum number of texts per request.
+
+    Returns:
+        List[List[float]]: One embedding per input text, in the same order.
+    """
+    embedder = get_embedder()
+    cache = get_embed_cache()
+    if cache is None:
+        return embedder.embed_batch(texts, batch_size)
+
+    embeddings = cache.get_many(embedder.model_id, texts)
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+        computed = dict(zip(missing, embedder.embed_batch(missing, batch_size)))
+        cache.put_many(embedder.model_id, missing, [computed[text] for text in missing])
+        embeddings = [computed[text] if embedding is None else embedding
+                      for text, embedding in zip(texts, embeddings)]
+    return embeddings
+#
+
 
 # Example usage
 if __name__ == "__main__":
@@ -26,7 +119,7 @@ if __name__ == "__main__":
     # Query
     query = "What animals are llamas related to?"
     print(f"QUERY: {query}")
-    query_embedding = embed_with_ollama(query)
+    query_embedding = embed_text(query)
     print(f"Embedding: {query_embedding}")
     # show dimension of embedding
     print(f"Dimension: {len(query_embedding)}")
@@ -0,0 +1,169 @@
+#ivf_index.py
+# Inverted-file (IVF) approximate nearest-neighbour index for SimpleVectorDB.
+# Vectors are clustered with spherical k-means; a query only scores the rows
+# of the `nprobe` clusters whose centroids are closest to it.
+from array import array
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from columnar import save_arrays
+
+DEFAULT_NPROBE = 8  # Clusters scanned per query: higher = better recall, slower
+KMEANS_ITERATIONS = 20
+TRAIN_POINTS_PER_LIST = 256  # Training sample size per cluster
+ASSIGN_BLOCK_ROWS = 16384  # Rows assigned to centroids per matrix product
+
+class IVFIndex:
+    """
+    IVF index over the unit-length rows of a SimpleVectorDB matrix.
+    The index only stores row numbers per cluster; vectors stay in the database.
+    """
+    def __init__(self, n_lists: Optional[int] = None, nprobe: int = DEFAULT_NPROBE, seed: int = 0):
+        self.n_lists = n_lists  # None = pick sqrt(N) at training time
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self._lists: List[array] = []  # Row numbers per cluster
+        self._removed: Dict[int, Set[int]] = {}  # Rows removed per cluster, not yet filtered out of it
+
+    @property
+    def is_trained(self) -> bool:
+        return len(self.centroids) > 0
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Learn the cluster centroids from unit-length vectors and assign all of them.
+
+        Args:
+            vectors (np.ndarray): Matrix of shape (N, dim), rows already normalized.
+        """
+        if len(vectors) == 0:
+            raise ValueError("Cannot train an IVF index on an empty database")
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(self.seed)
+
+        # Train on a sample to keep k-means cost bounded on large corpora
+        sample_size = min(len(vectors), n_lists * TRAIN_POINTS_PER_LIST)
+        sample = np.asarray(vectors[rng.choice(len(vectors), sample_size, replace=False)], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # Re-seed empty clusters with random sample points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)
+
+        self.centroids = centroids.astype(np.float32)
+        self._lists = [array('q') for _ in range(n_lists)]
+        self._removed = {}
+        self.add(np.arange(len(vectors)), vectors)
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Assign rows (with their unit-length vectors) to their nearest cluster."""
+        if not self.is_trained:
+            return
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(rows), -1)
+        for start in range(0, len(rows), ASSIGN_BLOCK_ROWS):
+            block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+            labels = np.argmax(block @ self.centroids.T, axis=1)
+            for row, label in zip(rows[start:start + ASSIGN_BLOCK_ROWS].tolist(), labels.tolist()):
+                self._lists[label].append(row)
+                if self._removed and label in self._removed:
+                    self._removed[label].discard(row)  # Removed, then added again
+
+    def remove(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Remove rows (with the vectors they were added with) from their cluster.
+        Removals are only recorded here; a cluster is rebuilt once, with a single
+        mask, the next time it is searched or saved, so deleting many rows costs
+        one pass per affected cluster rather than one per row.
+        """
+        if not self.is_trained:
+            return
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(rows), -1)
+        labels = np.argmax(vectors @ self.centroids.T, axis=1)
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self._removed.setdefault(label, set()).add(row)
+
+    def _rows(self, label: int) -> np.ndarray:
+        """Row numbers of a cluster, with the pending removals filtered out."""
+        removed = self._removed.pop(label, None)
+        if removed:
+            rows = np.frombuffer(self._lists[label], dtype=np.int64)
+            keep = ~np.isin(rows, np.fromiter(removed, dtype=np.int64, count=len(removed)))
+            self._lists[label] = array('q', rows[keep].tobytes())
+        return np.frombuffer(self._lists[label], dtype=np.int64)
+
+    def search(self, score_rows: Callable[[np.ndarray], np.ndarray], query: np.ndarray, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k for one unit-length query.
+
+        Args:
+            score_rows (Callable): Scores the query against an array of row numbers
+                (the database decides whether from float32 rows or quantized codes).
+            query (np.ndarray): Unit-length query vector.
+            k (int): Number of results.
+            nprobe (int, optional): Clusters to scan; defaults to self.nprobe.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (rows, scores), best first.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidates = [rows for rows in (self._rows(c) for c in probes) if len(rows)]
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(candidates)
+        scores = score_rows(rows)
+
+        k = min(k, len(rows))
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+    def save(self, path: str, row_map: Optional[np.ndarray] = None) -> None:
+        """
+        Save centroids and cluster assignments to a .npz file.
+        `row_map` renumbers rows (old row -> new row, -1 to drop) for a database
+        being saved without its deleted rows.
+        """
+        lists = [self._rows(label) for label in range(len(self._lists))]
+        if row_map is not None:
+            lists = [row_map[rows] for rows in lists]
+            lists = [rows[rows >= 0] for rows in lists]
+        sizes = np.array([len(rows) for rows in lists], dtype=np.int64)
+        rows = np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+        save_arrays(path, centroids=self.centroids, sizes=sizes, rows=rows,
+                    params=np.array([self.n_lists or 0, self.nprobe, self.seed], dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Load an index written by save()."""
+        with np.load(path) as archive:
+            n_lists, nprobe, seed = archive["params"].tolist()
+            index = cls(n_lists=n_lists or None, nprobe=nprobe, seed=seed)
+            index.centroids = archive["centroids"]
+            offsets = np.concatenate([[0], np.cumsum(archive["sizes"])])
+            rows = archive["rows"]
+            index._lists = [array('q', rows[offsets[i]:offsets[i + 1]].tolist())
+                            for i in range(len(offsets) - 1)]
+        return index
+#
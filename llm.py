@@ -1,24 +1,94 @@
 #llm_query.py
 # -------------------------- NATIVE --------------------
 import os
-# -------------------------- REQUIREMENTS.TXT ----------
-from dotenv import load_dotenv  # For loading .env file
-from openai import OpenAI
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional
 # -------------------------- LOCAL ---------------------
+from llm_cache import LLMResponseCache, DEFAULT_CACHE_PATH, is_deterministic, response_key
+from llm_client import LLMClient, DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
+from tracing import span, tracer
 
 # ------------------------------------------------------
-# Load environment variables from .env file
-load_dotenv()
-
 VERBOSE = False
-MODEL = os.getenv("LLM_MODEL")  # Replace with your model name
-OPENAI_API_KEY = os.getenv("API_KEY")  # Read API key from .env
 
-# initialize the OpenAI client
-client = OpenAI()
+# Settings, read from the environment and the .env file by load_settings() on
+# first use rather than at import time, so importing this module stays cheap
+MODEL: Optional[str] = None  # LLM_MODEL
+OPENAI_API_KEY: Optional[str] = None  # API_KEY
+LLM_TIMEOUT = DEFAULT_TIMEOUT  # Seconds per response
+LLM_MAX_RETRIES = DEFAULT_MAX_RETRIES  # On 429 / 5xx / network errors
+LLM_REQUESTS_PER_MINUTE: Optional[float] = None  # Unset = no limit
+LLM_TOKENS_PER_MINUTE: Optional[float] = None
+USE_LLM_CACHE = False  # LLM_CACHE=1: opt-in response cache
+LLM_CACHE_PATH = DEFAULT_CACHE_PATH
+
+_settings_loaded = False
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def load_settings() -> None:
+    """Load the .env file and read the LLM settings from the environment (once)."""
+    global _settings_loaded, MODEL, OPENAI_API_KEY, LLM_TIMEOUT, LLM_MAX_RETRIES
+    global LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, USE_LLM_CACHE, LLM_CACHE_PATH
+    with _client_lock:
+        if _settings_loaded:
+            return
+        from dotenv import load_dotenv  # For loading .env file
+        load_dotenv()
+
+        MODEL = os.getenv("LLM_MODEL")  # Replace with your model name
+        OPENAI_API_KEY = os.getenv("API_KEY")  # Read API key from .env
+        LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+        LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0)) or None
+        LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0)) or None
+        USE_LLM_CACHE = os.getenv("LLM_CACHE", "").lower() in ("1", "true", "yes")
+        LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        _settings_loaded = True
+
+def get_client() -> LLMClient:
+    """
+    The shared LLM client (pooled connections, retries, rate limits), used by
+    every thread and coroutine of the process. Built on first use.
+    """
+    global _client
+    if _client is None:
+        load_settings()
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    model=MODEL,
+                    api_key=OPENAI_API_KEY,
+                    timeout=LLM_TIMEOUT,
+                    max_retries=LLM_MAX_RETRIES,
+                    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=LLM_TOKENS_PER_MINUTE
+                )
+    return _client
+
+def __getattr__(name: str):
+    # `llm.client` keeps working: the client is built when it is first accessed
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """The shared response cache, opened on first use."""
+    global _llm_cache
+    load_settings()
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(LLM_CACHE_PATH)
+    return _llm_cache
+
 def query_llm(
     prompt: str,
     system_prompt: str = "You are a helpful assistant.",
+    cache: Optional[bool] = None,
     **kwargs  # Extra parameters such as temperature, max_tokens, etc.
 ) -> str:
     """
@@ -27,22 +97,41 @@ def query_llm(
     Args:
         prompt (str): The input prompt.
         system_prompt (str): A system-level prompt.
+        cache (bool, optional): Use the persistent response cache (default:
+                  USE_LLM_CACHE, i.e. the LLM_CACHE environment variable). It only
+                  ever applies to deterministic calls (temperature=0).
         **kwargs: Additional keyword arguments passed to the LLM API call,
                   e.g., temperature, max_tokens, etc.
 
     Returns:
-        str: The LLM's response.
+        str: The LLM's response. Failed calls are retried by the shared client;
+        an error that persists is returned as "Error: ..." (the streaming
+        functions raise LLMError instead).
     """
 
+    client = get_client()
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+    # Deterministic calls may be answered from the cache
+    key = None
+    if (USE_LLM_CACHE if cache is None else cache) and is_deterministic(kwargs):
+        key = response_key(kwargs.get("model", MODEL), messages, kwargs)
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            tracer.count("llm_cache_hits")
+            return cached
+    #
+
     try:
-        completion = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            **kwargs  # Pass additional parameters into the API call
-        )
+        with span("llm"):
+            completion = client.chat(
+                messages=messages,
+                **kwargs  # Pass additional parameters into the API call
+            )
+            tracer.record_usage(completion.usage, kwargs.get("model", MODEL))
         text = completion.choices[0].message.content
  
         if VERBOSE:
@@ -51,6 +140,11 @@ def query_llm(
             print(f"Usage: {usage}")
         #
 
+        # Errors are never cached: they are returned below
+        if key is not None and text is not None:
+            get_llm_cache().put(key, text)
+        #
+
         return text
 
     except Exception as e:
@@ -58,6 +152,140 @@ def query_llm(
     #
 #
 
+class LLMError(Exception):
+    """An LLM call failed (raised by the streaming functions instead of returning "Error: ...")."""
+
+class StreamStats:
+    """Timings of one streamed completion, filled in while the tokens arrive."""
+    def __init__(self):
+        self.started = time.perf_counter()  # Reset when the request is sent
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks = 0  # Content chunks received, about one token each
+        self.usage: Optional[Dict[str, int]] = None  # Token usage reported by the API, if any
+
+    def _on_chunk(self, chunk) -> Optional[str]:
+        """Record a streamed chunk and return its text, if it has some."""
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            return None
+        text = chunk.choices[0].delta.content
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.chunks += 1
+        return text
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds from the request to the first token."""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def completion_tokens(self) -> int:
+        return self.usage["completion_tokens"] if self.usage else self.chunks
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """Generation speed after the first token."""
+        if self.first_token_at is None or self.finished_at is None:
+            return 0.0
+        elapsed = self.finished_at - self.first_token_at
+        return (self.completion_tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {"time_to_first_token": self.time_to_first_token, "completion_tokens": self.completion_tokens,
+                "tokens_per_sec": self.tokens_per_sec}
+#
+
+def _trace_stream(stats: StreamStats, kwargs: Dict) -> None:
+    """Record a finished stream: its duration, time to first token and token usage."""
+    if not tracer.enabled:
+        return
+    model = kwargs.get("model", MODEL)
+    tracer.record("llm_stream", stats.finished_at - stats.started, **stats.as_dict())
+    if stats.time_to_first_token is not None:
+        tracer.record("llm_stream.first_token", stats.time_to_first_token)
+    tracer.record_usage(stats.usage, model)
+
+def _stream_request(prompt: str, system_prompt: str, kwargs: Dict) -> Dict:
+    """Arguments of a streamed chat completion (usage is requested with the last chunk)."""
+    return dict(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+
+def stream_query_llm(
+    prompt: str,
+    system_prompt: str = "You are a helpful assistant.",
+    stats: Optional[StreamStats] = None,
+    **kwargs  # Extra parameters such as temperature, max_tokens, etc.
+) -> Iterator[str]:
+    """
+    Send a prompt to the LLM and yield the response text as it is generated.
+
+    Args:
+        prompt (str): The input prompt.
+        system_prompt (str): A system-level prompt.
+        stats (StreamStats, optional): Filled with time-to-first-token and tokens/sec.
+        **kwargs: Additional keyword arguments passed to the LLM API call.
+
+    Yields:
+        str: Pieces of the response, in order.
+
+    Raises:
+        LLMError: If the request or the stream fails.
+    """
+    stats = stats if stats is not None else StreamStats()
+    stats.started = time.perf_counter()  # Timings count from the request, not from building stats
+    try:
+        for chunk in get_client().stream_chat(**_stream_request(prompt, system_prompt, kwargs)):
+            text = stats._on_chunk(chunk)
+            if text:
+                yield text
+    except Exception as e:
+        raise LLMError(str(e)) from e
+    finally:
+        stats.finished_at = time.perf_counter()
+        _trace_stream(stats, kwargs)
+    #
+
+    if VERBOSE:
+        print(f"Stream stats: {stats.as_dict()}")
+    #
+#
+
+async def astream_query_llm(
+    prompt: str,
+    system_prompt: str = "You are a helpful assistant.",
+    stats: Optional[StreamStats] = None,
+    **kwargs
+) -> AsyncIterator[str]:
+    """Async variant of stream_query_llm, for use in an event loop."""
+    stats = stats if stats is not None else StreamStats()
+    stats.started = time.perf_counter()
+    try:
+        async for chunk in get_client().astream_chat(**_stream_request(prompt, system_prompt, kwargs)):
+            text = stats._on_chunk(chunk)
+            if text:
+                yield text
+    except Exception as e:
+        raise LLMError(str(e)) from e
+    finally:
+        stats.finished_at = time.perf_counter()
+        _trace_stream(stats, kwargs)
+    #
+
+    if VERBOSE:
+        print(f"Stream stats: {stats.as_dict()}")
+    #
+#
+
 
 
 if __name__ == "__main__":
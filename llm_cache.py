@@ -0,0 +1,99 @@
+#llm_cache.py
+# Persistent cache of LLM responses in a single SQLite file, for deterministic
+# calls only (temperature 0): the same model, prompts and sampling parameters
+# always give the same answer, so repeated tool detections and evaluation runs
+# are served without a round-trip.
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "llm_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 100_000  # Least recently used entries are evicted beyond this
+DEFAULT_TTL = 7 * 24 * 3600.0  # Seconds a response stays valid (None = forever)
+EVICTION_SLACK = 0.1  # Evict 10% below the limit at once so eviction stays rare
+
+def is_deterministic(kwargs: Dict[str, Any]) -> bool:
+    """Whether sampling parameters make a call repeatable: temperature 0 and a single choice."""
+    return kwargs.get("temperature") == 0 and kwargs.get("n", 1) == 1
+
+def response_key(model: Optional[str], messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON of everything that determines the response."""
+    payload = json.dumps({"model": model, "messages": messages, "kwargs": kwargs},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: Optional[float] = DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # One connection shared by all threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        # Upper bound on the number of entries, as in EmbeddingCache
+        self._count_bound = self._count()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, or None (expired entries count as misses)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used entries beyond max_entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            self._count_bound += 1
+            if self._count_bound > self.max_entries:
+                count = self._count()
+                if count > self.max_entries:
+                    target = int(self.max_entries * (1 - EVICTION_SLACK))
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                        (count - target,)
+                    )
+                    count = target
+                self._count_bound = count
+            self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+#
@@ -0,0 +1,268 @@
+#llm_client.py
+# Shared LLM client layer: one pooled HTTP connection set, explicit timeouts,
+# retries with exponential backoff and jitter on 429 / 5xx / connection errors,
+# and a token-bucket limiter on requests and tokens per minute. One instance is
+# safe to share between threads (sync methods) and coroutines (async methods).
+# The SDK (openai, httpx) is only imported when the first client is built, so
+# importing this module stays cheap for processes that never call the LLM.
+# -------------------------- NATIVE --------------------
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+# -------------------------- REQUIREMENTS.TXT ----------
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+# -------------------------- LOCAL ---------------------
+from tracing import tracer
+# ------------------------------------------------------
+
+DEFAULT_TIMEOUT = 60.0  # Seconds for a whole response (read timeout between bytes while streaming)
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_KEEPALIVE = 16
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # Seconds before the first retry (doubled each attempt)
+BACKOFF_MAX = 30.0
+DEFAULT_COMPLETION_TOKENS = 256  # Reserved per call when max_tokens is not given
+CHARS_PER_TOKEN = 4  # Rough prompt size estimate, corrected from the reported usage
+
+class TokenBucket:
+    """
+    Rate limiter refilled continuously at `rate_per_minute`, holding at most one
+    minute of capacity. Callers reserve first and then sleep the returned delay,
+    so the lock is never held while waiting; a reservation may overdraw the
+    bucket, which simply delays the next callers.
+    """
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0  # Units per second
+        self.capacity = rate_per_minute
+        self._available = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` from the bucket; returns the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= amount
+            return 0.0 if self._available >= 0 else -self._available / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Give back (or, if negative, additionally charge) part of a reservation."""
+        with self._lock:
+            self._available = min(self.capacity, self._available + amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets; None disables a limit."""
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def _reserve(self, tokens: int) -> float:
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.reserve(tokens))
+        return max(delays)
+
+    def acquire(self, tokens: int) -> None:
+        """Block until a request of `tokens` tokens may be sent."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int) -> None:
+        """Like acquire, without blocking the event loop."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            import asyncio
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct a token reservation once the API has reported the real usage."""
+        if self.tokens is not None and actual is not None:
+            self.tokens.refund(estimated - actual)
+#
+
+def is_retryable(error: Exception) -> bool:
+    """429, 5xx, timeouts and connection failures are worth retrying; other errors are not."""
+    import openai  # Already loaded once a client exists
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Delay before retry number `attempt` (0-based): full jitter over an exponential
+    ceiling, or the server's Retry-After when it sends one.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def estimate_tokens(messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> int:
+    """Tokens reserved for a call: prompt characters / CHARS_PER_TOKEN plus the completion budget."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // CHARS_PER_TOKEN + completion
+
+class LLMClient:
+    """
+    Chat-completions client shared by the whole process.
+    The SDK's own retries are disabled so that retries, backoff and rate
+    limiting all follow one policy, for sync and async calls alike.
+    """
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None
+    ):
+        """
+        Args:
+            model (str, optional): Default model for calls that do not name one.
+            base_url (str, optional): OpenAI-compatible endpoint (default: OPENAI_BASE_URL or api.openai.com).
+            api_key (str, optional): Default: the OPENAI_API_KEY environment variable.
+            timeout (float): Seconds allowed per response; while streaming, between chunks.
+            connect_timeout (float): Seconds allowed to open a connection.
+            max_connections (int): Connections in the pool.
+            max_keepalive (int): Idle connections kept open for reuse.
+            max_retries (int): Retries of a failed call (429, 5xx, network).
+            requests_per_minute (float, optional): Request rate limit.
+            tokens_per_minute (float, optional): Token rate limit (prompt estimate + max_tokens).
+        """
+        self.model = model
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.retries = 0  # Retried calls so far, for monitoring
+        self._options = dict(base_url=base_url, api_key=api_key, max_retries=0)
+        self._timeout = (timeout, connect_timeout)
+        self._limits = (max_connections, max_keepalive)
+        self._sync: Optional["OpenAI"] = None
+        self._async: Optional["AsyncOpenAI"] = None
+        self._lock = threading.Lock()
+
+    @property
+    def sync_client(self) -> "OpenAI":
+        """The pooled synchronous SDK client, created on first use."""
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    import httpx
+                    from openai import OpenAI
+                    timeout, limits = self._httpx_settings(httpx)
+                    http_client = httpx.Client(timeout=timeout, limits=limits)
+                    self._sync = OpenAI(http_client=http_client, timeout=timeout, **self._options)
+        return self._sync
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """The pooled asynchronous SDK client, created on first use."""
+        if self._async is None:
+            with self._lock:
+                if self._async is None:
+                    import httpx
+                    from openai import AsyncOpenAI
+                    timeout, limits = self._httpx_settings(httpx)
+                    http_client = httpx.AsyncClient(timeout=timeout, limits=limits)
+                    self._async = AsyncOpenAI(http_client=http_client, timeout=timeout, **self._options)
+        return self._async
+
+    def _httpx_settings(self, httpx) -> tuple:
+        timeout, connect_timeout = self._timeout
+        max_connections, max_keepalive = self._limits
+        return (httpx.Timeout(timeout, connect=connect_timeout),
+                httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive))
+
+    def _request(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        request = dict(kwargs, messages=messages)
+        request.setdefault("model", self.model)
+        return request
+
+    def _call(self, send: Callable[[], Any], estimated: int) -> Any:
+        """Rate-limit and retry a synchronous call."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(estimated)
+            try:
+                return send()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                tracer.count("llm_retries", error=type(e).__name__)
+                time.sleep(backoff_delay(attempt, e))
+
+    async def _call_async(self, send: Callable[[], Any], estimated: int) -> Any:
+        """Rate-limit and retry an asynchronous call."""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire_async(estimated)
+            try:
+                return await send()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                tracer.count("llm_retries", error=type(e).__name__)
+                import asyncio
+                await asyncio.sleep(backoff_delay(attempt, e))
+
+    def chat(self, messages: List[Dict[str, Any]], **kwargs) -> Any:
+        """Chat completion (the SDK's ChatCompletion object), retried and rate-limited."""
+        estimated = estimate_tokens(messages, kwargs)
+        completion = self._call(lambda: self.sync_client.chat.completions.create(
+            **self._request(messages, kwargs)), estimated)
+        self.limiter.settle(estimated, completion.usage.total_tokens if completion.usage else None)
+        return completion
+
+    async def achat(self, messages: List[Dict[str, Any]], **kwargs) -> Any:
+        """Async chat completion, retried and rate-limited."""
+        estimated = estimate_tokens(messages, kwargs)
+        completion = await self._call_async(lambda: self.async_client.chat.completions.create(
+            **self._request(messages, kwargs)), estimated)
+        self.limiter.settle(estimated, completion.usage.total_tokens if completion.usage else None)
+        return completion
+
+    def stream_chat(self, messages: List[Dict[str, Any]], **kwargs) -> Iterator[Any]:
+        """
+        Streamed chat completion chunks. Opening the stream is retried; a stream
+        that fails midway is not (its text has already been handed out).
+        """
+        estimated = estimate_tokens(messages, kwargs)
+        stream = self._call(lambda: self.sync_client.chat.completions.create(
+            **self._request(messages, dict(kwargs, stream=True))), estimated)
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self.limiter.settle(estimated, chunk.usage.total_tokens)
+            yield chunk
+
+    async def astream_chat(self, messages: List[Dict[str, Any]], **kwargs) -> AsyncIterator[Any]:
+        """Async variant of stream_chat."""
+        estimated = estimate_tokens(messages, kwargs)
+        stream = await self._call_async(lambda: self.async_client.chat.completions.create(
+            **self._request(messages, dict(kwargs, stream=True))), estimated)
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self.limiter.settle(estimated, chunk.usage.total_tokens)
+            yield chunk
+
+    def close(self) -> None:
+        """Close the pooled sync connections (the async pool closes with its event loop)."""
+        if self._sync is not None:
+            self._sync.close()
+#
@@ -0,0 +1,209 @@
+#metadata_index.py
+# Columnar metadata for SimpleVectorDB filters. Every metadata field is stored
+# as two parallel arrays (row, value code) over a per-field dictionary of
+# distinct values, so a `where` filter is evaluated on the distinct values
+# once and turned into a row mask with array operations, before any scoring.
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import json
+
+import numpy as np
+
+from columnar import save_arrays
+
+# A filter matching at most this share of the rows scores only those rows
+# (gathered from the mask) instead of masking a full scan
+SELECTIVE_FILTER_FRACTION = 0.05
+BITMAP_MAX_CODES = 16  # Filters selecting at most this many values OR their bitmaps; more are gathered from the codes
+MAX_BITMAPS_PER_FIELD = 64  # Bitmaps kept per field (least recently used dropped first)
+
+_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+def _value_key(value: Any) -> Hashable:
+    """Dictionary key of a metadata value (nested dicts and lists are keyed on their JSON)."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class _Field:
+    """
+    One metadata field: (row, code) pairs plus the distinct values the codes refer to.
+    Range filters binary-search sorted columns of the distinct numbers and strings;
+    packed per-value bitmaps are built on first use and then kept up to date by add.
+    """
+    def __init__(self):
+        self.rows = array('I')
+        self.codes = array('i')
+        self.values: List[Any] = []
+        self.lookup: Dict[Hashable, int] = {}
+        self.bitmaps: "OrderedDict[int, np.ndarray]" = OrderedDict()  # code -> packed row bitmap (np.packbits order)
+        self._sorted: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None  # Built on first range filter
+
+    def add(self, row: int, value: Any) -> None:
+        # A list value (e.g. tags) stores one pair per element
+        for item in (value if isinstance(value, list) else [value]):
+            key = _value_key(item)
+            code = self.lookup.get(key)
+            if code is None:
+                code = self.lookup[key] = len(self.values)
+                self.values.append(key)
+                self._sorted = None  # A new distinct value
+            self.rows.append(row)
+            self.codes.append(code)
+            bitmap = self.bitmaps.get(code)
+            if bitmap is not None:
+                if row >> 3 >= len(bitmap):
+                    bitmap = self.bitmaps[code] = np.concatenate([bitmap, np.zeros(len(bitmap) + 1, dtype=np.uint8)])
+                bitmap[row >> 3] |= 0x80 >> (row & 7)
+
+    def sorted_values(self, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(sorted values, their codes) of the numeric ("number") or string ("str") distinct values."""
+        if self._sorted is None:
+            numbers = [(value, code) for code, value in enumerate(self.values) if _is_number(value) and value == value]
+            strings = [(value, code) for code, value in enumerate(self.values) if isinstance(value, str)]
+            self._sorted = {}
+            for name, pairs, dtype in (("number", numbers, np.float64), ("str", strings, str)):
+                pairs.sort()
+                self._sorted[name] = (np.array([value for value, _ in pairs], dtype=dtype),
+                                      np.array([code for _, code in pairs], dtype=np.int64))
+        return self._sorted[kind]
+
+    def matching_codes(self, condition: Any) -> np.ndarray:
+        """Boolean mask over the codes: the distinct values satisfying a condition."""
+        if not isinstance(condition, dict) or not condition or not all(op.startswith("$") for op in condition):
+            condition = {"$in": condition} if isinstance(condition, list) else {"$eq": condition}
+
+        selected = np.ones(len(self.values), dtype=bool)
+        for op, operand in condition.items():
+            if op in ("$eq", "$in"):
+                keys = [_value_key(operand)] if op == "$eq" else [_value_key(v) for v in operand]
+                matched = np.zeros_like(selected)
+                matched[[self.lookup[key] for key in keys if key in self.lookup]] = True
+                selected &= matched
+            elif op == "$ne":
+                code = self.lookup.get(_value_key(operand))
+                if code is not None:
+                    selected[code] = False
+            elif op in _RANGE_OPERATORS:
+                selected &= self._range(op, operand)
+            else:
+                raise ValueError(f"Unknown filter operator: {op}")
+        return selected
+
+    def _range(self, op: str, operand: Any) -> np.ndarray:
+        """Codes of the values in a range, by binary search (numbers compare with numbers, strings with strings)."""
+        matched = np.zeros(len(self.values), dtype=bool)
+        if not (_is_number(operand) or isinstance(operand, str)):
+            return matched
+        values, codes = self.sorted_values("number" if _is_number(operand) else "str")
+        if op in ("$gt", "$gte"):
+            matched[codes[np.searchsorted(values, operand, side="right" if op == "$gt" else "left"):]] = True
+        else:
+            matched[codes[:np.searchsorted(values, operand, side="left" if op == "$lt" else "right")]] = True
+        return matched
+
+    def bitmap(self, code: int, n_rows: int) -> np.ndarray:
+        """Packed bitmap (np.packbits) of the rows holding a value; at least (n_rows + 7) // 8 bytes."""
+        bitmap = self.bitmaps.get(code)
+        if bitmap is None:
+            rows = np.frombuffer(self.rows, dtype=np.uint32)
+            hits = np.zeros(n_rows, dtype=bool)
+            hits[rows[np.frombuffer(self.codes, dtype=np.int32) == code]] = True
+            bitmap = self.bitmaps[code] = np.packbits(hits)
+            if len(self.bitmaps) > MAX_BITMAPS_PER_FIELD:
+                self.bitmaps.popitem(last=False)
+        else:
+            self.bitmaps.move_to_end(code)
+        return bitmap
+
+    def mask(self, condition: Any, n_rows: int) -> np.ndarray:
+        """Boolean mask of the rows matching a condition on this field."""
+        selected = self.matching_codes(condition)
+        codes = np.flatnonzero(selected)
+        if len(codes) <= BITMAP_MAX_CODES:
+            # Few values (equality, small $in): OR their bitmaps
+            packed = np.zeros((n_rows + 7) // 8, dtype=np.uint8)
+            for code in codes.tolist():
+                bitmap = self.bitmap(code, n_rows)
+                packed[:len(bitmap)] |= bitmap[:len(packed)]
+            return np.unpackbits(packed, count=n_rows).astype(bool)
+        # Many values (ranges, $ne): one pass over the code column
+        hits = np.zeros(n_rows, dtype=bool)
+        rows = np.frombuffer(self.rows, dtype=np.uint32)
+        hits[rows[selected[np.frombuffer(self.codes, dtype=np.int32)]]] = True
+        return hits
+
+class MetadataIndex:
+    """
+    Columnar view of the metadata of every row, answering `where` filters:
+    {"field": value} (equality; for a list field, any element), {"field": [v1, v2]}
+    (any of), or {"field": {"$gte": a, "$lt": b, ...}} with $eq, $ne, $in,
+    $gt, $gte, $lt, $lte. Several fields are combined with AND.
+    """
+    def __init__(self):
+        self._fields: Dict[str, _Field] = {}
+        self.n_rows = 0
+
+    def add(self, row: int, metadata: Optional[Dict[str, Any]]) -> None:
+        """Index the metadata of the next row (rows are added in order)."""
+        if row != self.n_rows:
+            raise ValueError(f"Expected row {self.n_rows}, got {row}")
+        for name, value in (metadata or {}).items():
+            if value is None:
+                continue
+            field = self._fields.get(name)
+            if field is None:
+                field = self._fields[name] = _Field()
+            field.add(row, value)
+        self.n_rows += 1
+
+    def mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of the rows matching a filter (fields combined with AND)."""
+        result = np.ones(self.n_rows, dtype=bool)
+        for name, condition in where.items():
+            field = self._fields.get(name)
+            if field is None:
+                return np.zeros(self.n_rows, dtype=bool)
+            result &= field.mask(condition, self.n_rows)
+        return result
+
+    def save(self, path: str, row_map: Optional[np.ndarray] = None) -> None:
+        """
+        Save the index to a .npz file; the distinct values go in a JSON header.
+        `row_map` renumbers rows (old row -> new row, -1 to drop), as in IVFIndex.save.
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        names = list(self._fields)
+        for i, name in enumerate(names):
+            field = self._fields[name]
+            rows = np.frombuffer(field.rows, dtype=np.uint32)
+            codes = np.frombuffer(field.codes, dtype=np.int32)
+            if row_map is not None:
+                new_rows = row_map[rows]
+                rows, codes = new_rows[new_rows >= 0].astype(np.uint32), codes[new_rows >= 0]
+            arrays[f"rows_{i}"], arrays[f"codes_{i}"] = rows, codes
+        n_rows = self.n_rows if row_map is None else int(np.count_nonzero(row_map >= 0))
+        header = {"n_rows": n_rows, "fields": names,
+                  "values": [self._fields[name].values for name in names]}
+        arrays["header"] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        save_arrays(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        """Load an index written by save()."""
+        index = cls()
+        with np.load(path) as archive:
+            header = json.loads(archive["header"].tobytes().decode("utf-8"))
+            index.n_rows = header["n_rows"]
+            for i, (name, values) in enumerate(zip(header["fields"], header["values"])):
+                field = index._fields[name] = _Field()
+                field.values = values
+                field.lookup = {value: code for code, value in enumerate(values)}
+                field.rows = array('I', archive[f"rows_{i}"].astype(np.uint32).tobytes())
+                field.codes = array('i', archive[f"codes_{i}"].astype(np.int32).tobytes())
+        return index
+#
@@ -0,0 +1,167 @@
+#pipeline.py
+# Concurrent ingestion: chunks stream into a bounded queue, N worker threads
+# embed them in batches, and the calling thread is the single writer that
+# inserts them into the SimpleVectorDB in their original order.
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from embeds import embed_batch, EMBED_BATCH_SIZE
+from tracing import span, traced
+from vectordb import SimpleVectorDB
+
+DEFAULT_WORKERS = 4  # Concurrent embedding requests
+DEFAULT_QUEUE_DEPTH = 8  # Batches waiting to be embedded before the producer blocks
+
+_DONE = object()  # Queue sentinel
+
+@traced("ingest")
+def ingest_documents(
+    db: SimpleVectorDB,
+    documents: Iterable[Union[str, Tuple[str, Dict[str, Any]]]],
+    embed_fn: Callable[[List[str]], List[List[float]]] = embed_batch,
+    workers: int = DEFAULT_WORKERS,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    batch_size: int = EMBED_BATCH_SIZE,
+    progress: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Embed and insert documents with a producer/consumer pipeline.
+
+    Args:
+        db (SimpleVectorDB): Database to insert into.
+        documents (Iterable): Chunks to ingest, as texts or (text, metadata)
+            pairs; may be a lazy generator.
+        embed_fn (Callable): Embeds a list of texts, one vector per text.
+        workers (int): Number of concurrent embedding threads.
+        queue_depth (int): Batches allowed to wait for a worker. Together with
+            the workers this bounds the batches in flight (backpressure).
+        batch_size (int): Texts per embed_fn call.
+        progress (Callable, optional): Called by the writer after each batch
+            with (documents_done, stats).
+
+    Returns:
+        Dict[str, Any]: Throughput statistics (documents, added, skipped,
+        batches, elapsed, docs_per_sec, embed_seconds).
+    """
+    workers = max(1, workers)
+    work_queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_depth))
+    result_queue: "queue.Queue" = queue.Queue()
+    in_flight = threading.BoundedSemaphore(max(1, queue_depth) + workers)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    embed_seconds = [0.0] * workers
+
+    def produce():
+        batch_no = 0
+        batch: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+        try:
+            for document in documents:
+                batch.append(document if isinstance(document, tuple) else (document, None))
+                if len(batch) == batch_size:
+                    if not _put_batch(batch_no, batch):
+                        return
+                    batch_no += 1
+                    batch = []
+            if batch and _put_batch(batch_no, batch):
+                batch_no += 1
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            result_queue.put((_DONE, batch_no))
+            for _ in range(workers):
+                _put_or_stop(_DONE)
+
+    def _put_batch(batch_no: int, batch: List[Tuple[str, Optional[Dict[str, Any]]]]) -> bool:
+        # Block while too many batches are in flight, unless the pipeline is stopping
+        while not in_flight.acquire(timeout=0.1):
+            if stop.is_set():
+                return False
+        return _put_or_stop((batch_no, batch))
+
+    def _put_or_stop(item) -> bool:
+        while not stop.is_set():
+            try:
+                work_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def embed_worker(worker_no: int):
+        while not stop.is_set():
+            try:
+                item = work_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            batch_no, batch = item
+            try:
+                started = time.monotonic()
+                with span("ingest.embed", documents=len(batch)):
+                    embeddings = embed_fn([text for text, _ in batch])
+                embed_seconds[worker_no] += time.monotonic() - started
+                result_queue.put((batch_no, (batch, embeddings)))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+                result_queue.put((_DONE, None))
+                return
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=embed_worker, args=(n,), daemon=True) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # ------- Single writer: insert batches in their original order -------
+    stats = {"documents": 0, "added": 0, "skipped": 0, "batches": 0,
+             "elapsed": 0.0, "docs_per_sec": 0.0, "embed_seconds": 0.0}
+    start_time = time.monotonic()
+    pending: Dict[int, Any] = {}
+    next_batch = 0
+    total_batches = None
+
+    try:
+        while total_batches is None or next_batch < total_batches:
+            batch_no, payload = result_queue.get()
+            if stop.is_set():
+                break
+            if batch_no is _DONE:
+                total_batches = payload
+                continue
+            pending[batch_no] = payload
+
+            while next_batch in pending:
+                batch, embeddings = pending.pop(next_batch)
+                with span("ingest.insert", documents=len(batch)):
+                    for (document, metadata), embedding in zip(batch, embeddings):
+                        size_before = len(db.data)
+                        db.add_document(embedding, document, metadata)
+                        if len(db.data) > size_before:
+                            stats["added"] += 1
+                        else:
+                            stats["skipped"] += 1
+                in_flight.release()
+                next_batch += 1
+
+                stats["documents"] += len(batch)
+                stats["batches"] += 1
+                stats["elapsed"] = time.monotonic() - start_time
+                stats["docs_per_sec"] = stats["documents"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+                stats["embed_seconds"] = sum(embed_seconds)
+                if progress is not None:
+                    progress(stats["documents"], stats)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=1.0)
+    if errors:
+        raise errors[0]
+
+    stats["elapsed"] = time.monotonic() - start_time
+    stats["embed_seconds"] = sum(embed_seconds)
+    return stats
+#
@@ -0,0 +1,222 @@
+#quantization.py
+# Compressed embedding codes for SimpleVectorDB. Every codec turns unit-length
+# float32 rows into a uint8 code matrix and scores queries directly against
+# those codes, so only the codes need to stay hot in memory; the float32 rows
+# are only read back to re-rank the best candidates exactly.
+# NumPy has no fast half-precision or int8 matrix product, so float16 and int8
+# codes are decoded SCORE_BLOCK_ROWS at a time into a reused float32 buffer that
+# stays in the CPU cache: memory traffic is that of the codes, not of a float32
+# copy of every tile. The decoding still costs time (see quantization_report).
+from typing import Any, Dict, List
+import time
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8", "pq")
+PQ_SUBVECTOR_DIMS = 8  # Dimensions per PQ sub-quantizer (dim / 8 bytes per vector)
+PQ_CENTROIDS = 256  # One byte per sub-quantizer code
+PQ_TRAIN_POINTS = 65536  # Training sample size
+PQ_KMEANS_ITERATIONS = 15
+SCORE_BLOCK_ROWS = 512  # Rows decoded at a time by the float16/int8 codecs (fits in L2 with dim <= 1024)
+
+def _blocked_scores(queries: np.ndarray, values: np.ndarray, dim: int) -> np.ndarray:
+    """queries @ values.T, converting `values` (any numeric dtype) to float32 block by block."""
+    queries = np.asarray(queries, dtype=np.float32)
+    scores = np.empty((len(queries), len(values)), dtype=np.float32)
+    buffer = np.empty((min(len(values), SCORE_BLOCK_ROWS), dim), dtype=np.float32)
+    for start in range(0, len(values), SCORE_BLOCK_ROWS):
+        block = values[start:start + SCORE_BLOCK_ROWS]
+        decoded = buffer[:len(block)]
+        np.copyto(decoded, block, casting="unsafe")
+        np.matmul(queries, decoded.T, out=scores[:, start:start + len(block)])
+    return scores
+
+class Float16Codec:
+    """
+    Half precision: 2 bytes per dimension. Scoring is bound by NumPy's half to
+    single precision conversion and is several times slower than the float32
+    scan; int8 is about as fast as float32 at a quarter of the memory.
+    """
+    name = "float16"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.code_bytes = 2 * dim
+
+    def train(self, vectors: np.ndarray) -> None:
+        pass
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(vectors, dtype=np.float16).view(np.uint8).reshape(len(vectors), -1)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return _blocked_scores(queries, np.ascontiguousarray(codes).view(np.float16), self.dim)
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+class Int8Codec:
+    """Scalar int8 with a per-vector scale: 1 byte per dimension + 4 bytes per vector."""
+    name = "int8"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.code_bytes = dim + 4  # int8 values, then the float32 scale
+
+    def train(self, vectors: np.ndarray) -> None:
+        pass
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        safe_scales = np.where(scales > 0, scales, 1.0)
+        codes = np.empty((len(vectors), self.code_bytes), dtype=np.uint8)
+        codes[:, :self.dim] = np.rint(vectors / safe_scales[:, None]).astype(np.int8).view(np.uint8)
+        codes[:, self.dim:] = scales.astype(np.float32)[:, None].view(np.uint8)
+        return codes
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        codes = np.ascontiguousarray(codes)
+        scales = np.ascontiguousarray(codes[:, self.dim:]).view(np.float32).reshape(-1)
+        scores = _blocked_scores(queries, codes[:, :self.dim].view(np.int8), self.dim)
+        scores *= scales
+        return scores
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+class PQCodec:
+    """
+    Product quantization: the vector is split into sub-vectors of PQ_SUBVECTOR_DIMS
+    dimensions, each replaced by the index of its nearest of 256 learned centroids
+    (1 byte; fewer centroids when trained on fewer than 256 vectors). Queries are
+    scored with one lookup table per sub-vector.
+    """
+    name = "pq"
+
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+        self.n_sub = -(-dim // PQ_SUBVECTOR_DIMS)  # Last sub-vector is zero-padded
+        self.code_bytes = self.n_sub
+        self.codebooks = np.empty((0, 0, 0), dtype=np.float32)  # (n_sub, centroids, sub_dim)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dim) -> (n_sub, n, sub_dim), zero-padding the last sub-vector."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        padded = np.zeros((len(vectors), self.n_sub * PQ_SUBVECTOR_DIMS), dtype=np.float32)
+        padded[:, :self.dim] = vectors
+        return padded.reshape(len(vectors), self.n_sub, PQ_SUBVECTOR_DIMS).transpose(1, 0, 2)
+
+    def train(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), PQ_TRAIN_POINTS)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        k = min(PQ_CENTROIDS, sample_size)  # Never more centroids than points: no unused (zero) rows
+
+        codebooks = np.zeros((self.n_sub, k, PQ_SUBVECTOR_DIMS), dtype=np.float32)
+        for sub, points in enumerate(self._split(sample)):
+            centroids = points[rng.choice(len(points), k, replace=False)].copy()
+            for _ in range(PQ_KMEANS_ITERATIONS):
+                labels = self._nearest(points, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, points)
+                counts = np.bincount(labels, minlength=k)[:, None]
+                centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            codebooks[sub] = centroids
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (centroids ** 2).sum(axis=1) - 2 * points @ centroids.T
+        return np.argmin(distances, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.codebooks.size == 0:
+            raise ValueError("PQ codec must be trained before encoding")
+        codes = np.empty((len(vectors), self.n_sub), dtype=np.uint8)
+        for sub, points in enumerate(self._split(vectors)):
+            codes[:, sub] = self._nearest(points, self.codebooks[sub])
+        return codes
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # tables[sub]: inner product of each query sub-vector with the centroids
+        tables = np.einsum("sqd,skd->sqk", self._split(queries), self.codebooks)
+        scores = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for sub in range(self.n_sub):
+            scores += tables[sub][:, codes[:, sub]]
+        return scores
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.codebooks = np.asarray(state["codebooks"], dtype=np.float32)
+
+CODECS = {"float16": Float16Codec, "int8": Int8Codec, "pq": PQCodec}
+
+def make_codec(precision: str, dim: int):
+    """Codec for a storage precision ("float32" needs none and returns None)."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}. Expected one of {PRECISIONS}")
+    if precision == "float32":
+        return None
+    return CODECS[precision](dim)
+
+def quantization_report(db, query_embeddings: List[List[float]], n_results: int = 10,
+                        rerank_factor: int = 4) -> List[Dict[str, Any]]:
+    """
+    Compare every storage precision on a database: memory per million vectors,
+    query latency (also relative to float32: decoding float16/int8 codes and
+    the PQ lookups cost time), and recall@n_results against the exact float32
+    scan, with and without exact re-ranking. The database is left as it was found.
+
+    Args:
+        db (SimpleVectorDB): A database with documents.
+        query_embeddings (List[List[float]]): Evaluation queries.
+        n_results (int): k of recall@k.
+        rerank_factor (int): Candidates re-ranked exactly, as a multiple of n_results.
+
+    Returns:
+        List[Dict[str, Any]]: One row per (precision, rerank) setting.
+    """
+    original = (db.precision, db.rerank_factor)
+    db.quantize("float32")
+    exact = db.query_batch(query_embeddings, n_results, exact=True)
+    dim = db.dimension
+    report = []
+    float32_ms = None
+
+    for precision in PRECISIONS:
+        db.quantize(precision)
+        codec = db.codec
+        code_bytes = 4 * dim if codec is None else codec.code_bytes
+        for factor in ([0] if precision == "float32" else [0, rerank_factor]):
+            db.rerank_factor = factor
+            started = time.perf_counter()
+            approx = db.query_batch(query_embeddings, n_results, exact=True)
+            elapsed = time.perf_counter() - started
+            hits = sum(len({d for d, _ in e} & {d for d, _ in a}) for e, a in zip(exact, approx))
+            total = sum(len(e) for e in exact)
+            ms_per_query = 1000 * elapsed / max(1, len(query_embeddings))
+            if float32_ms is None:
+                float32_ms = ms_per_query  # float32 comes first in PRECISIONS
+            report.append({
+                "precision": precision,
+                "rerank_factor": factor,
+                "bytes_per_vector": code_bytes,
+                "mb_per_million": code_bytes * 1_000_000 / 2 ** 20,
+                "recall": hits / total if total else 1.0,
+                "ms_per_query": ms_per_query,
+                "latency_vs_float32": ms_per_query / float32_ms if float32_ms else 1.0
+            })
+
+    db.quantize(original[0], rerank_factor=original[1])
+    return report
+#
@@ -0,0 +1,112 @@
+#query_cache.py
+# In-process caches for the interactive RAG loop: query embeddings and top-k
+# retrieval results, keyed on the normalized question text. Retrieval results
+# are tied to the database version, so any change to the corpus invalidates them.
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import threading
+import time
+
+from vectordb import SimpleVectorDB
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 3600.0  # Seconds an entry stays valid
+
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters."""
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: Optional[float] = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl  # None = entries never expire
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                stored_at, value = entry
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+#
+
+def normalize_query(query: str) -> str:
+    """Cache key for a question: case and whitespace differences are ignored."""
+    return " ".join(query.lower().split())
+
+class CachedRetriever:
+    """
+    Embeds questions and searches a SimpleVectorDB, caching both steps.
+    Cached results are discarded as soon as db.version changes (add_document,
+    delete_document, update_metadata, load).
+    With hybrid=True, results come from db.hybrid_query (embedding + BM25 fusion).
+    """
+    def __init__(
+        self,
+        db: SimpleVectorDB,
+        embed_fn: Callable[[str], List[float]],
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: Optional[float] = DEFAULT_TTL,
+        hybrid: bool = False
+    ):
+        self.db = db
+        self.embed_fn = embed_fn
+        self.hybrid = hybrid
+        self.embeddings = LRUCache(max_entries, ttl)
+        self.results = LRUCache(max_entries, ttl)
+        self._results_version = db.version
+
+    def embed(self, query: str) -> List[float]:
+        key = normalize_query(query)
+        embedding = self.embeddings.get(key)
+        if embedding is None:
+            embedding = self.embed_fn(query)
+            self.embeddings.put(key, embedding)
+        return embedding
+
+    def retrieve(self, query: str, n_results: int = 3) -> List[Tuple[str, float]]:
+        """Top n_results (id, similarity_score) for the question."""
+        # Drop every cached result once the corpus has changed
+        version = self.db.version
+        if version != self._results_version:
+            self.results.clear()
+            self._results_version = version
+
+        key = (normalize_query(query), n_results, version)
+        results = self.results.get(key)
+        if results is None:
+            if self.hybrid:
+                results = self.db.hybrid_query(query, self.embed(query), n_results=n_results)
+            else:
+                results = self.db.query(self.embed(query), n_results=n_results)
+            self.results.put(key, results)
+        return list(results)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+#
@@ -1,7 +1,13 @@
-from chunking import load_text, chunk_text
+from context import build_context, build_prompt
+from corpus import iter_corpus_chunks
 from vectordb import SimpleVectorDB
-from embeds import embed_with_ollama
-from llm import query_llm
+from embeds import embed_text
+from llm import LLMError, StreamStats, stream_query_llm
+from pipeline import ingest_documents, DEFAULT_WORKERS, DEFAULT_QUEUE_DEPTH
+from query_cache import CachedRetriever
+from sync import sync_corpus
+from tracing import format_summary, serve_metrics, span, tracer, METRICS_PORT_ENV
+import itertools
 import time
 import sys
 import os
@@ -9,19 +15,28 @@ import os
 # THIS IS NOT a WORKING RAG pipeline, but it contains all the parts necessary to build one as an
 # exercise to the student.
 
+CHUNK_TOKENS = 256  # Tokens per chunk: the most all-minilm reads of a text
+CHUNK_OVERLAP_TOKENS = 32  # Whole sentences repeated between consecutive chunks
+
 def fancy_progress_bar(current, total, bar_length=50, prefix='Progress:', suffix='Complete', fill_char='█', empty_char='░'):
     """
     Display a fancy text-based progress bar.
     
     Args:
         current (int): Current progress value
-        total (int): Total value
+        total (int): Total value, or None when it is not known yet (e.g. while
+            chunks are still streaming in): only the count is shown
         bar_length (int): Length of the progress bar in characters
         prefix (str): Text to display before the progress bar
         suffix (str): Text to display after the progress bar
         fill_char (str): Character to use for filled portion of the bar
         empty_char (str): Character to use for empty portion of the bar
     """
+    if not total:
+        sys.stdout.write(f"\r{prefix} {current} {suffix}")
+        sys.stdout.flush()
+        return
+    
     percent = float(current) / total
     filled_length = int(bar_length * percent)
     bar = fill_char * filled_length + empty_char * (bar_length - filled_length)
@@ -41,57 +56,89 @@ def fancy_progress_bar(current, total, bar_length=50, prefix='Progress:', suffix
 
 # Example usage
 if __name__ == "__main__":
-    # Define database file paths
-    db_path = "vectordb.pkl"
-    hash_path = "hash_dict.pkl"
+    # Usage: python rag.py [--sync] [files, directories or glob patterns...]
+    args = sys.argv[1:]
+    sync_mode = "--sync" in args
+    sources = [arg for arg in args if arg != "--sync"] or ["pg75244.txt"]
+    
+    # Define database directory
+    db_path = "vectordb"
+    
+    # With tracing on, optionally expose the stage latencies to Prometheus
+    if tracer.enabled and os.getenv(METRICS_PORT_ENV):
+        serve_metrics(int(os.getenv(METRICS_PORT_ENV)))
     
     # Initialize DB
-    db = SimpleVectorDB(db_path=db_path, hash_path=hash_path)
+    db = SimpleVectorDB(db_path=db_path)
     
     # Try to load the database from disk
     db_loaded = db.load_from_disk()
     
+    # Migrate a database saved in the old pickle format, if there is one
+    if not db_loaded and db.import_pickle("vectordb.pkl"):
+        db.save_to_disk()
+        db_loaded = True
+    
+    # In sync mode, only re-index the source files that changed since the last sync
+    if sync_mode:
+        print("Synchronizing the database with its source files...")
+        start_time = time.time()
+        stats = sync_corpus(
+            db,
+            sources,
+            target_tokens=CHUNK_TOKENS,
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            progress=lambda done, total, _: fancy_progress_bar(done, total, prefix='Embedding:', suffix='Complete')
+        )
+        print("\n")
+        print(f"Files: {stats['files_unchanged']} unchanged, {stats['files_changed']} changed, "
+              f"{stats['files_removed']} removed.")
+        print(f"Chunks: {stats['chunks_embedded']} embedded, {stats['chunks_reused']} reused, "
+              f"{stats['chunks_deleted']} deleted.")
+        print(f"Total processing time: {time.time() - start_time:.2f} seconds.")
+    
     # If the database doesn't exist or couldn't be loaded, create a new one
-    if not db_loaded:
+    elif not db_loaded:
         print("No existing database found or could not load it. Creating a new one...")
         
         # ------- Chunking -------
-        text = load_text("pg75244.txt")
-        documents = chunk_text(text, num_words=256, overlap_words=128)
-        print("-------------")
-        print(f"Nb of chunks: {len(documents)}")
+        # Source files are chunked in parallel processes, on sentence and paragraph
+        # boundaries, with provenance (source, character offsets) per chunk.
+        # Chunks stream into the embedding pipeline batch by batch; the corpus is
+        # never held in memory as a whole.
+        documents = iter_corpus_chunks(sources, target_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+        first_document = next(documents, None)
+        if first_document is None:
+            sys.exit(f"No text found in {', '.join(sources)}.")
         print("-------------")
         print("Example: chunk 0:")
-        print(documents[0])
+        print(first_document[0])
         print("-------------")
 
         # ------- Vector DB -------
-        # Add documents one by one
+        # Embed documents concurrently; a single writer adds them in order
         print("\nEmbedding documents:")
-        total_docs = len(documents)
         start_time = time.time()
-        added_count = 0
-        skipped_count = 0
         
-        for i, document in enumerate(documents):
-            # Get embedding from Ollama
-            embedding = embed_with_ollama(document)
-            
-            # Add document to vector DataBase (returns doc_id)
-            doc_id = db.add_document(embedding, document)
-            
-            # Check if this was a new document or an existing one
-            if doc_id == f"doc_{i + 1}":
-                added_count += 1
-            else:
-                skipped_count += 1
-            
-            # Update progress bar
-            fancy_progress_bar(i + 1, total_docs, prefix='Embedding:', suffix='Complete')
+        def show_progress(done, stats):
+            # The number of chunks is only known at the end of the stream
+            fancy_progress_bar(done, None, prefix='Embedding:',
+                               suffix=f"chunks ({stats['docs_per_sec']:.1f} docs/s)")
+        
+        stats = ingest_documents(
+            db,
+            itertools.chain([first_document], documents),
+            workers=DEFAULT_WORKERS,
+            queue_depth=DEFAULT_QUEUE_DEPTH,
+            progress=show_progress
+        )
+        added_count = stats["added"]
+        skipped_count = stats["skipped"]
         
         # Print a newline after the progress bar is complete
         print("\n")
         elapsed_time = time.time() - start_time
+        print(f"Nb of chunks: {stats['documents']}")
         print(f"Added {added_count} new documents to the database.")
         print(f"Skipped {skipped_count} duplicate documents.")
         print(f"Total processing time: {elapsed_time:.2f} seconds.")
@@ -105,52 +152,50 @@ if __name__ == "__main__":
     print("\n=== RAG Query System ===")
     print("Type 'exit' to quit")
     
+    # Repeated questions reuse their embedding and search results
+    retriever = CachedRetriever(db, embed_fn=embed_text, hybrid=True)
+    
     while True:
         user_input = input("\nEnter your question: ")
         if user_input.lower() == "exit":
             break
 
-        # Get embedding for the query
-        print("Generating embedding for your query...")
-        query_embedding = embed_with_ollama(user_input)
-        
-        # Query the database
-        print("Searching for relevant documents...")
-        results = db.query(query_embedding, n_results=10)
-        
-        # Display top result
-        top_result = results[0]
-        top_id = top_result[0]
-        top_similarity = top_result[1]
-        top_text = db.data[top_id]["doc_text"]
-        print(f"\nTop result (similarity: {top_similarity:.4f}):")
-        print(f"{top_text[:150]}...")
-        
-        # Prepare all results for the LLM
-        texts = ""
-        for i, result in enumerate(results):
-            doc_id = result[0]
-            similarity = result[1]
-            text = db.data[doc_id]["doc_text"]
-            texts += f"Fragment {i+1} (similarity: {similarity:.4f}): {text}\n\n"
-        
-        # Create prompt for LLM
-        prompt = f"""
-        I have the following fragments of information in my database:
-        
-        {texts}
+        with span("rag.question"):
+            # Embed the query and search the database: vectors + keywords (cached)
+            print("Searching for relevant documents...")
+            with span("retrieve"):
+                results = retriever.retrieve(user_input, n_results=10)
         
-        Based on these fragments, please answer the following question:
-        {user_input}
+            # Display top result
+            top_result = results[0]
+            top_id = top_result[0]
+            top_similarity = top_result[1]
+            top_text = db.data[top_id]["doc_text"]
+            print(f"\nTop result (score: {top_similarity:.4f}):")
+            print(f"{top_text[:150]}...")
         
-        If no information is relevant to the question, please say so.
-        """
+            # Prepare the results for the LLM: overlapping chunks merged, duplicates dropped, within budget
+            with span("prompt"):
+                context_spans = build_context(db, results)
+                prompt = build_prompt(user_input, [(s["text"], s["score"]) for s in context_spans])
+            print(f"Context: {len(results)} fragments -> {len(context_spans)} spans, "
+                  f"~{sum(s['tokens'] for s in context_spans)} tokens")
         
-        # Query LLM
-        print("\nGenerating answer...")
-        llm_answer = query_llm(prompt)
-        print(f"\nAnswer: {llm_answer}")
+            # Query LLM, printing the answer as it is generated
+            print("\nAnswer: ", end="", flush=True)
+            stream_stats = StreamStats()
+            try:
+                for token in stream_query_llm(prompt, stats=stream_stats):
+                    print(token, end="", flush=True)
+                print(f"\n\n[first token after {stream_stats.time_to_first_token or 0:.2f}s, "
+                      f"{stream_stats.tokens_per_sec:.1f} tokens/s]")
+            except LLMError as e:
+                print(f"\nError: {e}")
     
+    print(f"\nQuery cache: {retriever.stats()}")
+    if tracer.enabled:
+        print("\nStage latencies:")
+        print("\n".join(format_summary()))
     print("\nThank you for using the RAG Query System. Goodbye!")
 #
 
@@ -0,0 +1,325 @@
+#service.py
+# Asyncio RAG query service: the database is loaded once and many questions are
+# answered concurrently. Concurrent query embeddings and vector searches are
+# coalesced into single batched calls (micro-batching), and LLM calls run in a
+# thread pool so one request's generation overlaps the next ones' retrieval.
+#
+# Usage:
+#   python service.py [--db DIR]                 # JSON lines on stdin -> stdout
+#   python service.py --http [PORT] [--db DIR]   # POST /query, GET /stats, GET /metrics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import contextlib
+import json
+import sys
+import time
+
+from context import DEFAULT_TOKEN_BUDGET, build_context, build_prompt  # build_prompt re-exported
+from tracing import format_summary, tracer
+from vectordb import SimpleVectorDB
+
+DEFAULT_MAX_BATCH = 32  # Items per batched call
+DEFAULT_MAX_WAIT = 0.005  # Seconds the first item of a batch waits for company
+DEFAULT_LLM_CONCURRENCY = 8  # LLM calls in flight
+DEFAULT_N_RESULTS = 10
+DEFAULT_HTTP_PORT = 8765
+MAX_REQUEST_BYTES = 1 << 20
+
+class MicroBatcher:
+    """
+    Turns concurrent single-item awaits into batched calls.
+    The first item of a batch waits at most `max_wait` seconds for others;
+    a full batch is sent at once. `batch_fn` runs in `executor`, off the event loop.
+    """
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self.batches = 0
+        self.items = 0
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result (or the batch's exception)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)  # Keep a reference until it is done
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.batch_fn, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch": self.items / self.batches if self.batches else 0.0}
+#
+
+class RAGService:
+    """
+    Answers questions against a loaded SimpleVectorDB.
+    Backends are plain callables so they can be swapped for stubs in tests.
+    """
+    def __init__(
+        self,
+        db: SimpleVectorDB,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        llm_fn: Callable[[str], str],
+        n_results: int = DEFAULT_N_RESULTS,
+        hybrid: bool = False,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        llm_concurrency: int = DEFAULT_LLM_CONCURRENCY,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ):
+        """
+        Args:
+            db (SimpleVectorDB): The database, already loaded.
+            embed_fn (Callable): Embeds a list of texts (e.g. embeds.embed_batch).
+            llm_fn (Callable): Answers a prompt (e.g. llm.query_llm).
+            n_results (int): Default number of fragments retrieved per question.
+            hybrid (bool): Use db.hybrid_query (vectors + BM25) instead of the
+                batched vector search; searches are then run one by one.
+            max_batch (int): Largest embedding / search batch.
+            max_wait (float): Longest wait, in seconds, for a batch to fill up.
+            llm_concurrency (int): LLM calls in flight at once.
+            token_budget (int): Context tokens per prompt (see context.build_context).
+        """
+        self.db = db
+        self.llm_fn = llm_fn
+        self.n_results = n_results
+        self.hybrid = hybrid
+        self.token_budget = token_budget
+        self.requests = 0
+        self.errors = 0
+
+        # Embedding and search run in their own threads, so they are never
+        # queued behind slow LLM calls
+        self._embed_executor = ThreadPoolExecutor(1, thread_name_prefix="embed")
+        self._search_executor = ThreadPoolExecutor(1, thread_name_prefix="search")
+        self._llm_executor = ThreadPoolExecutor(llm_concurrency, thread_name_prefix="llm")
+        self.embedder = MicroBatcher(embed_fn, max_batch, max_wait, self._embed_executor)
+        self.searcher = MicroBatcher(self._search_batch, max_batch, max_wait, self._search_executor)
+
+    def _search_batch(self, items: List[Tuple[str, List[float], int]]) -> List[List[Tuple[str, float]]]:
+        """Search for a batch of (question, embedding, n_results) items."""
+        if self.hybrid:
+            return [self.db.hybrid_query(question, embedding, n_results=n)
+                    for question, embedding, n in items]
+        n_max = max(n for _, _, n in items)
+        results = self.db.query_batch([embedding for _, embedding, _ in items], n_results=n_max)
+        return [result[:n] for result, (_, _, n) in zip(results, items)]
+
+    async def retrieve(self, question: str, n_results: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top (id, score) documents for a question."""
+        embedding = await self.embedder.submit(question)
+        return await self.searcher.submit((question, embedding, n_results or self.n_results))
+
+    async def answer(self, question: str, n_results: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Retrieve fragments for a question and ask the LLM.
+
+        Returns:
+            Dict[str, Any]: {"answer", "sources": [{"id", "score", "metadata"}],
+            "timings": {"retrieve_ms", "llm_ms"}}.
+        """
+        self.requests += 1
+        started = time.perf_counter()
+        with tracer.span("service.retrieve"):
+            results = await self.retrieve(question, n_results)
+        retrieved = time.perf_counter()
+
+        with tracer.span("prompt"):
+            spans = build_context(self.db, results, token_budget=self.token_budget)
+            prompt = build_prompt(question, [(span["text"], span["score"]) for span in spans])
+        answer = await asyncio.get_running_loop().run_in_executor(self._llm_executor, self.llm_fn, prompt)
+        done = time.perf_counter()
+
+        return {
+            "answer": answer,
+            "sources": [{"id": doc_id, "score": score, "metadata": self.db.get_metadata(doc_id)}
+                        for doc_id, score in results],
+            "timings": {"retrieve_ms": 1000 * (retrieved - started), "llm_ms": 1000 * (done - retrieved)}
+        }
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer one JSON request {"question": str, "n_results"?: int, "id"?: any}.
+        Errors are returned as {"error": str} rather than raised; "id" is echoed.
+        """
+        try:
+            question = request.get("question")
+            if not isinstance(question, str) or not question.strip():
+                raise ValueError("Request needs a non-empty 'question' string")
+            n_results = request.get("n_results")
+            if n_results is not None and (isinstance(n_results, bool) or not isinstance(n_results, int)
+                                          or n_results <= 0):
+                raise ValueError("'n_results' must be a positive integer")  # Before it joins a shared batch
+            response = await self.answer(question, n_results)
+        except Exception as e:
+            self.errors += 1
+            response = {"error": str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "errors": self.errors, "documents": len(self.db.data),
+                "embed_batches": self.embedder.stats(), "search_batches": self.searcher.stats()}
+
+    def close(self) -> None:
+        for executor in (self._embed_executor, self._search_executor, self._llm_executor):
+            executor.shutdown(wait=False)
+#
+
+# ------- Front ends -------
+async def serve_jsonl(service: RAGService, input_stream=None, output_stream=None) -> None:
+    """
+    Read one JSON request per line until EOF and write one JSON response per
+    line, in completion order (match them with "id"). Requests are answered
+    concurrently.
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def respond(line: str) -> None:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as e:
+            response = {"error": f"Invalid request: {e}"}
+        else:
+            response = await service.handle(request)
+        output_stream.write(json.dumps(response, ensure_ascii=False) + "\n")
+        output_stream.flush()
+
+    while True:
+        line = await loop.run_in_executor(None, input_stream.readline)
+        if not line:
+            break
+        if line.strip():
+            task = loop.create_task(respond(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def _handle_http(service: RAGService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Minimal HTTP/1.1: one request per connection."""
+    status, body = 200, {}
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        method, path = (request_line + ["", ""])[:2]
+        if method == "GET" and path == "/stats":
+            body = service.stats()
+        elif method == "GET" and path == "/metrics":
+            body = tracer.prometheus_text()
+        elif method == "POST" and path == "/query":
+            length = int(headers.get("content-length", 0))
+            if length > MAX_REQUEST_BYTES:
+                status, body = 413, {"error": "Request too large"}
+            else:
+                request = json.loads(await reader.readexactly(length) or b"{}")
+                body = await service.handle(request if isinstance(request, dict) else {})
+                status = 400 if "error" in body else 200
+        else:
+            status, body = 404, {"error": f"No route for {method} {path}"}
+    except (ValueError, asyncio.IncompleteReadError) as e:
+        status, body = 400, {"error": f"Invalid request: {e}"}
+
+    if isinstance(body, str):
+        payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}[status]
+    writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve_http(service: RAGService, host: str = "127.0.0.1", port: int = DEFAULT_HTTP_PORT) -> None:
+    """Serve POST /query ({"question", "n_results"?}), GET /stats and GET /metrics (Prometheus text) until cancelled."""
+    server = await asyncio.start_server(lambda r, w: _handle_http(service, r, w), host, port)
+    print(f"RAG service listening on http://{host}:{port}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+#
+
+if __name__ == "__main__":
+    from embeds import embed_batch
+    from llm import query_llm
+
+    args = sys.argv[1:]
+    db_path = args[args.index("--db") + 1] if "--db" in args else "vectordb"
+    db = SimpleVectorDB(db_path=db_path)
+    with contextlib.redirect_stdout(sys.stderr):  # stdout carries the responses
+        loaded = db.load_from_disk()
+    if not loaded:
+        sys.exit(f"No database found in {db_path}; build one with rag.py first.")
+
+    service = RAGService(db, embed_fn=embed_batch, llm_fn=query_llm)
+    try:
+        if "--http" in args:
+            position = args.index("--http") + 1
+            port = int(args[position]) if position < len(args) and args[position].isdigit() else DEFAULT_HTTP_PORT
+            asyncio.run(serve_http(service, port=port))
+        else:
+            asyncio.run(serve_jsonl(service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Service stats: {json.dumps(service.stats())}", file=sys.stderr)
+        if tracer.enabled:
+            print("\n".join(format_summary()), file=sys.stderr)
+        service.close()
+#
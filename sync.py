@@ -0,0 +1,170 @@
+#sync.py
+# Incremental re-indexing: keeps a SimpleVectorDB in step with its source files.
+# For every file we record its mtime, size, content hash and the doc_ids its
+# chunks produced, so a re-run only re-chunks changed files, only embeds chunks
+# whose hash is new, and deletes chunks no file produces any more. Chunks kept
+# from an edited file get their new position in their provenance metadata, and
+# chunks whose source file is gone are re-pointed to a file that still has them.
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+import hashlib
+import json
+import os
+
+from chunking import DEFAULT_OVERLAP_TOKENS
+from columnar import atomic_write
+from corpus import chunk_file, expand_sources, iter_corpus_chunks
+from embeds import embed_batch
+from pipeline import ingest_documents
+from vectordb import SimpleVectorDB
+
+SYNC_STATE_FILE = "sources.json"  # Stored in the database directory
+HASH_BLOCK_SIZE = 1 << 20
+
+def file_hash(path: str) -> str:
+    """MD5 of a file's content, read block by block."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_sync_state(db_path: str) -> Dict[str, Any]:
+    """Per-file records of the last sync ({} if the database was never synced)."""
+    state_path = os.path.join(db_path, SYNC_STATE_FILE)
+    if not os.path.exists(state_path):
+        return {"chunking": None, "files": {}}
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_sync_state(db_path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(db_path, exist_ok=True)
+    atomic_write(os.path.join(db_path, SYNC_STATE_FILE),
+                 lambda f: f.write(json.dumps(state, indent=2).encode("utf-8")))
+
+def sync_corpus(
+    db: SimpleVectorDB,
+    sources: Union[str, Iterable[str]],
+    num_words: Optional[int] = None,
+    overlap_words: int = 0,
+    embed_fn: Callable[[List[str]], List[List[float]]] = embed_batch,
+    processes: Optional[int] = None,
+    progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+    target_tokens: Optional[int] = None,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS
+) -> Dict[str, int]:
+    """
+    Bring the database in line with the current content of `sources`, then save it.
+
+    Args:
+        db (SimpleVectorDB): Database to update (loaded, or empty).
+        sources (str | Iterable[str]): Files, directories or glob patterns.
+        num_words (int, optional): Words per chunk.
+        overlap_words (int): Overlap as a number of words. Changing the chunking
+            parameters re-chunks every file.
+        embed_fn (Callable): Embeds a list of texts, one vector per text.
+        processes (int, optional): Worker processes used for chunking.
+        progress (Callable, optional): Called with (chunks_embedded, chunks_to_embed, stats).
+        target_tokens (int, optional): Sentence-aware chunking with this many
+            tokens per chunk, instead of num_words.
+        overlap_tokens (int): Overlap of sentence-aware chunks, in tokens.
+
+    Returns:
+        Dict[str, int]: Counts of unchanged/changed/removed files and of
+        embedded/reused/deleted chunks.
+    """
+    state = load_sync_state(db.db_path)
+    if target_tokens is not None:
+        chunking = ["sentences", target_tokens, overlap_tokens]
+    else:
+        chunking = [num_words, overlap_words]
+    same_chunking = state.get("chunking") == chunking
+    records: Dict[str, Dict[str, Any]] = state.get("files", {}) if same_chunking else {}
+    stats = {"files_unchanged": 0, "files_changed": 0, "files_removed": 0,
+             "chunks_embedded": 0, "chunks_reused": 0, "chunks_deleted": 0}
+
+    # ------- Find changed files: cheap stat first, content hash only if needed -------
+    files = expand_sources(sources)
+    current = set(files)
+    changed: Dict[str, Dict[str, Any]] = {}
+    for path in files:
+        stat = os.stat(path)
+        record = records.get(path)
+        if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime:
+            stats["files_unchanged"] += 1
+            continue
+        content_hash = file_hash(path)
+        if record and record["hash"] == content_hash:
+            record["mtime"] = stat.st_mtime  # Touched but not modified
+            stats["files_unchanged"] += 1
+            continue
+        changed[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": content_hash, "doc_ids": []}
+    stats["files_changed"] = len(changed)
+    stats["files_removed"] = len([path for path in state.get("files", {}) if path not in current])
+
+    # ------- Re-chunk changed files; only new chunks need an embedding -------
+    chunk_hashes: Dict[str, List[str]] = {path: [] for path in changed}
+    to_embed = []
+    placed = set()  # Hashes of reused chunks whose provenance is up to date
+    for chunk, provenance in iter_corpus_chunks(list(changed), num_words, overlap_words, processes=processes,
+                                                target_tokens=target_tokens, overlap_tokens=overlap_tokens):
+        chunk_hash = db.compute_hash(chunk)
+        chunk_hashes[provenance["source"]].append(chunk_hash)
+        doc_id = db.hash_dict.get(chunk_hash)
+        if doc_id is None:
+            to_embed.append((chunk, provenance))
+            continue
+        stats["chunks_reused"] += 1
+        # An unchanged chunk of an edited file has usually moved: its stored
+        # offsets are stale once they point into a changed (or removed) file
+        if chunk_hash not in placed:
+            placed.add(chunk_hash)
+            stored = db.get_metadata(doc_id)
+            if stored != provenance and (stored.get("source") in changed or stored.get("source") not in current):
+                db.update_metadata(doc_id, provenance)
+
+    total = len(to_embed)
+    ingest_stats = ingest_documents(
+        db,
+        to_embed,
+        embed_fn=embed_fn,
+        progress=(lambda done, s: progress(done, total, s)) if progress else None
+    )
+    stats["chunks_embedded"] = ingest_stats["added"]
+    stats["chunks_reused"] += ingest_stats["skipped"]  # Repeated within the new chunks
+
+    for path, hashes in chunk_hashes.items():
+        changed[path]["doc_ids"] = list(dict.fromkeys(db.hash_dict[chunk_hash] for chunk_hash in hashes))
+
+    # ------- Delete chunks that no current file produces any more -------
+    new_records = {path: records[path] for path in files if path not in changed and path in records}
+    new_records.update(changed)
+    referenced = {doc_id for record in new_records.values() for doc_id in record["doc_ids"]}
+    for record in state.get("files", {}).values():
+        for doc_id in record["doc_ids"]:
+            if doc_id not in referenced and db.delete_document(doc_id):
+                stats["chunks_deleted"] += 1
+
+    # ------- Re-point chunks whose stored source no longer produces them -------
+    # A chunk shared with another file keeps the provenance of whichever file
+    # produced it first; once that file is removed (or edited without it), the
+    # chunk is placed in a file that still holds it, re-chunked for its offsets
+    owners: Dict[str, List[str]] = {}
+    for path, record in new_records.items():
+        for doc_id in record["doc_ids"]:
+            owners.setdefault(doc_id, []).append(path)
+    stale: Dict[str, set] = {}
+    for doc_id, paths in owners.items():
+        if doc_id in db.data and db.get_metadata(doc_id).get("source") not in paths:
+            stale.setdefault(paths[0], set()).add(doc_id)
+    for path, doc_ids in stale.items():
+        for chunk, provenance in chunk_file(path, num_words, overlap_words, target_tokens, overlap_tokens):
+            doc_id = db.hash_dict.get(db.compute_hash(chunk))
+            if doc_id in doc_ids:
+                db.update_metadata(doc_id, provenance)
+                doc_ids.discard(doc_id)
+
+    # The database goes first: the state must never claim chunks it does not hold
+    db.save_to_disk()
+    save_sync_state(db.db_path, {"chunking": chunking, "files": new_records})
+    return stats
+#
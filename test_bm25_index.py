@@ -0,0 +1,29 @@
+# Keyword search after deletions: removed documents must stop counting in the
+# document frequencies, or the IDF of common terms goes negative.
+import numpy as np
+
+from vectordb import SimpleVectorDB
+
+def _db(tmp_path):
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    rng = np.random.default_rng(0)
+    doc_ids = [db.add_document(rng.normal(size=4).tolist(), f"foo bar{i}") for i in range(100)]
+    for doc_id in doc_ids[:90]:
+        db.delete_document(doc_id)
+    return db
+
+def test_keyword_query_after_deletes(tmp_path):
+    db = _db(tmp_path)
+    assert len(db.keyword_query("foo", n_results=20)) == 10
+    assert db.get_text(db.keyword_query("foo bar95", n_results=1)[0][0]) == "foo bar95"
+    assert db.keyword_query("bar5") == []
+
+def test_keyword_scores_match_a_fresh_index(tmp_path):
+    db = _db(tmp_path)
+    expected = db.keyword_query("foo bar95", n_results=10)
+    db.save_to_disk()
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    actual = reloaded.keyword_query("foo bar95", n_results=10)
+    assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected]
+    assert np.allclose([score for _, score in actual], [score for _, score in expected])
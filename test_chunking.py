@@ -0,0 +1,63 @@
+#test_chunking.py
+# Memory-mapped chunks must be the same text as the chunks of the decoded
+# file, whatever the byte order mark and line endings of the file; streamed
+# word chunks must be the same as the in-memory ones.
+import codecs
+
+import pytest
+
+import chunking
+from chunking import chunk_document, chunk_spans, chunk_text, iter_chunks, load_text
+
+TEXT = ("Hello there. This is the first paragraph of a short test document, with a few sentences. "
+        "Mr. Smith wrote it.\n\nThe second paragraph follows. It has two more sentences and an é.\n")
+
+def _chunks(path, data):
+    path.write_bytes(data)
+    return list(chunk_document(str(path), target_tokens=8, overlap_tokens=2, memory_map=True))
+
+def _normalized(chunks):
+    return [chunk.replace("\r\n", "\n") for chunk in chunks]
+
+def test_memory_map_without_bom(tmp_path):
+    chunks = _chunks(tmp_path / "plain.txt", TEXT.encode("utf-8"))
+    assert chunks[0].startswith("Hello there.")
+    assert chunks == list(chunk_document(str(tmp_path / "plain.txt"), 8, 2))
+
+def test_memory_map_with_bom(tmp_path):
+    chunks = _chunks(tmp_path / "bom.txt", codecs.BOM_UTF8 + TEXT.encode("utf-8"))
+    assert chunks[0].startswith("Hello there.")
+    assert chunks == list(chunk_document(str(tmp_path / "bom.txt"), 8, 2))
+
+def test_memory_map_crlf(tmp_path):
+    chunks = _chunks(tmp_path / "crlf.txt", TEXT.replace("\n", "\r\n").encode("utf-8"))
+    assert chunks[0].startswith("Hello there.")
+    assert _normalized(chunks) == list(chunk_document(str(tmp_path / "crlf.txt"), 8, 2))
+
+def test_memory_map_latin1(tmp_path):
+    chunks = _chunks(tmp_path / "latin1.txt", TEXT.encode("latin-1"))
+    assert chunks == list(chunk_document(str(tmp_path / "latin1.txt"), 8, 2))
+
+@pytest.mark.parametrize("num_words, overlap_words", [(5, 0), (5, 2), (7, 6), (3, 5), (1, 0), (1000, 10)])
+def test_iter_chunks_matches_chunk_text(tmp_path, monkeypatch, num_words, overlap_words):
+    path = tmp_path / "words.txt"
+    path.write_text((TEXT + "  trailing\twords\n") * 7, encoding="utf-8")
+    monkeypatch.setattr(chunking, "READ_BLOCK_SIZE", 16)  # Words and spaces straddle block boundaries
+    expected = chunk_text(load_text(str(path)), num_words, overlap_words)
+    assert list(iter_chunks(str(path), num_words, overlap_words)) == expected
+
+def test_iter_chunks_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text(" \n", encoding="utf-8")
+    assert list(iter_chunks(str(path), 5, 2)) == chunk_text(load_text(str(path)), 5, 2) == []
+
+def test_overlap_stops_at_paragraph_breaks():
+    # Short paragraphs, so chunks run on across paragraph breaks
+    text = "\n\n".join(f"Short {i}. Tiny {i}." if i % 2 else f"Para {i} one. Para {i} two. Para {i} three."
+                       for i in range(12))
+    spans = chunk_spans(text, target_tokens=12, overlap_tokens=8)
+    assert len(spans) > 3
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        if start < previous_end:
+            assert "\n\n" not in text[start:previous_end]
+    assert any(start < previous_end for (_, previous_end), (start, _) in zip(spans, spans[1:]))
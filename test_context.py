@@ -0,0 +1,86 @@
+# Context assembly: overlapping chunks merge back into the exact source text,
+# near-duplicates are dropped and the budget is respected span by span.
+from chunking import chunk_spans, chunk_text
+from context import build_context, estimate_tokens, merge_chunks
+from vectordb import SimpleVectorDB
+
+PARAGRAPHS = [" ".join(f"Sentence {p}.{s} talks about topic {p} at some length." for s in range(6))
+              for p in range(4)]
+RAW = "\n\n".join(PARAGRAPHS)
+
+def _char_chunks(source="book.txt", raw=RAW):
+    spans = chunk_spans(raw, target_tokens=40, overlap_tokens=14)
+    return [{"doc_id": f"doc_{i}", "text": raw[start:end], "score": 1.0 - i / 100,
+             "metadata": {"source": source, "char_start": start, "char_end": end}}
+            for i, (start, end) in enumerate(spans)]
+
+def test_char_chunks_merge_into_the_source_text():
+    chunks = _char_chunks()
+    assert any(chunk["metadata"]["char_start"] < previous["metadata"]["char_end"]
+               for previous, chunk in zip(chunks, chunks[1:]))  # Overlapping chunks
+    spans = merge_chunks(chunks[::-1])  # In any order
+    assert len(spans) == 1
+    span = spans[0]
+    assert span["text"] == RAW[span["char_start"]:span["char_end"]] == RAW
+    assert span["score"] == 1.0
+    assert sorted(span["doc_ids"]) == sorted(chunk["doc_id"] for chunk in chunks)
+
+def test_char_chunks_with_a_hole_stay_apart():
+    chunks = _char_chunks()
+    spans = merge_chunks(chunks[:2] + chunks[5:7])
+    assert len(spans) == 2
+    for span in spans:
+        assert span["text"] == RAW[span["char_start"]:span["char_end"]]
+
+def test_word_chunks_merge_into_the_source_words():
+    words = RAW.split()
+    chunks = [{"doc_id": f"doc_{i}", "text": text, "score": 0.5,
+               "metadata": {"source": "book.txt", "word_offset": i * 7}}
+              for i, text in enumerate(chunk_text(RAW, 10, 3))]
+    spans = merge_chunks(chunks[2:6] + chunks[:1] + [{"doc_id": "loose", "text": "no offsets", "score": 0.9}])
+    assert [span["doc_ids"] for span in spans] == [["loose"], ["doc_0"], ["doc_2", "doc_3", "doc_4", "doc_5"]]
+    for span in spans[1:]:
+        assert span["text"] == " ".join(words[span["word_start"]:span["word_end"]])
+    assert spans[2]["word_start"] == 14 and spans[2]["word_end"] == 45
+
+def _db(tmp_path, chunks):
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    results = []
+    for i, chunk in enumerate(chunks):
+        doc_id = db.add_document([1.0, float(i)], chunk["text"], chunk["metadata"])
+        results.append((doc_id, chunk["score"]))
+    return db, results
+
+def test_near_duplicates_are_dropped(tmp_path):
+    chunks = _char_chunks()[:1]
+    # The same passage in another edition of the book, with a word added
+    text = chunks[0]["text"] + " Reprinted."
+    chunks.append({"doc_id": None, "text": text, "score": 0.5,
+                   "metadata": {"source": "copy.txt", "char_start": 0, "char_end": len(text)}})
+    db, results = _db(tmp_path, chunks)
+    spans = build_context(db, results, token_budget=10_000)
+    assert [span["source"] for span in spans] == ["book.txt"]
+    kept = build_context(db, results, token_budget=10_000, near_duplicate_threshold=None)
+    assert [span["source"] for span in kept] == ["book.txt", "copy.txt"]
+
+def test_budget_keeps_whole_spans(tmp_path):
+    sources = [f"book_{i}.txt" for i in range(4)]
+    chunks = [dict(chunk, score=1.0 - i / 10) for i, chunk in
+              enumerate(_char_chunks(source, f"{source} " + PARAGRAPHS[i])[0] for i, source in enumerate(sources))]
+    db, results = _db(tmp_path, chunks)
+    sizes = [estimate_tokens(chunk["text"]) for chunk in chunks]
+    budget = sizes[0] + sizes[1] + sizes[2] // 2
+    spans = build_context(db, results, token_budget=budget)
+    assert [span["source"] for span in spans] == sources[:2]  # The third and fourth do not fit
+    assert sum(span["tokens"] for span in spans) <= budget
+    for span, chunk in zip(spans, chunks):
+        assert span["text"] == chunk["text"]  # Never cut in the middle
+
+def test_best_span_is_cut_after_a_word(tmp_path):
+    db, results = _db(tmp_path, _char_chunks())
+    spans = build_context(db, results, token_budget=40)
+    assert len(spans) == 1
+    span = spans[0]
+    assert span["tokens"] <= 40
+    assert span["text"] == RAW[span["char_start"]:span["char_end"]]
+    assert RAW[span["char_end"]].isspace()
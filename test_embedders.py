@@ -0,0 +1,35 @@
+# Ollama batching: a failing batch is retried with backoff, then split; no
+# backoff is slept after the last attempt.
+import pytest
+
+import embedders
+from embedders import OLLAMA_MAX_RETRIES, OLLAMA_RETRY_DELAY, OllamaEmbedder
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(embedders.time, "sleep", delays.append)
+    return delays
+
+def _embedder(monkeypatch, max_batch):
+    """An OllamaEmbedder whose server rejects batches larger than max_batch."""
+    embedder = OllamaEmbedder(batch_size=4)
+    def request(texts):
+        if len(texts) > max_batch:
+            raise RuntimeError("Request too large")
+        return [[float(len(text))] for text in texts]
+    monkeypatch.setattr(embedder, "_request", request)
+    return embedder
+
+def test_failing_batch_is_split(monkeypatch, sleeps):
+    embedder = _embedder(monkeypatch, max_batch=2)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    assert embedder.embed_batch(texts) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    # One failed batch of 4: a backoff between attempts, none after the last one
+    assert sleeps == [OLLAMA_RETRY_DELAY * 2 ** attempt for attempt in range(OLLAMA_MAX_RETRIES - 1)]
+
+def test_gives_up_without_a_final_wait(monkeypatch, sleeps):
+    embedder = _embedder(monkeypatch, max_batch=0)
+    with pytest.raises(RuntimeError, match="Embedding failed"):
+        embedder.embed_batch(["a"])
+    assert len(sleeps) == OLLAMA_MAX_RETRIES - 1
@@ -0,0 +1,95 @@
+# Response cache of query_llm: identical deterministic calls are served from
+# the cache; any change to model, prompt or temperature, non-deterministic
+# calls and expired entries go to the LLM.
+from types import SimpleNamespace
+
+import pytest
+
+import llm
+import llm_cache
+from llm_cache import LLMResponseCache
+
+class StubClient:
+    """Stands in for LLMClient: answers with a counter so repeated calls are told apart."""
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"answer {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    client = StubClient()
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), ttl=60.0)
+    monkeypatch.setattr(llm, "_settings_loaded", True)
+    monkeypatch.setattr(llm, "MODEL", "model-a")
+    monkeypatch.setattr(llm, "_client", client)
+    monkeypatch.setattr(llm, "_llm_cache", cache)
+    yield client
+    cache.close()
+
+def _ask(prompt="What is RAG?", **kwargs):
+    kwargs.setdefault("temperature", 0)
+    return llm.query_llm(prompt, cache=True, **kwargs)
+
+def test_identical_deterministic_call_hits(stub):
+    assert _ask() == "answer 1"
+    assert _ask() == "answer 1"
+    assert stub.calls == 1
+    assert llm.get_llm_cache().hits == 1
+
+@pytest.mark.parametrize("change", [{"prompt": "What is BM25?"}, {"model": "model-b"},
+                                    {"system_prompt": "Answer in French."}, {"max_tokens": 10}])
+def test_changed_call_misses(stub, change):
+    assert _ask() == "answer 1"
+    assert _ask(**change) == "answer 2"
+    assert stub.calls == 2
+
+def test_non_deterministic_calls_are_not_cached(stub):
+    assert _ask(temperature=0.7) == "answer 1"
+    assert _ask(temperature=0.7) == "answer 2"
+    assert _ask(temperature=0, n=2) == "answer 3"
+    assert _ask(temperature=0, n=2) == "answer 4"
+    assert len(llm.get_llm_cache()) == 0
+
+def test_changed_temperature_misses(stub):
+    assert _ask() == "answer 1"
+    assert _ask(temperature=0.7) == "answer 2"
+    assert _ask() == "answer 1"
+
+def test_cache_off_by_default(stub):
+    assert llm.query_llm("What is RAG?", temperature=0) == "answer 1"
+    assert llm.query_llm("What is RAG?", temperature=0) == "answer 2"
+
+def test_expired_entry_misses(stub, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    assert _ask() == "answer 1"
+    now[0] += 59
+    assert _ask() == "answer 1"
+    now[0] += 2  # 61 s after it was stored
+    assert _ask() == "answer 2"
+    assert _ask() == "answer 2"
+    assert stub.calls == 2
+
+def test_lru_eviction(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "lru.sqlite"), max_entries=10)
+    for i in range(10):
+        cache.put(f"key {i}", f"response {i}")
+    assert cache.get("key 0") == "response 0"  # Now the most recently used
+    cache.put("key 10", "response 10")
+    assert len(cache) <= 10
+    assert cache.get("key 0") == "response 0"
+    assert cache.get("key 1") is None
+    cache.close()
+
+def test_entries_persist(tmp_path):
+    path = str(tmp_path / "persist.sqlite")
+    cache = LLMResponseCache(path)
+    cache.put("key", "response")
+    cache.close()
+    reopened = LLMResponseCache(path)
+    assert reopened.get("key") == "response"
+    reopened.close()
@@ -0,0 +1,163 @@
+# LLMClient against a local mock OpenAI-compatible server: retries on 429 and
+# 5xx honour Retry-After, give up after max_retries, and the limiter paces calls;
+# streamed answers report their time to first token and token count.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import openai
+import pytest
+
+import llm
+import llm_client
+from llm import StreamStats, stream_query_llm
+from llm_client import LLMClient, TokenBucket
+
+COMPLETION = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "mock",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "pong"}}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4}
+}
+STREAM_TOKENS = ["The", " answer", " is", " forty", " two."]
+STREAM_DELAY = 0.05  # Seconds before each streamed token
+
+def _stream_chunk(**fields):
+    return dict({"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "mock"}, **fields)
+
+class MockServer:
+    """Answers each POST with the next scripted (status, headers), then with a completion."""
+    def __init__(self):
+        self.script = []
+        self.arrivals = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+                server.arrivals.append(time.monotonic())
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                if status == 200 and request.get("stream"):
+                    return self._stream()
+                body = json.dumps(COMPLETION if status == 200 else {"error": {"message": f"status {status}"}})
+                self.send_response(status)
+                for name, value in dict(headers, **{"Content-Type": "application/json"}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode("utf-8"))
+
+            def _stream(self):
+                """Server-sent events: one chunk per token, then the usage, then [DONE]."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                events = [_stream_chunk(choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                          for token in STREAM_TOKENS]
+                usage = {"prompt_tokens": 3, "completion_tokens": len(STREAM_TOKENS),
+                         "total_tokens": 3 + len(STREAM_TOKENS)}
+                events.append(_stream_chunk(choices=[], usage=usage))
+                for event in events:
+                    if event["choices"]:
+                        time.sleep(STREAM_DELAY)
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server():
+    server = MockServer()
+    yield server
+    server.close()
+
+def _client(server, **kwargs):
+    return LLMClient(model="mock", base_url=server.url, api_key="test", **kwargs)
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+def test_retries_429_and_5xx_honouring_retry_after(server):
+    server.script = [(429, {"Retry-After": "0.3"}), (503, {"Retry-After": "0.2"})]
+    client = _client(server, max_retries=3)
+    completion = client.chat(MESSAGES)
+    assert completion.choices[0].message.content == "pong"
+    assert client.retries == 2
+    assert len(server.arrivals) == 3
+    assert server.arrivals[1] - server.arrivals[0] >= 0.3
+    assert server.arrivals[2] - server.arrivals[1] >= 0.2
+    client.close()
+
+def test_gives_up_after_max_retries(server):
+    server.script = [(500, {"Retry-After": "0"})] * 10
+    client = _client(server, max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        client.chat(MESSAGES)
+    assert len(server.arrivals) == 3
+    assert client.retries == 2
+    client.close()
+
+def test_client_errors_are_not_retried(server):
+    server.script = [(400, {})]
+    client = _client(server, max_retries=3)
+    with pytest.raises(openai.BadRequestError):
+        client.chat(MESSAGES)
+    assert len(server.arrivals) == 1
+    client.close()
+
+def test_exponential_backoff_without_retry_after(server, monkeypatch):
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0.01)
+    server.script = [(502, {}), (502, {})]
+    client = _client(server, max_retries=2)
+    assert client.chat(MESSAGES).choices[0].message.content == "pong"
+    assert len(server.arrivals) == 3
+    client.close()
+
+def test_async_retries(server):
+    import asyncio
+    server.script = [(429, {"Retry-After": "0"})]
+    client = _client(server, max_retries=1)
+    completion = asyncio.run(client.achat(MESSAGES))
+    assert completion.choices[0].message.content == "pong"
+    assert client.retries == 1
+
+def test_requests_per_minute_paces_calls(server):
+    # 600 requests per minute = one every 0.1 s once the first minute's burst is spent
+    client = _client(server, requests_per_minute=600)
+    client.limiter.requests.reserve(client.limiter.requests.capacity)
+    started = time.monotonic()
+    for _ in range(4):
+        client.chat(MESSAGES)
+    assert len(server.arrivals) == 4
+    assert server.arrivals[0] - started >= 0.09
+    assert server.arrivals[-1] - started >= 0.39
+    client.close()
+
+def test_token_bucket_reserve_and_refund():
+    bucket = TokenBucket(60)  # One unit per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+    bucket.refund(2)
+    assert bucket.reserve(0.5) == pytest.approx(0.5, abs=0.05)
+
+def test_stream_stats_count_from_the_request(server, monkeypatch):
+    client = _client(server)
+    monkeypatch.setattr(llm, "_client", client)
+    stats = StreamStats()
+    time.sleep(0.3)  # Built well before the request: must not count towards the timings
+    assert "".join(stream_query_llm("ping", stats=stats)) == "".join(STREAM_TOKENS)
+    total = stats.finished_at - stats.started
+    assert STREAM_DELAY <= stats.time_to_first_token < 0.3
+    assert stats.time_to_first_token <= total
+    assert stats.chunks == stats.completion_tokens == len(STREAM_TOKENS)
+    assert stats.tokens_per_sec > 0
+    client.close()
@@ -0,0 +1,145 @@
+# Metadata filters: the index masks and filtered queries must select exactly
+# the rows a brute-force filter over the metadata selects.
+import numpy as np
+import pytest
+
+from metadata_index import MetadataIndex
+from vectordb import SimpleVectorDB
+
+DIMENSION = 8
+TAGS = ["a", "b", "c", "d"]
+
+FILTERS = [
+    {"source": "file_2.txt"},
+    {"source": {"$eq": "file_0.txt"}},
+    {"source": ["file_1.txt", "file_3.txt", "missing.txt"]},
+    {"source": {"$in": ["file_4.txt"]}},
+    {"source": {"$ne": "file_0.txt"}},
+    {"chunk": {"$gte": 10, "$lt": 20}},
+    {"chunk": {"$gt": 55}},
+    {"chunk": {"$lte": 2}},
+    {"chunk": 7},  # Selective: scores only the matching rows
+    {"score": {"$gt": 0.25, "$lte": 0.75}},
+    {"lang": {"$gte": "en", "$lt": "fr"}},
+    {"lang": {"$ne": "de"}},
+    {"tags": "b"},
+    {"tags": {"$in": ["a", "d"]}},
+    {"tags": {"$ne": "a"}},
+    {"source": "file_1.txt", "chunk": {"$lt": 30}, "tags": "c"},
+    {"source": "file_2.txt", "lang": "en"},
+    {"nowhere": 1},
+    {"chunk": {"$gt": "text"}},  # Strings never compare with numbers
+]
+
+def _key(value):
+    return repr(value) if isinstance(value, (dict, list)) else value
+
+def _holds(item, op, operand):
+    if op == "$eq":
+        return _key(item) == _key(operand)
+    if op == "$in":
+        return _key(item) in [_key(value) for value in operand]
+    if op == "$ne":
+        return _key(item) != _key(operand)
+    comparable = (isinstance(item, str) and isinstance(operand, str)) or \
+        (isinstance(item, (int, float)) and isinstance(operand, (int, float)))
+    if not comparable:
+        return False
+    return {"$gt": item > operand, "$gte": item >= operand, "$lt": item < operand, "$lte": item <= operand}[op]
+
+def matches(metadata, where):
+    """Brute-force filter: every field matches; a list field matches if any element does."""
+    for name, condition in where.items():
+        value = (metadata or {}).get(name)
+        if value is None:
+            return False
+        if not (isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition)):
+            condition = {"$in": condition} if isinstance(condition, list) else {"$eq": condition}
+        items = value if isinstance(value, list) else [value]
+        if not any(all(_holds(item, op, operand) for op, operand in condition.items()) for item in items):
+            return False
+    return True
+
+def _metadata(i, rng):
+    metadata = {"source": f"file_{i % 5}.txt", "chunk": i % 60, "score": float(rng.uniform()),
+                "tags": [tag for tag in TAGS if rng.uniform() < 0.4]}
+    if i % 3:
+        metadata["lang"] = ["de", "en", "es", "fr"][i % 4]
+    return metadata
+
+def _metadata_list(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return [_metadata(i, rng) for i in range(n_rows)]
+
+def _index(metadata_list):
+    index = MetadataIndex()
+    for row, metadata in enumerate(metadata_list):
+        index.add(row, metadata)
+    return index
+
+@pytest.mark.parametrize("where", FILTERS)
+def test_mask_matches_brute_force(where):
+    metadata_list = _metadata_list(300)
+    expected = np.array([matches(metadata, where) for metadata in metadata_list])
+    index = _index(metadata_list)
+    assert np.array_equal(index.mask(where), expected)
+    assert np.array_equal(index.mask(where), expected)  # Again, from the cached bitmaps
+
+def test_mask_after_adds_and_save(tmp_path):
+    metadata_list = _metadata_list(300)
+    index = _index(metadata_list[:200])
+    for where in FILTERS:
+        index.mask(where)  # Build bitmaps, then keep them up to date
+    for row in range(200, 300):
+        index.add(row, metadata_list[row])
+    for where in FILTERS:
+        assert np.array_equal(index.mask(where), [matches(metadata, where) for metadata in metadata_list])
+
+    path = str(tmp_path / "metadata_index.npz")
+    index.save(path)
+    reloaded = MetadataIndex.load(path)
+    for where in FILTERS:
+        assert np.array_equal(reloaded.mask(where), index.mask(where))
+
+def _db(tmp_path, n_rows):
+    rng = np.random.default_rng(1)
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    for i, metadata in enumerate(_metadata_list(n_rows)):
+        db.add_document(rng.normal(size=DIMENSION).tolist(), f"document {i}", metadata)
+    return db
+
+def _assert_queries_match(db):
+    query = np.random.default_rng(2).normal(size=DIMENSION)
+    doc_ids = list(db.data)
+    vectors = np.array([db.data[doc_id]["doc_embedding"] for doc_id in doc_ids], dtype=np.float64)
+    scores = vectors @ query / np.linalg.norm(vectors, axis=1)
+    for where in FILTERS:
+        allowed = [i for i, doc_id in enumerate(doc_ids) if matches(db.get_metadata(doc_id), where)]
+        expected = [doc_ids[i] for i in sorted(allowed, key=lambda i: -scores[i])[:15]]
+        assert [doc_id for doc_id, _ in db.query(query.tolist(), n_results=15, where=where)] == expected
+        assert {doc_id for doc_id, _ in db.query(query.tolist(), n_results=len(doc_ids), where=where)} == \
+            {doc_ids[i] for i in allowed}
+
+def test_query_where_matches_brute_force(tmp_path):
+    db = _db(tmp_path, 400)
+    _assert_queries_match(db)
+
+def test_query_where_after_changes_and_reload(tmp_path):
+    db = _db(tmp_path, 400)
+    _assert_queries_match(db)  # Bitmaps built before the changes
+    doc_ids = list(db.data)
+    for doc_id in doc_ids[::7]:
+        db.delete_document(doc_id)
+    for doc_id in doc_ids[1::11]:
+        db.update_metadata(doc_id, {"source": "moved.txt", "chunk": 7, "tags": ["a"], "lang": "en"})
+    rng = np.random.default_rng(3)
+    for i in range(400, 450):
+        db.add_document(rng.normal(size=DIMENSION).tolist(), f"document {i}", _metadata(i, rng))
+    _assert_queries_match(db)
+    assert len(db.query([1.0] * DIMENSION, n_results=100, where={"source": "moved.txt"})) == \
+        len([doc_id for doc_id in doc_ids[1::11] if doc_id in db.data])
+
+    db.save_to_disk()
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    _assert_queries_match(reloaded)
@@ -0,0 +1,100 @@
+# Concurrent ingestion: documents are inserted in input order, the producer is
+# held back by the in-flight bound, and failures surface instead of hanging.
+import random
+import threading
+import time
+
+import pytest
+
+from embedders import HashEmbedder
+from pipeline import ingest_documents
+from vectordb import SimpleVectorDB
+
+EMBED = HashEmbedder(dim=8)
+
+def _ingest(db, documents, **kwargs):
+    """ingest_documents in a thread, failing the test if it does not return."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["stats"] = ingest_documents(db, documents, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=20)
+    assert not thread.is_alive(), "ingest_documents did not return"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["stats"]
+
+def test_order_is_preserved(tmp_path):
+    rng = random.Random(0)
+
+    def jittery_embed(texts):
+        time.sleep(rng.uniform(0, 0.01))  # Workers finish out of order
+        return EMBED(texts)
+
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    documents = [(f"document {i}", {"n": i}) for i in range(300)] + ["plain text"]
+    stats = _ingest(db, documents, embed_fn=jittery_embed, workers=4, batch_size=7)
+    assert stats["added"] == 301 and stats["batches"] == 43
+    doc_ids = list(db.data)
+    assert [db.get_text(doc_id) for doc_id in doc_ids] == [text for text, _ in documents[:-1]] + ["plain text"]
+    assert [db.get_metadata(doc_id).get("n") for doc_id in doc_ids[:300]] == list(range(300))
+
+def test_duplicates_are_skipped(tmp_path):
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    stats = _ingest(db, ["a", "b", "a", "c", "b"], embed_fn=EMBED, batch_size=2)
+    assert (stats["added"], stats["skipped"]) == (3, 2)
+
+def test_backpressure_bounds_batches_in_flight(tmp_path):
+    workers, queue_depth, batch_size = 2, 3, 5
+    produced = [0]
+    done = [0]
+    ahead = []
+
+    def documents():
+        for i in range(400):
+            produced[0] += 1
+            ahead.append(produced[0] - done[0])
+            yield f"document {i}"
+
+    def slow_embed(texts):
+        time.sleep(0.005)
+        return EMBED(texts)
+
+    def progress(count, stats):
+        done[0] = count
+
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    _ingest(db, documents(), embed_fn=slow_embed, workers=workers, queue_depth=queue_depth,
+            batch_size=batch_size, progress=progress)
+    # In flight: queue_depth + workers batches, plus the batch being filled and
+    # one inserted batch the progress callback has not reported yet
+    assert max(ahead) <= (queue_depth + workers + 2) * batch_size
+    assert len(db.data) == 400
+
+def test_embed_error_is_raised(tmp_path):
+    calls = [0]
+
+    def failing_embed(texts):
+        calls[0] += 1
+        if calls[0] == 3:
+            raise RuntimeError("embedding server down")
+        return EMBED(texts)
+
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    with pytest.raises(RuntimeError, match="embedding server down"):
+        _ingest(db, (f"document {i}" for i in range(1000)), embed_fn=failing_embed, workers=1, batch_size=4)
+
+def test_producer_error_is_raised(tmp_path):
+    def documents():
+        for i in range(50):
+            yield f"document {i}"
+        raise ValueError("unreadable file")
+
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    with pytest.raises(ValueError, match="unreadable file"):
+        _ingest(db, documents(), embed_fn=EMBED, workers=3, batch_size=4)
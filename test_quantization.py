@@ -0,0 +1,89 @@
+# Quantized storage: compressed codes with exact re-ranking give the float32
+# ranking, and codes and codebooks survive saves, loads and log replay.
+import numpy as np
+import pytest
+
+from quantization import PQ_CENTROIDS, PQCodec, quantization_report
+from vectordb import SimpleVectorDB
+
+DIMENSION = 32
+
+def _db(tmp_path, n_rows, use_wal=False, seed=0):
+    rng = np.random.default_rng(seed)
+    db = SimpleVectorDB(str(tmp_path / "db"), use_wal=use_wal)
+    for i, vector in enumerate(rng.normal(size=(n_rows, DIMENSION))):
+        db.add_document(vector.tolist(), f"document {i}")
+    return db
+
+def _queries(n_queries=20, seed=1):
+    return np.random.default_rng(seed).normal(size=(n_queries, DIMENSION)).tolist()
+
+def _ids(results):
+    return [[doc_id for doc_id, _ in result] for result in results]
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_rerank_gives_the_float32_ranking(tmp_path, precision):
+    db = _db(tmp_path, 600)
+    queries = _queries()
+    exact = db.query_batch(queries, n_results=10, exact=True)
+    db.quantize(precision, rerank_factor=4)
+    reranked = db.query_batch(queries, n_results=10, exact=True)
+    assert _ids(reranked) == _ids(exact)
+    for approx, expected in zip(reranked, exact):
+        assert np.allclose([score for _, score in approx], [score for _, score in expected], atol=1e-5)
+
+def test_pq_trains_on_fewer_rows_than_centroids():
+    vectors = np.random.default_rng(2).normal(size=(40, DIMENSION)).astype(np.float32)
+    codec = PQCodec(DIMENSION)
+    codec.train(vectors)
+    assert codec.codebooks.shape == (DIMENSION // 8, 40, 8)
+    codes = codec.encode(vectors)
+    assert codes.shape == (40, codec.code_bytes)
+    assert codes.max() < 40 < PQ_CENTROIDS
+    # Each training point is its own centroid's nearest neighbour, so it scores highest against itself
+    assert np.array_equal(np.argmax(codec.scores(vectors, codes), axis=1), np.arange(40))
+
+def test_pq_encode_before_train_raises():
+    with pytest.raises(ValueError):
+        PQCodec(DIMENSION).encode(np.zeros((1, DIMENSION), dtype=np.float32))
+
+def test_quantize_empty_database_raises(tmp_path):
+    with pytest.raises(ValueError):
+        SimpleVectorDB(str(tmp_path / "db")).quantize("int8")
+
+@pytest.mark.parametrize("precision", ["int8", "pq"])
+def test_codes_survive_save_load_and_replay(tmp_path, precision):
+    db = _db(tmp_path, 300, use_wal=True)
+    db.quantize(precision, rerank_factor=0)  # Raw code scores: any change to codes or codebooks shows
+    db.compact()
+    rng = np.random.default_rng(3)
+    for i, vector in enumerate(rng.normal(size=(30, DIMENSION))):
+        db.add_document(vector.tolist(), f"logged {i}")  # Only in the log, encoded on replay
+    assert db.delete_document("doc_5")
+    queries = _queries()
+    expected = db.query_batch(queries, n_results=10, exact=True)
+    db.close()
+
+    reloaded = SimpleVectorDB(db.db_path, use_wal=True)
+    assert reloaded.load_from_disk()
+    assert (reloaded.precision, reloaded.rerank_factor) == (precision, 0)
+    assert reloaded.query_batch(queries, n_results=10, exact=True) == expected
+
+    # And once the log is merged into the files
+    reloaded.compact()
+    reloaded.close()
+    again = SimpleVectorDB(db.db_path)
+    assert again.load_from_disk()
+    assert again.query_batch(queries, n_results=10, exact=True) == expected
+
+def test_report_restores_the_settings(tmp_path):
+    db = _db(tmp_path, 300)
+    db.quantize("int8", rerank_factor=3)
+    queries = _queries(5)
+    before = db.query_batch(queries, n_results=5, exact=True)
+    report = quantization_report(db, queries, n_results=5, rerank_factor=2)
+    assert {(row["precision"], row["rerank_factor"]) for row in report} == {
+        ("float32", 0), ("float16", 0), ("float16", 2), ("int8", 0), ("int8", 2), ("pq", 0), ("pq", 2)}
+    assert all(0.0 <= row["recall"] <= 1.0 for row in report)
+    assert (db.precision, db.rerank_factor) == ("int8", 3)
+    assert db.query_batch(queries, n_results=5, exact=True) == before
@@ -0,0 +1,90 @@
+# Query caches of the interactive loop: repeated questions are served from the
+# cache until the database changes or the entry expires.
+import pytest
+
+import query_cache
+from embedders import HashEmbedder
+from query_cache import CachedRetriever, LRUCache
+from vectordb import SimpleVectorDB
+
+TEXTS = ["the cat sat on the mat", "a dog chased the cat", "stock markets fell today", "rain is expected tomorrow"]
+
+class CountingEmbedder:
+    def __init__(self):
+        self.embedder = HashEmbedder(dim=16)
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return self.embedder.embed(text)
+
+@pytest.fixture
+def setup(tmp_path):
+    embed = CountingEmbedder()
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    doc_ids = [db.add_document(embed.embedder.embed(text), text, {"n": i}) for i, text in enumerate(TEXTS)]
+    searches = [0]
+    query = db.query
+
+    def counting_query(*args, **kwargs):
+        searches[0] += 1
+        return query(*args, **kwargs)
+    db.query = counting_query
+    return db, embed, searches, doc_ids
+
+def test_repeated_query_hits(setup):
+    db, embed, searches, _ = setup
+    retriever = CachedRetriever(db, embed_fn=embed)
+    first = retriever.retrieve("Where is the cat?", n_results=2)
+    assert retriever.retrieve("  where is THE cat? ", n_results=2) == first
+    assert (embed.calls, searches[0]) == (1, 1)
+    assert retriever.stats()["results"] == {"hits": 1, "misses": 1, "entries": 1}
+    assert retriever.stats()["embeddings"] == {"hits": 0, "misses": 1, "entries": 1}
+
+    # Another n_results is another search, but the embedding is reused
+    retriever.retrieve("where is the cat?", n_results=3)
+    assert (embed.calls, searches[0]) == (1, 2)
+    assert retriever.stats()["embeddings"]["hits"] == 1
+
+@pytest.mark.parametrize("change", ["add", "delete", "update_metadata"])
+def test_database_change_invalidates_results(setup, change):
+    db, embed, searches, doc_ids = setup
+    retriever = CachedRetriever(db, embed_fn=embed)
+    before = retriever.retrieve("the cat", n_results=4)
+    if change == "add":
+        db.add_document(embed.embedder.embed("the cat is back"), "the cat is back")
+    elif change == "delete":
+        db.delete_document(before[0][0])
+    else:
+        db.update_metadata(doc_ids[0], {"n": 100})
+    after = retriever.retrieve("the cat", n_results=4)
+    assert searches[0] == 2
+    assert embed.calls == 1  # Embeddings do not depend on the corpus
+    if change != "update_metadata":
+        assert after != before
+    assert retriever.retrieve("the cat", n_results=4) == after
+    assert searches[0] == 2
+
+def test_entries_expire(setup, monkeypatch):
+    db, embed, searches, _ = setup
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    retriever = CachedRetriever(db, embed_fn=embed, ttl=10.0)
+    retriever.retrieve("rain", n_results=1)
+    now[0] += 9
+    retriever.retrieve("rain", n_results=1)
+    assert (embed.calls, searches[0]) == (1, 1)
+    now[0] += 2  # 11 s after the first call
+    retriever.retrieve("rain", n_results=1)
+    assert (embed.calls, searches[0]) == (2, 2)
+    assert retriever.stats()["results"]["misses"] == 2
+
+def test_lru_cache_evicts_and_counts():
+    cache = LRUCache(max_entries=2, ttl=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 2}
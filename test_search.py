@@ -0,0 +1,98 @@
+# Vector search of SimpleVectorDB against a brute-force cosine top-k.
+import numpy as np
+import pytest
+
+import vectordb
+from vectordb import SimpleVectorDB
+
+DIMENSION = 16
+
+def _corpus(tmp_path, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_rows, DIMENSION)) * rng.uniform(0.1, 10, size=(n_rows, 1))
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    doc_ids = [db.add_document(vector.tolist(), f"document {i}") for i, vector in enumerate(vectors)]
+    return db, vectors, doc_ids
+
+def _brute_force(vectors, doc_ids, query, n_results, live=None):
+    scores = (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    order = [row for row in np.argsort(-scores, kind="stable") if live is None or live[row]]
+    return [(doc_ids[row], float(scores[row])) for row in order[:n_results]]
+
+def _assert_same(actual, expected):
+    assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected]
+    assert np.allclose([score for _, score in actual], [score for _, score in expected], atol=1e-5)
+
+@pytest.mark.parametrize("n_results", [1, 5, 300])
+def test_query_matches_brute_force(tmp_path, monkeypatch, n_results):
+    monkeypatch.setattr(vectordb, "INITIAL_CAPACITY", 16)  # Grow the matrix a few times
+    db, vectors, doc_ids = _corpus(tmp_path, 200)
+    rng = np.random.default_rng(1)
+    for query in rng.normal(size=(10, DIMENSION)):
+        _assert_same(db.query(query.tolist(), n_results=n_results),
+                     _brute_force(vectors, doc_ids, query, n_results))
+
+def test_query_skips_deleted_documents(tmp_path):
+    db, vectors, doc_ids = _corpus(tmp_path, 100)
+    live = np.ones(len(doc_ids), dtype=bool)
+    for row in range(0, 100, 3):
+        assert db.delete_document(doc_ids[row])
+        live[row] = False
+    query = np.random.default_rng(2).normal(size=DIMENSION)
+    _assert_same(db.query(query.tolist(), n_results=20), _brute_force(vectors, doc_ids, query, 20, live))
+
+def test_query_rejects_wrong_dimension(tmp_path):
+    db, _, _ = _corpus(tmp_path, 10)
+    with pytest.raises(ValueError):
+        db.query([1.0] * (DIMENSION + 1))
+    assert db.query([1.0] * DIMENSION, n_results=0) == []
+
+@pytest.mark.parametrize("tile_rows, block_rows", [(7, 3), (64, 5), (1000, 1000)])
+def test_query_batch_across_tiles(tmp_path, monkeypatch, tile_rows, block_rows):
+    monkeypatch.setattr(vectordb, "CORPUS_TILE_ROWS", tile_rows)
+    monkeypatch.setattr(vectordb, "QUERY_BLOCK_ROWS", block_rows)
+    db, vectors, doc_ids = _corpus(tmp_path, 150)
+    db.delete_document(doc_ids[10])
+    live = np.ones(len(doc_ids), dtype=bool)
+    live[10] = False
+    queries = np.random.default_rng(3).normal(size=(11, DIMENSION))
+    results = db.query_batch(queries.tolist(), n_results=12)
+    assert len(results) == len(queries)
+    for query, result in zip(queries, results):
+        _assert_same(result, _brute_force(vectors, doc_ids, query, 12, live))
+    _assert_same(db.query(queries[4].tolist(), n_results=12), results[4])
+
+def test_query_batch_more_results_than_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(vectordb, "CORPUS_TILE_ROWS", 4)
+    db, vectors, doc_ids = _corpus(tmp_path, 10)
+    queries = np.random.default_rng(4).normal(size=(3, DIMENSION))
+    for query, result in zip(queries, db.query_batch(queries, n_results=50)):
+        _assert_same(result, _brute_force(vectors, doc_ids, query, 50))
+    assert db.query_batch([]) == []
+
+def test_full_probe_ivf_matches_exact(tmp_path):
+    db, vectors, doc_ids = _corpus(tmp_path, 400)
+    db.build_index(n_lists=8, nprobe=2)
+    for row in range(0, 400, 7):
+        db.delete_document(doc_ids[row])
+    # Added after training: assigned to the existing clusters
+    extra = np.random.default_rng(5).normal(size=(20, DIMENSION))
+    for i, vector in enumerate(extra):
+        db.add_document(vector.tolist(), f"extra {i}")
+    queries = np.random.default_rng(6).normal(size=(15, DIMENSION))
+    for query in queries:
+        exact = db.query(query.tolist(), n_results=10, exact=True)
+        _assert_same(db.query(query.tolist(), n_results=10, nprobe=8), exact)
+    assert db.index_recall(queries.tolist(), n_results=10, nprobe=8) == 1.0
+    assert db.index_recall(queries.tolist(), n_results=10, nprobe=1) <= 1.0
+
+def test_ivf_survives_save_and_load(tmp_path):
+    db, vectors, doc_ids = _corpus(tmp_path, 200)
+    db.build_index(n_lists=4, nprobe=4)
+    db.delete_document(doc_ids[0])
+    db.save_to_disk()
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    assert reloaded.index is not None
+    query = np.random.default_rng(7).normal(size=DIMENSION).tolist()
+    _assert_same(reloaded.query(query, n_results=10), reloaded.query(query, n_results=10, exact=True))
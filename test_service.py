@@ -0,0 +1,74 @@
+# RAG query service with stub backends: concurrent requests share batched
+# embedding and search calls, and one bad request fails alone.
+import asyncio
+import io
+import json
+
+import pytest
+
+from embedders import HashEmbedder
+from service import MicroBatcher, RAGService, serve_jsonl
+from vectordb import SimpleVectorDB
+
+TOPICS = ["whales swim in the ocean", "bees make honey", "rockets fly to space", "trees grow leaves"]
+
+@pytest.fixture
+def service(tmp_path):
+    embedder = HashEmbedder(dim=32)
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    for i, topic in enumerate(TOPICS):
+        db.add_document(embedder.embed(topic), topic, {"source": "topics.txt", "n": i})
+    service = RAGService(db, embed_fn=embedder, llm_fn=lambda prompt: f"answer from {len(prompt)} chars",
+                         max_wait=0.05)
+    yield service
+    service.close()
+
+def test_micro_batcher_coalesces_and_isolates_errors():
+    def double(items):
+        if "fail" in items:
+            raise RuntimeError("bad batch")
+        return [2 * item for item in items]
+
+    async def run():
+        batcher = MicroBatcher(double, max_batch=4, max_wait=0.05)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        assert results == [2 * i for i in range(10)]
+        assert batcher.stats()["batches"] == 3
+        with pytest.raises(RuntimeError):
+            await batcher.submit("fail")
+        assert await batcher.submit(21) == 42
+    asyncio.run(run())
+
+def test_concurrent_answers_share_batches(service):
+    async def run():
+        return await asyncio.gather(*(service.answer(topic, n_results=2) for topic in TOPICS))
+    responses = asyncio.run(run())
+    for topic, response in zip(TOPICS, responses):
+        assert response["answer"].startswith("answer from")
+        assert len(response["sources"]) == 2
+        assert service.db.get_text(response["sources"][0]["id"]) == topic
+    assert service.embedder.stats()["batches"] == 1
+    assert service.searcher.stats()["batches"] == 1
+
+@pytest.mark.parametrize("n_results", ["5", 0, -1, 2.5, True])
+def test_bad_n_results_fails_alone(service, n_results):
+    async def run():
+        requests = [{"id": i, "question": topic} for i, topic in enumerate(TOPICS)]
+        requests.append({"id": "bad", "question": "bees", "n_results": n_results})
+        return await asyncio.gather(*(service.handle(request) for request in requests))
+    responses = asyncio.run(run())
+    assert [response["id"] for response in responses if "error" in response] == ["bad"]
+    assert service.errors == 1
+
+def test_serve_jsonl(service):
+    lines = [json.dumps({"id": 1, "question": "honey", "n_results": 1}), "", "not json",
+             json.dumps({"id": 2, "question": ""}), json.dumps({"id": 3, "question": "space rockets"})]
+    output = io.StringIO()
+    asyncio.run(serve_jsonl(service, io.StringIO("\n".join(lines) + "\n"), output))
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(responses) == 4
+    by_id = {response.get("id"): response for response in responses}
+    assert len(by_id[1]["sources"]) == 1
+    assert "error" in by_id[2]
+    assert by_id[3]["sources"][0]["metadata"]["n"] == 2
+    assert by_id[None]["error"].startswith("Invalid request")
@@ -0,0 +1,78 @@
+#test_sync.py
+# Incremental sync: chunks reused from an edited file must point at their new
+# position in it, and chunks shared with a removed file at a file that remains.
+import os
+
+from chunking import load_text
+from embedders import HashEmbedder
+from sync import sync_corpus
+from vectordb import SimpleVectorDB
+
+PARAGRAPHS = [f"Paragraph {i} starts here. It has a second sentence about topic {i}. "
+              f"And a third one, a little longer, to fill the chunk number {i}." for i in range(40)]
+
+def _sync(db, paths):
+    paths = paths if isinstance(paths, list) else [paths]
+    return sync_corpus(db, paths, target_tokens=32, overlap_tokens=8, embed_fn=HashEmbedder(dim=16), processes=1)
+
+def _assert_offsets(db, path):
+    text = load_text(path)
+    for doc_id in db.data:
+        metadata = db.get_metadata(doc_id)
+        assert metadata["source"] == path
+        assert text[metadata["char_start"]:metadata["char_end"]] == db.get_text(doc_id)
+
+def test_offsets_after_edit(tmp_path):
+    path = str(tmp_path / "book.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(PARAGRAPHS))
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    _sync(db, path)
+    _assert_offsets(db, path)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(["A new opening paragraph, inserted by the edit."] + PARAGRAPHS[:20] + PARAGRAPHS[21:]))
+    stats = _sync(db, path)
+    assert stats["chunks_reused"] > 0
+    _assert_offsets(db, path)
+
+    # The updated provenance is what the next load sees
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    _assert_offsets(reloaded, path)
+
+def test_offsets_replayed_from_log(tmp_path):
+    db = SimpleVectorDB(str(tmp_path / "db"), use_wal=True)
+    doc_id = db.add_document([1.0, 0.0], "text", {"source": "a.txt", "char_start": 0, "char_end": 4})
+    db.compact()
+    assert db.update_metadata(doc_id, {"source": "a.txt", "char_start": 10, "char_end": 14})
+    db.close()
+
+    reloaded = SimpleVectorDB(db.db_path, use_wal=True)
+    assert reloaded.load_from_disk()
+    assert reloaded.get_metadata(doc_id)["char_start"] == 10
+    assert reloaded.get_text(doc_id) == "text"
+    assert len(reloaded.data) == 1
+
+def _write(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+def test_shared_chunks_move_to_a_remaining_file(tmp_path):
+    # Synced in path order, so the removed file is the first to produce the shared chunks
+    removed, kept = str(tmp_path / "a_removed.txt"), str(tmp_path / "b_kept.txt")
+    _write(removed, PARAGRAPHS[:10])
+    _write(kept, ["The kept file opens with its own paragraph, long enough to be a chunk on its own."]
+           + PARAGRAPHS[:10])
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    sources = [str(tmp_path / "*.txt")]
+    _sync(db, sources)
+    assert {db.get_metadata(doc_id)["source"] for doc_id in db.data} == {removed, kept}
+
+    os.remove(removed)
+    stats = _sync(db, sources)
+    assert stats["files_removed"] == 1 and stats["chunks_deleted"] == 0
+    _assert_offsets(db, kept)
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    _assert_offsets(reloaded, kept)
@@ -0,0 +1,109 @@
+# Tracing: histogram quantile estimates, the Prometheus text exposition, and
+# the disabled tracer, which must record nothing.
+import json
+import re
+
+import pytest
+
+from tracing import Histogram, Tracer
+
+_SAMPLE = re.compile(r'^(rag_[a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-z_]+="[^"]*")(,[a-z_]+="[^"]*")*\})? (\S+)$')
+
+def test_quantiles_interpolate_inside_buckets():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    assert histogram.quantile(0.5) == 0.0  # Empty
+    for value in (0.5, 0.5, 1.5, 1.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(1.0)
+    assert histogram.quantile(0.75) == pytest.approx(1.25)  # Upper bound capped at the max seen
+    assert histogram.quantile(1.0) == pytest.approx(1.5)
+    histogram.observe(10.0)  # +Inf bucket: bounded by the max
+    assert histogram.quantile(1.0) == pytest.approx(10.0)
+    assert (histogram.count, histogram.sum, histogram.max) == (5, 14.0, 10.0)
+    assert histogram.counts == [2, 2, 0, 1]
+
+def test_quantiles_are_ordered():
+    histogram = Histogram()
+    for i in range(1, 1001):
+        histogram.observe(i / 10000)  # 0.1 ms to 100 ms
+    quantiles = [histogram.quantile(q) for q in (0.1, 0.5, 0.9, 0.99)]
+    assert quantiles == sorted(quantiles)
+    assert 0.03 <= quantiles[1] <= 0.07
+    assert quantiles[-1] <= histogram.max
+
+def test_prometheus_text_format():
+    tracer = Tracer(enabled=True)
+    for duration in (0.002, 0.02, 0.2):
+        tracer.record("embed", duration)
+    with pytest.raises(KeyError):
+        with tracer.span("search"):
+            raise KeyError("boom")
+    tracer.count("llm_tokens", 12, model="m", kind="prompt")
+    tracer.count("llm_tokens", 3, model="m", kind="completion")
+
+    lines = tracer.prometheus_text().splitlines()
+    assert lines[:2] == ["# HELP rag_stage_seconds Latency of the traced pipeline stages.",
+                         "# TYPE rag_stage_seconds histogram"]
+    samples = {}
+    for line in lines:
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) rag_\w+ ", line)
+            continue
+        match = _SAMPLE.match(line)
+        assert match, line
+        samples[line.rsplit(" ", 1)[0]] = float(match.group(5))
+
+    buckets = [value for name, value in samples.items() if name.startswith('rag_stage_seconds_bucket{stage="embed"')]
+    assert buckets == sorted(buckets)  # Cumulative
+    assert buckets[-1] == samples['rag_stage_seconds_count{stage="embed"}'] == 3
+    assert samples['rag_stage_seconds_bucket{stage="embed",le="+Inf"}'] == 3
+    assert samples['rag_stage_seconds_bucket{stage="embed",le="0.0025"}'] == 1
+    assert samples['rag_stage_seconds_sum{stage="embed"}'] == pytest.approx(0.222)
+    assert samples['rag_stage_errors_total{stage="search"}'] == 1
+    assert samples['rag_llm_tokens_total{kind="prompt",model="m"}'] == 12
+    assert lines.count("# TYPE rag_llm_tokens_total counter") == 1
+
+def test_spans_nest_and_log(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = Tracer(enabled=True, jsonl_path=str(path))
+
+    @tracer.trace("outer")
+    def outer():
+        with tracer.span("inner", items=2):
+            tracer.record_usage({"prompt_tokens": 5, "completion_tokens": 7}, model="m")
+
+    outer()
+    tracer.disable()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r["name"], r["parent"]) for r in records] == [("inner", "outer"), ("outer", None)]
+    assert records[0]["items"] == 2 and records[0]["completion_tokens"] == 7
+    assert set(tracer.summary()) == {"inner", "outer"}
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer(enabled=False)
+    calls = []
+
+    @tracer.trace("stage")
+    def stage(x):
+        calls.append(x)
+        return 2 * x
+
+    assert stage(21) == 42 and calls == [21]
+    with tracer.span("block", n=1) as block:
+        block.set(more=2)
+    tracer.record("recorded", 0.5)
+    tracer.count("llm_retries")
+    tracer.record_usage({"prompt_tokens": 5, "completion_tokens": 7})
+    assert tracer.span("a") is tracer.span("b")  # One shared no-op object
+    assert tracer.summary() == {}
+    assert tracer.counters() == {}
+    assert [line for line in tracer.prometheus_text().splitlines() if not line.startswith("#")] == []
+
+    # Disabling stops the recording of an enabled tracer too
+    tracer.enable()
+    tracer.record("recorded", 0.5)
+    tracer.disable()
+    tracer.record("recorded", 0.5)
+    tracer.count("llm_retries")
+    assert tracer.summary()["recorded"]["count"] == 1
+    assert tracer.counters() == {}
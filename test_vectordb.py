@@ -0,0 +1,104 @@
+#test_vectordb.py
+# Persistence of SimpleVectorDB: a save interrupted at any point must leave the
+# previous generation of files, and the write-ahead log, loadable.
+import os
+
+import numpy as np
+import pytest
+
+import columnar
+import vectordb
+from vectordb import SimpleVectorDB
+
+class Crash(Exception):
+    pass
+
+def _add(db, start, count):
+    rng = np.random.default_rng(start)
+    for i in range(start, start + count):
+        db.add_document(rng.normal(size=8).tolist(), f"document {i}", {"n": i})
+
+def _crash_after(monkeypatch, calls):
+    """Make the n-th file write of the next save raise, as if the process died there."""
+    atomic_write = columnar.atomic_write
+    count = [0]
+
+    def failing_write(path, writer):
+        count[0] += 1
+        if count[0] == calls:
+            raise Crash(path)
+        atomic_write(path, writer)
+    for module in (columnar, vectordb):
+        monkeypatch.setattr(module, "atomic_write", failing_write)
+
+def _texts(db):
+    return sorted(db.get_text(doc_id) for doc_id in db.data)
+
+@pytest.mark.parametrize("calls", [1, 2, 9, 12, 14])
+def test_interrupted_compact_keeps_everything(tmp_path, monkeypatch, calls):
+    db = SimpleVectorDB(str(tmp_path / "db"), use_wal=True)
+    _add(db, 0, 20)
+    db.build_index(n_lists=2)
+    db.compact()
+    _add(db, 20, 10)
+    db.delete_document("doc_1")
+    expected = _texts(db)
+
+    _crash_after(monkeypatch, calls)
+    with pytest.raises(Crash):
+        db.compact()
+    monkeypatch.undo()
+    db.close()
+
+    reloaded = SimpleVectorDB(db.db_path, use_wal=True)
+    assert reloaded.load_from_disk()
+    assert _texts(reloaded) == expected
+    assert reloaded.get_text(reloaded.keyword_query("25", n_results=1)[0][0]) == "document 25"
+    assert len(reloaded.query_batch(np.ones((1, 8)), n_results=50, exact=True, where={"n": {"$gte": 0}})[0]) == len(expected)
+
+    # The next save succeeds and leaves only one generation behind
+    reloaded.compact()
+    again = SimpleVectorDB(db.db_path)
+    assert again.load_from_disk()
+    assert _texts(again) == expected
+    assert not [name for name in os.listdir(db.db_path) if name.endswith(".tmp") or ".1." in name]
+
+def test_interrupted_save_without_log_loads_previous_save(tmp_path, monkeypatch):
+    db = SimpleVectorDB(str(tmp_path / "db"))
+    _add(db, 0, 20)
+    db.save_to_disk()
+    saved = _texts(db)
+    _add(db, 20, 5)
+
+    _crash_after(monkeypatch, 1)
+    with pytest.raises(Crash):
+        db.save_to_disk()
+    monkeypatch.undo()
+
+    reloaded = SimpleVectorDB(db.db_path)
+    assert reloaded.load_from_disk()
+    assert _texts(reloaded) == saved
+
+def test_stale_log_replay_keeps_hash_ownership(tmp_path):
+    db = SimpleVectorDB(str(tmp_path / "db"), use_wal=True)
+    first = db.add_document([1.0, 0.0], "other")
+    db.compact()
+    removed = db.add_document([0.0, 1.0], "same")
+    db.delete_document(removed)
+    readded = db.add_document([0.0, 1.0], "same")
+    log_path = os.path.join(db.db_path, vectordb.WAL_FILE)
+    with open(log_path, "rb") as f:
+        stale_log = f.read()
+
+    # Crash after the base files were saved but before the log was emptied
+    db.compact()
+    db.close()
+    with open(log_path, "wb") as f:
+        f.write(stale_log)
+
+    reloaded = SimpleVectorDB(db.db_path, use_wal=True)
+    assert reloaded.load_from_disk()
+    assert sorted(reloaded.data) == sorted([first, readded])
+    assert reloaded.hash_dict[SimpleVectorDB.compute_hash("same")] == readded
+    assert reloaded.add_document([0.0, 1.0], "same") == readded
+    assert len(reloaded.data) == 2
@@ -0,0 +1,9 @@
+#text_hash.py
+# Content hash of a chunk text, shared by SimpleVectorDB (duplicate detection,
+# sync) and the embedding cache (cache key). Kept free of dependencies so the
+# cache can be imported without loading the database and numpy.
+import hashlib
+
+def compute_hash(text: str) -> str:
+    """Compute a hash for the given text (hex MD5 of its UTF-8 bytes)."""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
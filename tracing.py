@@ -0,0 +1,300 @@
+#tracing.py
+# Lightweight tracing of the pipeline stages (embedding, search, prompt
+# assembly, LLM calls, ingestion). A span times a block with the monotonic
+# clock; finished spans feed one latency histogram per stage name and, when a
+# log file is set, are appended to it as JSON lines. Metrics are exported in
+# the Prometheus text format.
+#
+# Tracing is off unless RAG_TRACE=1 (RAG_TRACE_FILE=path adds the JSONL log,
+# RAG_METRICS_PORT=port serves /metrics while rag.py runs).
+# Disabled, span() returns a shared no-op object and traced functions run
+# after a single attribute check, so the instrumentation can stay in hot paths.
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets, as in Prometheus clients
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "rag"
+TRACE_ENV = "RAG_TRACE"
+TRACE_FILE_ENV = "RAG_TRACE_FILE"
+METRICS_PORT_ENV = "RAG_METRICS_PORT"  # Port of the /metrics endpoint started by rag.py
+
+class Histogram:
+    """Cumulative-bucket latency histogram (counts per bucket, sum, count, max)."""
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile, interpolated inside its bucket (like histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return lower + max(0.0, upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+#
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """A timed block; use it as a context manager. set() adds attributes (e.g. token counts)."""
+    __slots__ = ("tracer", "name", "attrs", "parent", "wall_start", "start", "duration", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent: Optional[str] = None
+        self.duration = 0.0
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent = parent.name if parent is not None else None
+        self._token = _current_span.set(self)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            _current_span.set(None)  # Exited in another context (e.g. another task)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+#
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    def __init__(self, enabled: bool = False, jsonl_path: Optional[str] = None):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._jsonl = None
+        if enabled:
+            self.enable(jsonl_path)
+
+    def enable(self, jsonl_path: Optional[str] = None) -> None:
+        """Start recording; finished spans are also appended to `jsonl_path` if given."""
+        with self._lock:
+            if jsonl_path and self._jsonl is None:
+                # Block-buffered: flushed by disable(), which runs at exit
+                self._jsonl = open(jsonl_path, "a", encoding="utf-8")
+                atexit.register(self.disable)
+            self.enabled = True
+
+    def disable(self) -> None:
+        with self._lock:
+            self.enabled = False
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+    def reset(self) -> None:
+        """Forget all recorded metrics."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # ------- Recording -------
+    def span(self, name: str, **attrs) -> Any:
+        """Context manager timing the `name` stage (a no-op while disabled)."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def trace(self, name: Optional[str] = None) -> Callable:
+        """Decorator: every call of the function is a span (named after the function by default)."""
+        def decorator(fn: Callable) -> Callable:
+            stage = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, stage, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, duration: float, **attrs) -> None:
+        """Record a stage timed by the caller (e.g. a stream consumed across yields)."""
+        if not self.enabled:
+            return
+        parent = _current_span.get()
+        self._write(name, duration, time.time() - duration, parent.name if parent is not None else None, attrs)
+
+    def count(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add to a counter, e.g. count("llm_retries")."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def record_usage(self, usage: Any, model: Optional[str] = None) -> None:
+        """
+        Count the tokens of an LLM completion and attach them to the current span.
+
+        Args:
+            usage: The completion's `usage` (an SDK object or a dict), or None.
+            model (str, optional): Label of the token counters.
+        """
+        if not self.enabled or not usage:
+            return
+        if hasattr(usage, "model_dump"):
+            usage = usage.model_dump()
+        tokens = {kind: usage.get(f"{kind}_tokens") or 0 for kind in ("prompt", "completion")}
+        for kind, n in tokens.items():
+            self.count("llm_tokens", n, model=model or "", kind=kind)
+        current = _current_span.get()
+        if current is not None:
+            current.set(prompt_tokens=tokens["prompt"], completion_tokens=tokens["completion"])
+
+    def _finish(self, span: Span) -> None:
+        self._write(span.name, span.duration, span.wall_start, span.parent, span.attrs)
+
+    def _write(self, name: str, duration: float, wall_start: float, parent: Optional[str],
+               attrs: Dict[str, Any]) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(duration)
+            if "error" in attrs:
+                key = ("stage_errors", (("stage", name),))
+                self._counters[key] = self._counters.get(key, 0.0) + 1
+            if self._jsonl is not None:
+                record = {"name": name, "start": wall_start, "duration_ms": 1000 * duration,
+                          "parent": parent, "thread": threading.current_thread().name, **attrs}
+                self._jsonl.write(json.dumps(record, default=str) + "\n")
+
+    # ------- Export -------
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: count, mean/p50/p99/max in milliseconds (quantiles estimated from the buckets)."""
+        with self._lock:
+            return {name: {"count": h.count, "mean_ms": 1000 * h.sum / h.count, "p50_ms": 1000 * h.quantile(0.5),
+                           "p99_ms": 1000 * h.quantile(0.99), "max_ms": 1000 * h.max}
+                    for name, h in sorted(self._histograms.items())}
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return {_metric_name(name, labels): value for (name, labels), value in sorted(self._counters.items())}
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = [f"# HELP {METRIC_PREFIX}_stage_seconds Latency of the traced pipeline stages.",
+                 f"# TYPE {METRIC_PREFIX}_stage_seconds histogram"]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{name}"}} {h.sum}')
+                lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{name}"}} {h.count}')
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                    typed.add(name)
+                lines.append(f"{_metric_name(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+#
+
+def _metric_name(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{METRIC_PREFIX}_{name}_total" + (f"{{{label_text}}}" if label_text else "")
+
+# ------- Process-wide tracer -------
+tracer = Tracer(
+    enabled=os.getenv(TRACE_ENV, "").lower() in ("1", "true", "yes"),
+    jsonl_path=os.getenv(TRACE_FILE_ENV)
+)
+
+def span(name: str, **attrs) -> Any:
+    """Span of the process-wide tracer: `with span("retrieve"): ...`"""
+    return tracer.span(name, **attrs) if tracer.enabled else _NOOP_SPAN
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator tracing a function with the process-wide tracer."""
+    return tracer.trace(name)
+
+def format_summary(summary: Optional[Dict[str, Dict[str, float]]] = None) -> List[str]:
+    """Table lines of a summary(), for printing at the end of a run."""
+    summary = tracer.summary() if summary is None else summary
+    lines = [f"{'stage':<28} {'count':>7} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}"]
+    for name, row in summary.items():
+        lines.append(f"{name:<28} {row['count']:>7} {row['mean_ms']:>10.2f} {row['p50_ms']:>10.2f} "
+                     f"{row['p99_ms']:>10.2f} {row['max_ms']:>10.2f}")
+    return lines
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """Serve GET /metrics (Prometheus text) from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Only needed here
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            payload = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+#
@@ -1,125 +1,913 @@
 #vectordb.py
-from typing import List, Tuple, Dict, Any
-import hashlib
+from typing import List, Tuple, Dict, Any, Iterator, Mapping, Optional
 import json
 import os
 import pickle
+import re
+
+import numpy as np
+
+from bm25_index import BM25Index
+from columnar import StringColumn, atomic_write, load_array, save_array, save_arrays, sync_directory
+from ivf_index import IVFIndex, DEFAULT_NPROBE
+from metadata_index import MetadataIndex, SELECTIVE_FILTER_FRACTION
+from quantization import make_codec
+from text_hash import compute_hash
+from tracing import traced
+from wal import WriteAheadLog
+
+INITIAL_CAPACITY = 1024  # Rows allocated for the embedding matrix on first insert
+GROWTH_FACTOR = 2  # Capacity multiplier used when the matrix is full
+QUERY_BLOCK_ROWS = 1024  # Queries scored together in query_batch
+CORPUS_TILE_ROWS = 16384  # Corpus rows scored per matrix product in query_batch
+FORMAT_VERSION = 1  # Version of the on-disk layout written by save_to_disk
+DEFAULT_RERANK_FACTOR = 4  # Quantized search re-ranks k * factor candidates exactly
+HYBRID_CANDIDATES = 100  # Results taken from each retriever before fusion in hybrid_query
+RRF_K = 60  # Reciprocal-rank-fusion constant: higher flattens the rank weights
+
+# Files of the on-disk layout, all inside the db_path directory. Every save
+# writes a new generation of the data files (vectors.<n>.npy, ...) and then
+# switches to it by replacing the manifest, so a crash never mixes generations.
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"  # float32 (N, dim), unit-length rows
+NORMS_FILE = "norms.npy"  # float32 (N,), original norm of each row
+TEXTS_FILE, TEXT_OFFSETS_FILE = "texts.bin", "text_offsets.npy"
+IDS_FILE, ID_OFFSETS_FILE = "ids.bin", "id_offsets.npy"
+HASHES_FILE, HASH_OFFSETS_FILE = "hashes.bin", "hash_offsets.npy"
+METADATA_FILE, METADATA_OFFSETS_FILE = "metadata.bin", "metadata_offsets.npy"  # JSON per row
+INDEX_FILE = "index.npz"  # Optional IVF index
+CODES_FILE = "codes.npy"  # uint8 (N, code_bytes), quantized rows (precision other than float32)
+QUANTIZER_FILE = "quantizer.npz"  # Learned codec state, e.g. PQ codebooks
+TEXT_INDEX_FILE = "text_index.npz"  # BM25 inverted index over the texts
+METADATA_INDEX_FILE = "metadata_index.npz"  # Metadata fields as columns, for filters
+WAL_FILE = "wal.log"  # Changes made since the last save, in write-ahead-log mode
+GENERATION_FILES = (VECTORS_FILE, NORMS_FILE, TEXTS_FILE, TEXT_OFFSETS_FILE, IDS_FILE, ID_OFFSETS_FILE,
+                    HASHES_FILE, HASH_OFFSETS_FILE, METADATA_FILE, METADATA_OFFSETS_FILE, INDEX_FILE,
+                    CODES_FILE, QUANTIZER_FILE, TEXT_INDEX_FILE, METADATA_INDEX_FILE)
+# A data file of any generation, or a temporary file left by an interrupted save
+_GENERATION_FILE = re.compile("(" + "|".join(
+    re.escape(os.path.splitext(name)[0]) + r"(?:\.\d+)?" + re.escape(os.path.splitext(name)[1])
+    for name in GENERATION_FILES) + r")(?:\.tmp)?$")
+
+def generation_file(name: str, generation: int) -> str:
+    """Name of a data file in a generation (generation 0: databases saved before generations)."""
+    if generation == 0:
+        return name
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{generation}{extension}"
+
+class _DocumentView(Mapping):
+    """
+    Read-only dict-like view over the columnar storage of a SimpleVectorDB.
+    Keeps the historical `db.data[doc_id]["doc_text"]` access pattern working.
+    """
+    def __init__(self, db: "SimpleVectorDB"):
+        self._db = db
+
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        row = self._db._row_of[doc_id]
+        return {
+            "doc_embedding": self._db._embedding_at(row),
+            "doc_text": self._db._texts[row],
+            "doc_hash": self._db._hashes[row],
+            "doc_metadata": self._db._metadata_at(row)
+        }
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._db._row_of)
+
+    def __len__(self) -> int:
+        return len(self._db._row_of)
+#
 
 class SimpleVectorDB:
-    def __init__(self, db_path="vectordb.pkl", hash_path="hash_dict.pkl"):
-        # Store documents as a list of dictionaries for clarity
-        self.data = {}  # Format: {"doc_id": {"doc_embedding": List[float], "doc_text": str}}
-        self.hash_dict = {}  # Format: {"hash": "doc_id"}
+    def __init__(self, db_path="vectordb", use_wal: bool = False, wal_fsync: bool = False):
+        """
+        Args:
+            db_path (str): Directory holding the on-disk layout.
+            use_wal (bool): Append every change to a write-ahead log in db_path, so
+                ingestion is persisted incrementally; compact() folds the log into
+                the base files and load_from_disk replays it.
+            wal_fsync (bool): fsync the log after every record (survives power loss).
+        """
         self.db_path = db_path
-        self.hash_path = hash_path
+        self._wal = WriteAheadLog(os.path.join(db_path, WAL_FILE), fsync=wal_fsync) if use_wal else None
+        self.version = 0  # Bumped on every change to the corpus, for cache invalidation
+        self._reset()
+
+    def _reset(self) -> None:
+        """Empty the in-memory state (paths and log settings are kept)."""
+        self.version += 1
+        self._generation = 0  # Generation of the data files in use (see save_to_disk)
+        # Embeddings live in one contiguous float32 matrix of unit-length rows,
+        # ids, texts and hashes in string columns indexed by the same row number.
+        # After load_from_disk all of them are memory-mapped from db_path.
+        self._vectors = np.empty((0, 0), dtype=np.float32)  # Shape: (capacity, dim)
+        self._norms = np.empty(0, dtype=np.float32)  # Original norm of each row
+        self._size = 0  # Number of rows in use, deleted ones included
+        self._deleted = np.zeros(0, dtype=bool)  # Tombstones, dropped on the next save
+        self._deleted_count = 0
+        self._next_id = 1  # Numeric part of the next auto-generated doc_id
+        self._ids = StringColumn()
+        self._texts = StringColumn()
+        self._hashes = StringColumn()
+        self._metadata = StringColumn()  # JSON object per row, "" when there is none
+        self._id_rows: Optional[Dict[str, int]] = None  # Built lazily, see _row_of
+        self._hash_dict: Optional[Dict[str, str]] = None  # Built lazily, see hash_dict
+        self.index: Optional[IVFIndex] = None  # Approximate index; None = exact scan only
+        self._text_index: Optional[BM25Index] = BM25Index()  # None = load or build on first use
+        self._metadata_index: Optional[MetadataIndex] = MetadataIndex()  # Same
+        # Quantized copy of the matrix that queries score against (see quantize)
+        self.precision = "float32"
+        self.codec = None  # None = score the float32 matrix directly
+        self.rerank_factor = DEFAULT_RERANK_FACTOR
+        self._codes = np.empty((0, 0), dtype=np.uint8)  # Shape: (capacity, code_bytes)
+
+    @property
+    def data(self) -> Mapping[str, Dict[str, Any]]:
+        """Dict-like view: {"doc_id": {"doc_embedding": ..., "doc_text": str, "doc_hash": str}}."""
+        return _DocumentView(self)
 
-    def compute_hash(self, text: str) -> str:
-        """Compute a hash for the given text."""
-        return hashlib.md5(text.encode('utf-8')).hexdigest()
+    @property
+    def hash_dict(self) -> Dict[str, str]:
+        """Format: {"hash": "doc_id"}. Built on first use after a load."""
+        if self._hash_dict is None:
+            self._hash_dict = dict(zip(self._hashes, self._ids))
+        return self._hash_dict
 
-    def add_document(self, embedding: List[float], text: str) -> str:
+    @property
+    def _row_of(self) -> Dict[str, int]:
+        """Format: {"doc_id": row} for live documents. Built on first use after a load."""
+        if self._id_rows is None:
+            self._id_rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return self._id_rows
+
+    @property
+    def text_index(self) -> BM25Index:
+        """
+        BM25 index over the texts, kept up to date by add_document and
+        delete_document. After a load it is read from disk on first use and
+        caught up with the rows replayed from the log (or built from the texts
+        if the database was saved without one).
+        """
+        if self._text_index is None:
+            index_path = self._file(TEXT_INDEX_FILE)
+            index = BM25Index.load(index_path) if os.path.exists(index_path) else BM25Index()
+            if index.n_rows > self._size:
+                index = BM25Index()  # Does not belong to these files: rebuild
+            for row in range(index.n_rows, self._size):
+                index.add(row, self._texts[row])
+            for row in np.flatnonzero(self._deleted[:self._size]).tolist():
+                index.remove(row, self._texts[row])
+            self._text_index = index
+        return self._text_index
+
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        """
+        Columnar metadata used by `where` filters, kept up to date by add_document.
+        Loaded like text_index: on first use, then caught up with replayed rows.
+        """
+        if self._metadata_index is None:
+            index_path = self._file(METADATA_INDEX_FILE)
+            index = MetadataIndex.load(index_path) if os.path.exists(index_path) else MetadataIndex()
+            if index.n_rows > self._size:
+                index = MetadataIndex()  # Does not belong to these files: rebuild
+            for row in range(index.n_rows, self._size):
+                index.add(row, self._metadata_at(row))
+            self._metadata_index = index
+        return self._metadata_index
+
+    @property
+    def dimension(self) -> int:
+        """Embedding dimension, or 0 while the database is empty."""
+        return self._vectors.shape[1]
+
+    @staticmethod
+    def compute_hash(text: str) -> str:
+        """Compute a hash for the given text (see text_hash.compute_hash)."""
+        return compute_hash(text)
+
+    def add_document(self, embedding: List[float], text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
         """
         Add a single document with auto-generated ID.
         Returns the document ID.
         If the document already exists (based on hash), returns the existing ID.
+        `metadata` is an optional JSON-serializable dict stored with the document
+        (e.g. its source file and position).
         """
         # Compute hash for the text
         doc_hash = self.compute_hash(text)
-        
+
         # Check if this document already exists
         if doc_hash in self.hash_dict:
             return self.hash_dict[doc_hash]  # Return existing document ID
-        
-        # Create a new document ID
-        doc_id = f"doc_{len(self.data) + 1}"
-        
+
+        # Create a new document ID (never reused, even after deletions)
+        doc_id = f"doc_{self._next_id}"
+
+        vector = self._as_vector(embedding)
+        self._append_row(doc_id, vector, text, doc_hash, metadata)
+
+        # Persist the change to the log before acknowledging it
+        if self._wal is not None:
+            self._wal.append({"op": "add", "id": doc_id, "text": text, "hash": doc_hash,
+                              "metadata": metadata}, vector)
+
+        return doc_id
+
+    def _append_row(self, doc_id: str, vector: np.ndarray, text: str, doc_hash: str,
+                    metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Store a new document as the next row of every column."""
+        # Append the embedding to the matrix
+        self._ensure_capacity(self._size + 1, len(vector))
+        norm = float(np.linalg.norm(vector))
+        self._vectors[self._size] = vector / norm if norm > 0 else vector
+        self._norms[self._size] = norm
+        if self.codec is not None:
+            self._codes[self._size] = self.codec.encode(self._vectors[self._size:self._size + 1])[0]
+        if self.index is not None:
+            self.index.add([self._size], self._vectors[self._size])
+        if self._text_index is not None:
+            self._text_index.add(self._size, text)
+        if self._metadata_index is not None:
+            self._metadata_index.add(self._size, metadata)
+        self._deleted[self._size] = False
+        self._size += 1
+
         # Add document to the database
-        self.data[doc_id] = {
-            "doc_embedding": embedding,
-            "doc_text": text,
-            "doc_hash": doc_hash
-        }
-        
+        self._row_of[doc_id] = len(self._ids)
+        self._ids.append(doc_id)
+        self._texts.append(text)
+        self._hashes.append(doc_hash)
+        self._metadata.append(json.dumps(metadata, ensure_ascii=False) if metadata else "")
+
         # Add hash to the hash dictionary
         self.hash_dict[doc_hash] = doc_id
-        
-        return doc_id
+        self.version += 1
+
+        # Keep auto-generated IDs ahead of every ID in use (e.g. replayed from the log)
+        if doc_id.startswith("doc_") and doc_id[4:].isdigit():
+            self._next_id = max(self._next_id, int(doc_id[4:]) + 1)
 
-    def query(self, query_embedding: List[float], n_results: int = 3) -> List[Tuple[str, float]]:
+    def delete_document(self, doc_id: str) -> bool:
+        """
+        Delete a document. Its row is tombstoned (skipped by queries) and
+        dropped from the files on the next save_to_disk/compact.
+        Returns True if the document existed.
+        """
+        if doc_id not in self._row_of:
+            return False
+        self._delete_row(doc_id)
+
+        # Persist the change to the log before acknowledging it
+        if self._wal is not None:
+            self._wal.append({"op": "delete", "id": doc_id})
+        return True
+
+    def _delete_row(self, doc_id: str) -> None:
+        row = self._row_of[doc_id]
+        if self.hash_dict.get(self._hashes[row]) == doc_id:
+            del self.hash_dict[self._hashes[row]]
+        del self._row_of[doc_id]
+        if self.index is not None:
+            self.index.remove([row], self._vectors[row])
+        if self._text_index is not None:
+            self._text_index.remove(row, self._texts[row])
+        self._deleted[row] = True
+        self._deleted_count += 1
+        self.version += 1
+
+    def update_metadata(self, doc_id: str, metadata: Optional[Dict[str, Any]]) -> bool:
+        """
+        Replace the metadata of a document (e.g. its position after its source
+        file was edited). The document keeps its id, text and embedding; it moves
+        to a new row and the old one is tombstoned, as by delete_document.
+        Returns True if the document existed.
+        """
+        if doc_id not in self._row_of:
+            return False
+        self._move_row(doc_id, metadata)
+
+        # Persist the change to the log before acknowledging it
+        if self._wal is not None:
+            self._wal.append({"op": "metadata", "id": doc_id, "metadata": metadata})
+        return True
+
+    def _move_row(self, doc_id: str, metadata: Optional[Dict[str, Any]]) -> None:
+        row = self._row_of[doc_id]
+        vector, text, doc_hash = self._embedding_at(row), self._texts[row], self._hashes[row]
+        self._delete_row(doc_id)
+        self._append_row(doc_id, vector, text, doc_hash, metadata)
+
+    def get_embedding(self, doc_id: str) -> List[float]:
+        """Return the embedding of a document as originally added."""
+        return self._embedding_at(self._row_of[doc_id]).tolist()
+
+    def get_text(self, doc_id: str) -> str:
+        """Return the text of a document."""
+        return self._texts[self._row_of[doc_id]]
+
+    def get_metadata(self, doc_id: str) -> Dict[str, Any]:
+        """Return the metadata stored with a document ({} if none)."""
+        return self._metadata_at(self._row_of[doc_id])
+
+    def _metadata_at(self, row: int) -> Dict[str, Any]:
+        value = self._metadata[row]
+        return json.loads(value) if value else {}
+
+    def build_index(self, n_lists: Optional[int] = None, nprobe: int = DEFAULT_NPROBE) -> None:
+        """
+        Build an IVF approximate index over the current documents.
+        Documents added afterwards are assigned to the existing clusters; call
+        build_index again to re-cluster once the corpus has grown a lot.
+
+        Args:
+            n_lists (int, optional): Number of clusters (default: sqrt of the corpus size).
+            nprobe (int): Clusters scanned per query, the recall-vs-latency knob.
+        """
+        index = IVFIndex(n_lists=n_lists, nprobe=nprobe)
+        index.train(self._vectors[:self._size])
+        if self._deleted_count:
+            deleted = np.flatnonzero(self._deleted[:self._size])
+            index.remove(deleted, self._vectors[deleted])
+        self.index = index
+        self.version += 1
+
+    def drop_index(self) -> None:
+        """Remove the approximate index; queries fall back to the exact scan."""
+        self.index = None
+        self.version += 1
+
+    def quantize(self, precision: str, rerank_factor: int = DEFAULT_RERANK_FACTOR) -> None:
+        """
+        Score queries against a compressed copy of the embeddings.
+        Only the codes are read for every query, so they are what has to fit in
+        memory; the float32 rows stay on disk (memory-mapped after a load) and
+        are only read to re-rank the best candidates exactly.
+
+        Args:
+            precision (str): "float32" (no compression), "float16" (2 bytes per
+                dimension), "int8" (1 byte per dimension plus a per-vector scale)
+                or "pq" (product quantization, 1 byte per 8 dimensions).
+            rerank_factor (int): Re-rank n_results * rerank_factor candidates with
+                the float32 rows; 0 returns the approximate scores as they are.
+        """
+        codec = make_codec(precision, self.dimension)
+        if codec is not None:
+            if self._size == 0:
+                raise ValueError("Cannot quantize an empty database")
+            codec.train(self._vectors[:self._size])
+            codes = np.empty((len(self._vectors), codec.code_bytes), dtype=np.uint8)
+            for start in range(0, self._size, CORPUS_TILE_ROWS):
+                end = min(start + CORPUS_TILE_ROWS, self._size)
+                codes[start:end] = codec.encode(self._vectors[start:end])
+            self._codes = codes
+        else:
+            self._codes = np.empty((0, 0), dtype=np.uint8)
+        self.precision = precision
+        self.codec = codec
+        self.rerank_factor = rerank_factor
+        self.version += 1
+
+    def query(self, query_embedding: List[float], n_results: int = 3, exact: bool = False,
+              nprobe: Optional[int] = None, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
         """
         Compare query to all documents using cosine similarity.
-        Returns top n_results as (id, text, similarity_score).
+        Returns top n_results as (id, similarity_score).
+        Uses the approximate index when one is built, unless exact=True.
+        `where` restricts the search to documents whose metadata matches, e.g.
+        {"source": "2889.txt", "chunk_index": {"$lt": 100}} (see MetadataIndex).
+        """
+        return self.query_batch([query_embedding], n_results=n_results, exact=exact, nprobe=nprobe,
+                                where=where)[0]
+
+    @traced("vectordb.query")
+    def query_batch(self, query_embeddings: List[List[float]], n_results: int = 3, exact: bool = False,
+                    nprobe: Optional[int] = None,
+                    where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[str, float]]]:
         """
+        Score a block of queries against all documents at once.
+        The corpus is processed in tiles of CORPUS_TILE_ROWS rows (and the queries in
+        blocks of QUERY_BLOCK_ROWS) so the score matrix stays bounded in memory.
+
+        Args:
+            query_embeddings (List[List[float]]): One embedding per query.
+            n_results (int): Number of results to return per query.
+            exact (bool): Force the full scan even when an approximate index is built.
+                With a quantized database the scan scores the codes, then re-ranks.
+            nprobe (int, optional): Override the index's clusters scanned per query.
+            where (Dict[str, Any], optional): Metadata filter, applied as a row mask
+                before scoring. A selective filter (at most SELECTIVE_FILTER_FRACTION
+                of the rows) scores only the matching rows, without the index.
+
+        Returns:
+            List[List[Tuple[str, float]]]: For each query, its top n_results as (id, similarity_score).
+        """
+        if len(query_embeddings) == 0:
+            return []
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self._size == 0 or n_results <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.dimension:
+            raise ValueError("Vectors must be the same length")
+
+        # Normalize the queries; zero vectors score 0 against everything
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(query_norms > 0, query_norms, 1.0)
+
+        # Quantized scores are approximate: fetch more candidates and re-rank them
+        k = n_results * self.rerank_factor if self.codec is not None and self.rerank_factor else n_results
+
+        # Rows excluded before scoring: deleted ones, and those failing the filter
+        excluded = self._deleted[:self._size] if self._deleted_count else None
+        candidates = None
+        if where:
+            excluded = ~self._filter_mask(where)
+            n_allowed = self._size - int(np.count_nonzero(excluded))
+            if n_allowed == 0:
+                return [[] for _ in range(len(queries))]
+            if n_allowed <= SELECTIVE_FILTER_FRACTION * self._size:
+                candidates, excluded = np.flatnonzero(~excluded), None
+
         results = []
-        
-        # Calculate similarity for each document
-        for doc_id, entry in self.data.items():
-            similarity = self.cosine_similarity(query_embedding, entry["doc_embedding"])
-            results.append((doc_id, similarity))
-        
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:n_results]
+        if self.index is not None and not exact and candidates is None:
+            for query in queries:
+                rows, scores = self.index.search(lambda rows: self._score_rows(query, rows, excluded),
+                                                 query, k, nprobe=nprobe)
+                if k != n_results:
+                    rows, scores = self._rerank(query[None], rows[None], scores[None], n_results)
+                    rows, scores = rows[0], scores[0]
+                results.append([(self._ids[row], float(score))
+                                for row, score in zip(rows, scores) if score != -np.inf])
+            return results
+
+        for start in range(0, len(queries), QUERY_BLOCK_ROWS):
+            block = queries[start:start + QUERY_BLOCK_ROWS]
+            best_rows, best_scores = self._search_block(block, k, candidates, excluded)
+            if k != n_results:
+                best_rows, best_scores = self._rerank(block, best_rows, best_scores, n_results)
+            for rows, scores in zip(best_rows, best_scores):
+                results.append([(self._ids[row], float(score))
+                                for row, score in zip(rows, scores) if score != -np.inf])
+        return results
+
+    @traced("vectordb.keyword_query")
+    def keyword_query(self, query_text: str, n_results: int = 3,
+                      where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        BM25 search over the document texts.
+        Returns top n_results as (id, bm25_score); documents sharing no word
+        with the query are never returned. `where` is a metadata filter, as in query.
+        """
+        if where:
+            excluded = ~self._filter_mask(where)
+        else:
+            excluded = self._deleted[:self._size] if self._deleted_count else None
+        rows, scores = self.text_index.search(query_text, n_results, excluded)
+        return [(self._ids[row], float(score)) for row, score in zip(rows.tolist(), scores)]
+
+    @traced("vectordb.hybrid_query")
+    def hybrid_query(self, query_text: str, query_embedding: List[float], n_results: int = 3,
+                     method: str = "rrf", alpha: float = 0.5,
+                     where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Combine embedding search and BM25 keyword search.
+
+        Args:
+            query_text (str): The question, for the keyword search.
+            query_embedding (List[float]): Its embedding, for the vector search.
+            n_results (int): Number of results to return.
+            method (str): "rrf" (reciprocal-rank fusion: sum of 1 / (RRF_K + rank),
+                robust to the two score scales) or "weighted" (alpha * vector score +
+                (1 - alpha) * BM25 score, each min-max normalized over its candidates).
+            alpha (float): Weight of the vector score in "weighted" mode.
+            where (Dict[str, Any], optional): Metadata filter, as in query.
+
+        Returns:
+            List[Tuple[str, float]]: Top n_results as (id, fused_score).
+        """
+        if method not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {method}")
+        depth = max(n_results, HYBRID_CANDIDATES)
+        ranked_lists = [self.query(query_embedding, n_results=depth, where=where),
+                        self.keyword_query(query_text, depth, where=where)]
+        weights = [alpha, 1 - alpha]
+
+        fused: Dict[str, float] = {}
+        for ranked, weight in zip(ranked_lists, weights):
+            if not ranked:
+                continue
+            if method == "rrf":
+                for rank, (doc_id, _) in enumerate(ranked, start=1):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+            else:
+                high, low = ranked[0][1], ranked[-1][1]
+                for doc_id, score in ranked:
+                    normalized = (score - low) / (high - low) if high > low else 1.0
+                    fused[doc_id] = fused.get(doc_id, 0.0) + weight * normalized
+
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def index_recall(self, query_embeddings: List[List[float]], n_results: int = 10,
+                     nprobe: Optional[int] = None) -> float:
+        """
+        Recall@n_results of the approximate index against the exact scan, averaged
+        over the given queries. Use it to tune nprobe.
+        """
+        if self.index is None:
+            return 1.0
+        exact = self.query_batch(query_embeddings, n_results, exact=True)
+        approx = self.query_batch(query_embeddings, n_results, nprobe=nprobe)
+        hits = sum(len({doc_id for doc_id, _ in e} & {doc_id for doc_id, _ in a}) for e, a in zip(exact, approx))
+        total = sum(len(e) for e in exact)
+        return hits / total if total else 1.0
 
     def save_to_disk(self) -> None:
-        """Save the database and hash dictionary to disk."""
-        # Save the database
-        with open(self.db_path, 'wb') as f:
-            pickle.dump(self.data, f)
-        
-        # Save the hash dictionary
-        with open(self.hash_path, 'wb') as f:
-            pickle.dump(self.hash_dict, f)
-        
-        print(f"Database saved to {self.db_path} and {self.hash_path}")
+        """
+        Save the database to the db_path directory as memory-mappable columns:
+        raw float32 .npy files for the vectors, UTF-8 blobs plus offsets for the
+        strings, and a small JSON manifest.
+        The columns and indexes go to a new generation of files; replacing the
+        manifest atomically then switches to it. A crash at any point leaves the
+        previous generation (and the write-ahead log) intact and loadable.
+        Deleted documents are left out of the files.
+        """
+        os.makedirs(self.db_path, exist_ok=True)
+        generation = self._disk_generation() + 1
+
+        def path(name: str) -> str:
+            return os.path.join(self.db_path, generation_file(name, generation))
+
+        # Rows to keep, and their new numbering in the files
+        rows, row_map = None, None
+        if self._deleted_count:
+            rows = np.flatnonzero(~self._deleted[:self._size])
+            row_map = np.full(self._size, -1, dtype=np.int64)
+            row_map[rows] = np.arange(len(rows))
+
+        # Save the columns
+        vectors, norms = self._vectors[:self._size], self._norms[:self._size]
+        save_array(path(VECTORS_FILE), vectors if rows is None else vectors[rows])
+        save_array(path(NORMS_FILE), norms if rows is None else norms[rows])
+        self._texts.save(path(TEXTS_FILE), path(TEXT_OFFSETS_FILE), rows)
+        self._ids.save(path(IDS_FILE), path(ID_OFFSETS_FILE), rows)
+        self._hashes.save(path(HASHES_FILE), path(HASH_OFFSETS_FILE), rows)
+        self._metadata.save(path(METADATA_FILE), path(METADATA_OFFSETS_FILE), rows)
+
+        # Save the approximate index, if any
+        if self.index is not None:
+            self.index.save(path(INDEX_FILE), row_map)
+
+        # Save the keyword and metadata indexes
+        self.text_index.save(path(TEXT_INDEX_FILE), row_map)
+        self.metadata_index.save(path(METADATA_INDEX_FILE), row_map)
+
+        # Save the quantized codes and the codec state, if any
+        if self.codec is not None:
+            codes = self._codes[:self._size]
+            save_array(path(CODES_FILE), codes if rows is None else codes[rows])
+            save_arrays(path(QUANTIZER_FILE), **self.codec.get_state())
+
+        # Switch to the new generation: until the manifest is replaced, loads
+        # still read the previous one
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "generation": generation,
+            "count": self._size - self._deleted_count,
+            "dimension": self.dimension,
+            "next_id": self._next_id,
+            "has_index": self.index is not None,
+            "precision": self.precision,
+            "rerank_factor": self.rerank_factor
+        }
+        sync_directory(self.db_path)
+        atomic_write(os.path.join(self.db_path, MANIFEST_FILE),
+                     lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+        sync_directory(self.db_path)
+        self._generation = generation
+
+        # Everything in the log is now part of the base files
+        if self._wal is not None:
+            self._wal.reset()
+        self._remove_stale_files(generation)
+
+        print(f"Database saved to {self.db_path}")
+
+    def _file(self, name: str) -> str:
+        """Path of a data file of the generation the database was loaded from."""
+        return os.path.join(self.db_path, generation_file(name, self._generation))
+
+    def _disk_generation(self) -> int:
+        """Generation named by the manifest on disk (0 if there is none)."""
+        try:
+            with open(os.path.join(self.db_path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                return json.load(f).get("generation", 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _remove_stale_files(self, generation: int) -> None:
+        """Delete the data files of other generations and leftovers of interrupted saves."""
+        current = {generation_file(name, generation) for name in GENERATION_FILES}
+        for name in os.listdir(self.db_path):
+            if name not in current and _GENERATION_FILE.match(name):
+                try:
+                    os.remove(os.path.join(self.db_path, name))
+                except OSError:
+                    pass  # Still mapped (Windows): removed by a later save
+
+    def compact(self) -> None:
+        """
+        Merge the write-ahead log into the base files and empty it.
+        Until then, changes only cost an append to the log.
+        """
+        self.save_to_disk()
+
+    def close(self) -> None:
+        """Close the write-ahead log file, if open."""
+        if self._wal is not None:
+            self._wal.close()
 
     def load_from_disk(self) -> bool:
         """
-        Load the database and hash dictionary from disk.
+        Open the database saved in the db_path directory.
+        Vectors and strings are memory-mapped, not read, so this is fast and the
+        pages are shared between processes opening the same database.
+        In write-ahead-log mode, changes logged since the last save are replayed.
         Returns True if successful, False otherwise.
         """
-        # Check if both files exist
-        if not (os.path.exists(self.db_path) and os.path.exists(self.hash_path)):
+        manifest_path = os.path.join(self.db_path, MANIFEST_FILE)
+        has_log = self._wal is not None and self._wal.size > 0
+        if not (os.path.exists(manifest_path) or has_log):
             return False
-        
+
         try:
-            # Load the database
-            with open(self.db_path, 'rb') as f:
-                self.data = pickle.load(f)
-            
-            # Load the hash dictionary
-            with open(self.hash_path, 'rb') as f:
-                self.hash_dict = pickle.load(f)
-            
-            print(f"Database loaded from {self.db_path} and {self.hash_path}")
-            print(f"Loaded {len(self.data)} documents")
+            self._reset()
+            if os.path.exists(manifest_path):
+                self._load_base(manifest_path)
+
+            # Replay the tail of changes not yet compacted into the base files
+            replayed = 0
+            if has_log:
+                for header, vector in self._wal.replay():
+                    replayed += self._apply_record(header, vector)
+
+            print(f"Database loaded from {self.db_path}")
+            print(f"Loaded {self._size - self._deleted_count} documents" + (f" ({replayed} from the log)" if replayed else ""))
             return True
         except Exception as e:
             print(f"Error loading database: {e}")
+            self._reset()
             return False
 
+    def _load_base(self, manifest_path: str) -> None:
+        """Memory-map the base files described by the manifest."""
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported format version: {manifest.get('format_version')}")
+
+        self._generation = manifest.get("generation", 0)
+        path = self._file
+        self._text_index = None  # Read on first keyword search, see text_index
+        self._metadata_index = None  # Read on first filtered search, see metadata_index
+        self._vectors = load_array(path(VECTORS_FILE))
+        self._norms = load_array(path(NORMS_FILE))
+        self._size = len(self._vectors)
+        self._deleted = np.zeros(self._size, dtype=bool)
+        self._texts = StringColumn.load(path(TEXTS_FILE), path(TEXT_OFFSETS_FILE))
+        self._ids = StringColumn.load(path(IDS_FILE), path(ID_OFFSETS_FILE))
+        self._hashes = StringColumn.load(path(HASHES_FILE), path(HASH_OFFSETS_FILE))
+        if os.path.exists(path(METADATA_FILE)):
+            self._metadata = StringColumn.load(path(METADATA_FILE), path(METADATA_OFFSETS_FILE))
+        else:
+            # Saved before metadata existed: every row has none
+            self._metadata = StringColumn(offsets=np.zeros(self._size + 1, dtype=np.int64))
+        if not (self._size == len(self._texts) == len(self._ids) == len(self._hashes)
+                == len(self._metadata) == manifest["count"]):
+            raise ValueError("Database files are inconsistent with the manifest")
+        self._next_id = manifest["next_id"] if "next_id" in manifest else self._first_free_id()
+
+        # Load the approximate index, if one was saved
+        if manifest.get("has_index"):
+            self.index = IVFIndex.load(path(INDEX_FILE))
+
+        # Memory-map the quantized codes, if the database was quantized
+        self.rerank_factor = manifest.get("rerank_factor", DEFAULT_RERANK_FACTOR)
+        self.precision = manifest.get("precision", "float32")
+        self.codec = make_codec(self.precision, self.dimension)
+        if self.codec is not None:
+            self._codes = load_array(path(CODES_FILE))
+            with np.load(path(QUANTIZER_FILE)) as archive:
+                self.codec.set_state(dict(archive))
+            if len(self._codes) != self._size:
+                raise ValueError("Database files are inconsistent with the manifest")
+
+    def _apply_record(self, header: Dict[str, Any], vector: np.ndarray) -> int:
+        """
+        Re-apply one logged change. Replay is idempotent: a change already in the
+        base files (crash between saving them and emptying the log) is skipped.
+        Returns 1 if the change was applied, 0 if skipped.
+        """
+        if header["op"] == "add":
+            # A live document already holding the hash means the base files are
+            # newer than this record: the document was deleted and its text
+            # added again later. Re-adding it would take the hash over, and
+            # replaying the delete would then drop the hash altogether.
+            if header["id"] in self._row_of or header["hash"] in self.hash_dict:
+                return 0
+            self._append_row(header["id"], vector, header["text"], header["hash"], header.get("metadata"))
+            return 1
+        if header["op"] == "delete":
+            if header["id"] not in self._row_of:
+                return 0
+            self._delete_row(header["id"])
+            return 1
+        if header["op"] == "metadata":
+            if header["id"] not in self._row_of or self.get_metadata(header["id"]) == (header["metadata"] or {}):
+                return 0
+            self._move_row(header["id"], header["metadata"])
+            return 1
+        raise ValueError(f"Unknown log record: {header['op']}")
+
+    def import_pickle(self, pickle_path: str = "vectordb.pkl") -> bool:
+        """
+        Load a database saved in the old pickle format, a dict of
+        {"doc_id": {"doc_embedding", "doc_text", "doc_hash"}}. The old hash
+        dictionary file is not needed: it is rebuilt from the entries.
+        Call save_to_disk afterwards to migrate it to the columnar layout.
+        Returns True if successful, False otherwise.
+        """
+        if not os.path.exists(pickle_path):
+            return False
+
+        try:
+            with open(pickle_path, 'rb') as f:
+                entries = pickle.load(f)
+            self._import_entries(entries)
+            print(f"Imported {self._size} documents from {pickle_path}")
+            return True
+        except Exception as e:
+            print(f"Error importing database: {e}")
+            return False
+
+    # ------- Internal helpers -------
+    @staticmethod
+    def _as_vector(embedding) -> np.ndarray:
+        """Convert an embedding to a flat float32 array."""
+        return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+    def _search_block(self, queries: np.ndarray, k: int, candidates: Optional[np.ndarray] = None,
+                      excluded: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k for a block of unit-length queries, scanning the corpus tile by tile.
+        `candidates` limits the scan to some rows; rows where `excluded` is True score -inf.
+        Returns (rows, scores), both of shape (len(queries), k), best first.
+        """
+        n_rows = self._size if candidates is None else len(candidates)
+        k = min(k, n_rows)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, n_rows, CORPUS_TILE_ROWS):
+            end = min(start + CORPUS_TILE_ROWS, n_rows)
+            tile_rows = np.arange(start, end) if candidates is None else candidates[start:end]
+            tile = slice(start, end) if candidates is None else tile_rows
+            if self.codec is not None:
+                scores = self.codec.scores(queries, self._codes[tile])
+            else:
+                scores = queries @ self._vectors[tile].T  # Shape: (queries, tile rows)
+            if excluded is not None:
+                scores[:, excluded[tile]] = -np.inf
+
+            # Reduce the tile to its own top-k, then merge with the running top-k
+            if scores.shape[1] > k:
+                positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, positions, axis=1)
+                rows = tile_rows[positions]
+            else:
+                rows = np.broadcast_to(tile_rows, scores.shape)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _score_rows(self, query: np.ndarray, rows: np.ndarray,
+                    excluded: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Scores of one unit-length query against some rows (from the codes when
+        quantized); rows where `excluded` is True score -inf.
+        """
+        if self.codec is not None:
+            scores = self.codec.scores(query[None], self._codes[rows])[0]
+        else:
+            scores = self._vectors[rows] @ query
+        if excluded is not None:
+            scores[excluded[rows]] = -np.inf
+        return scores
+
+    def _filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Rows that are live and match a metadata filter."""
+        mask = self.metadata_index.mask(where)
+        if self._deleted_count:
+            mask &= ~self._deleted[:self._size]
+        return mask
+
+    def _rerank(self, queries: np.ndarray, rows: np.ndarray, scores: np.ndarray,
+                k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact cosine re-ranking of approximate candidates, per query.
+        Only the candidate rows of the float32 matrix are read.
+        Returns (rows, scores) of the top k, best first.
+        """
+        exact = np.einsum("qd,qkd->qk", queries, self._vectors[rows])
+        exact[scores == -np.inf] = -np.inf  # Keep deleted rows out
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(exact, order, axis=1)
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        """
+        Grow the embedding matrix geometrically so appends are amortized O(1).
+        A read-only memory-mapped matrix is copied into memory on the first append.
+        """
+        if self._vectors.shape[1] == 0:
+            self._vectors = np.empty((max(INITIAL_CAPACITY, rows), dim), dtype=np.float32)
+            self._norms = np.empty(len(self._vectors), dtype=np.float32)
+            self._deleted = np.zeros(len(self._vectors), dtype=bool)
+            return
+        if dim != self._vectors.shape[1]:
+            raise ValueError("Vectors must be the same length")
+        if rows <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+
+        capacity = max(rows, len(self._vectors) * GROWTH_FACTOR)
+        vectors = np.empty((capacity, dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        norms = np.empty(capacity, dtype=np.float32)
+        norms[:self._size] = self._norms[:self._size]
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:self._size] = self._deleted[:self._size]
+        if self.codec is not None:
+            codes = np.empty((capacity, self._codes.shape[1]), dtype=np.uint8)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+        self._vectors = vectors
+        self._norms = norms
+        self._deleted = deleted
+
+    def _embedding_at(self, row: int) -> np.ndarray:
+        """Rebuild the original (un-normalized) embedding of a row."""
+        return self._vectors[row] * self._norms[row]
+
+    def _import_entries(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Rebuild the columnar storage from a plain-dict snapshot."""
+        self._reset()
+        if not entries:
+            return
+
+        matrix = np.asarray([entry["doc_embedding"] for entry in entries.values()], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        safe_norms = np.where(norms > 0, norms, 1.0).astype(np.float32)
+        self._vectors = matrix / safe_norms[:, None]
+        self._norms = norms
+        self._size = len(matrix)
+        self._deleted = np.zeros(self._size, dtype=bool)
+
+        for doc_id, entry in entries.items():
+            self._ids.append(doc_id)
+            self._texts.append(entry["doc_text"])
+            self._hashes.append(entry.get("doc_hash") or self.compute_hash(entry["doc_text"]))
+            self._metadata.append("")
+        self._next_id = self._first_free_id()
+        self._text_index = None  # Built from the texts on first keyword search
+        self._metadata_index = None
+
+    def _first_free_id(self) -> int:
+        """Numeric part following the highest auto-generated doc_id in use."""
+        return 1 + max((int(doc_id[4:]) for doc_id in self._ids
+                        if doc_id.startswith("doc_") and doc_id[4:].isdigit()), default=0)
+
     @staticmethod
     def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
-        """Pure-Python cosine similarity without numpy."""
-        
+        """Cosine similarity of two vectors."""
+
         if len(vec_a) != len(vec_b):
             raise ValueError("Vectors must be the same length")
-        #        
-        
-        dot_product = 0.0
-        magnitude_a = 0.0
-        magnitude_b = 0.0
-        
-        for i in range(len(vec_a)):
-            dot_product += vec_a[i] * vec_b[i]
-            magnitude_a += vec_a[i] ** 2
-            magnitude_b += vec_b[i] ** 2
-        
-        magnitude_a = magnitude_a ** 0.5
-        magnitude_b = magnitude_b ** 0.5
-        
-        if magnitude_a * magnitude_b == 0:
+        #
+
+        a = np.asarray(vec_a, dtype=np.float64)
+        b = np.asarray(vec_b, dtype=np.float64)
+        magnitude = np.linalg.norm(a) * np.linalg.norm(b)
+
+        if magnitude == 0:
             return 0.0
-        return dot_product / (magnitude_a * magnitude_b)
-    #  
+        return float(np.dot(a, b) / magnitude)
+    #
 #
@@ -0,0 +1,85 @@
+#wal.py
+# Append-only write-ahead log used by SimpleVectorDB.
+# Each record is framed as: <payload length: u32><crc32: u32><payload>, where the
+# payload is <json length: u32><json header><float32 vector bytes>.
+# A torn or corrupted tail (e.g. after a crash mid-write) is detected by the
+# length/CRC check and cut off on replay.
+from typing import Any, Dict, Iterator, Optional, Tuple
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+FRAME = struct.Struct("<II")  # Payload length, CRC32 of the payload
+HEADER_LENGTH = struct.Struct("<I")
+
+class WriteAheadLog:
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync  # fsync after every record (survives power loss, slower)
+        self._file = None
+
+    @property
+    def size(self) -> int:
+        """Current size of the log in bytes."""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, header: Dict[str, Any], vector: Optional[np.ndarray] = None) -> None:
+        """Append one record and flush it to the operating system."""
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        vector_bytes = b"" if vector is None else np.asarray(vector, dtype=np.float32).tobytes()
+        payload = HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + vector_bytes
+
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+        self._file.write(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> Iterator[Tuple[Dict[str, Any], np.ndarray]]:
+        """
+        Yield (header, vector) for every intact record, oldest first.
+        Anything after the first incomplete or corrupted record is truncated.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            while True:
+                frame = f.read(FRAME.size)
+                if len(frame) < FRAME.size:
+                    break
+                length, crc = FRAME.unpack(frame)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+
+                (header_length,) = HEADER_LENGTH.unpack_from(payload)
+                header_end = HEADER_LENGTH.size + header_length
+                header = json.loads(payload[HEADER_LENGTH.size:header_end].decode("utf-8"))
+                vector = np.frombuffer(payload[header_end:], dtype=np.float32)
+                valid_end = f.tell()
+                yield header, vector
+
+        # Drop the torn tail so later appends start on a record boundary
+        if valid_end < self.size:
+            self.close()
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def reset(self) -> None:
+        """Empty the log, once its records are safely in the base files."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+#